@@ -0,0 +1,285 @@
+"""Benchmark the hot registry endpoints in-process.
+
+The CherryPy application is called through WSGI without a socket, so only the registry itself is measured:
+routing, tools, the database and presigning. Every dataset size gets a fresh database, SQLite in a temporary file
+by default or the database at --db-url, which is emptied first so only point it at a scratch database.
+
+    env PYTHONPATH=. python benchmarks/endpoints.py --output results.json
+    env PYTHONPATH=. python benchmarks/endpoints.py --compare results.json
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from wsgiref.util import setup_testing_defaults
+
+import alembic.command
+import alembic.config
+import boto3
+import cherrypy
+from semver import VersionInfo
+from sqlalchemy import MetaData, Table
+
+from registry.cache import CatalogCache
+from registry.http.app import Application
+from registry.http.mounts.root.mount import RootMount
+from registry.sql.database import Base, Database
+from registry.sql.models.module import Module, ModuleProvider, ModuleProviderVersion, ModuleVersionAddress
+from registry.sql.models.organization import Organization
+from registry.storage.s3 import S3Storage
+
+logger = logging.getLogger('benchmarks.endpoints')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rows are inserted in batches of this size when populating the database
+INSERT_BATCH_SIZE = 1000
+
+
+class StubS3Client(object):
+    """Enough of an S3 client for the read endpoints, presigning is done by botocore without any network"""
+
+    def __init__(self):
+        self.__client = boto3.session.Session().client(
+            's3', region_name='us-east-1', endpoint_url='http://127.0.0.1:9000', aws_access_key_id='benchmark',
+            aws_secret_access_key='benchmark')
+
+    def generate_presigned_url(self, **kwargs) -> str:
+        return self.__client.generate_presigned_url(**kwargs)
+
+    def head_bucket(self, **kwargs) -> dict:
+        return {}
+
+    def head_object(self, **kwargs) -> dict:
+        return {'ContentLength': 0}
+
+
+def reset_database(database: Database):
+    """Drop every table and run the migrations so each dataset starts from an empty schema"""
+    with database.engine.begin() as connection:
+        Base.metadata.drop_all(connection)
+        Table('alembic_version', MetaData()).drop(connection, checkfirst=True)
+
+    config = alembic.config.Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "registry", "sql", "alembic"))
+    config.set_main_option("sqlalchemy.url", database.db_url)
+    with database.engine.connect() as connection:
+        config.attributes['connection'] = connection
+        alembic.command.upgrade(config, 'head')
+
+
+def populate(database: Database, size: int):
+    """Create size organizations, size modules in the first one, size providers in its first module
+    and size versions of its first provider, so every list endpoint has size items to page through"""
+
+    def insert(model, rows):
+        with database.session() as session:
+            for i in range(0, len(rows), INSERT_BATCH_SIZE):
+                session.bulk_insert_mappings(model, rows[i:i + INSERT_BATCH_SIZE])
+            session.commit()
+
+    organizations = [{'id': uuid.uuid4(), 'name': 'bench%d' % i} for i in range(size)]
+    insert(Organization, organizations)
+    modules = [{'id': uuid.uuid4(), 'organization_id': organizations[0]['id'], 'name': 'module%d' % i}
+               for i in range(size)]
+    insert(Module, modules)
+    providers = [{'id': uuid.uuid4(), 'module_id': modules[0]['id'], 'name': 'provider%d' % i} for i in range(size)]
+    insert(ModuleProvider, providers)
+
+    versions = []
+    addresses = []
+    for i in range(size):
+        version = VersionInfo(i // 100, i % 100 // 10, i % 10)
+        version_id = uuid.uuid4()
+        versions.append({
+            'id': version_id, 'provider_id': providers[0]['id'], 'version': str(version),
+            'version_major': version.major, 'version_minor': version.minor, 'version_patch': version.patch,
+            'version_prerelease_rank': 1, 'version_prerelease': '',
+        })
+        addresses.append({
+            'address': ModuleVersionAddress.build_address('bench0', 'module0', 'provider0', str(version)),
+            'version_id': version_id, 'storage_key': str(version_id),
+            'filename': 'bench0-module0-provider0-%s' % version,
+        })
+    insert(ModuleProviderVersion, versions)
+    insert(ModuleVersionAddress, addresses)
+
+
+def endpoints(size: int) -> dict:
+    version = VersionInfo(size // 2 // 100, size // 2 % 100 // 10, size // 2 % 10)
+    return {
+        'well_known': '/.well-known/terraform.json',
+        'versions': '/v1/modules/bench0/module0/provider0/versions',
+        'download': '/v1/modules/bench0/module0/provider0/%s/download' % version,
+        'list_organizations': '/api/v1/organizations',
+        'list_modules': '/api/v1/modules/bench0',
+        'list_providers': '/api/v1/modules/bench0/module0/providers',
+        'list_versions': '/api/v1/modules/bench0/module0/providers/provider0/versions',
+    }
+
+
+def request(app, path: str) -> str:
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', 'wsgi.input': io.BytesIO()}
+    setup_testing_defaults(environ)
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    body = app(environ, start_response)
+    try:
+        for _ in body:
+            pass
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+    return statuses[0]
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)]
+
+
+def measure(app, path: str, requests: int, warmup: int) -> dict:
+    status = request(app, path)
+    if status.startswith('2') is False and status.startswith('3') is False:
+        raise RuntimeError("GET %s returned %s" % (path, status))
+
+    for _ in range(warmup):
+        request(app, path)
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        request(app, path)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'throughput': requests / elapsed,
+        'mean_ms': elapsed / requests * 1000,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def benchmark(db_url: str, size: int, requests: int, warmup: int, catalog_cache: bool) -> list:
+    path = None
+    if db_url is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        db_url = 'sqlite:///' + path
+
+    database = Database(db_url)
+    database.connect()
+    try:
+        reset_database(database)
+        populate(database, size)
+
+        http_app = Application(logging_config=None, debug=False)
+        http_app.register_mount(RootMount(http_app, database, S3Storage('benchmark', StubS3Client()),
+                                          CatalogCache() if catalog_cache else CatalogCache(max_size=0)))
+        http_app.setup()
+        # Keep the access log out of the results
+        for app in cherrypy.tree.apps.values():
+            app.log.access_log.setLevel(logging.WARNING)
+
+        results = []
+        for name, endpoint in endpoints(size).items():
+            result = measure(http_app.wsgi_application, endpoint, requests, warmup)
+            result.update({'endpoint': name, 'size': size})
+            logger.info("%-20s size %-6d %8.1f req/s  p50 %7.3f ms  p99 %7.3f ms", name, size, result['throughput'],
+                        result['p50_ms'], result['p99_ms'])
+            results.append(result)
+
+        return results
+    finally:
+        database.engine.dispose()
+        if path is not None:
+            os.unlink(path)
+
+
+def git_commit() -> str:
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL)
+        return output.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict):
+    """Log the change of every result against the same endpoint and size of the baseline"""
+    previous = {(result['endpoint'], result['size']): result for result in baseline['results']}
+    logger.info("Compared to %s", baseline.get('commit') or 'the baseline')
+    for setting in ['python', 'database', 'catalog_cache']:
+        if baseline.get(setting) != current[setting]:
+            logger.warning("The baseline ran with %s %s instead of %s", setting, baseline.get(setting),
+                           current[setting])
+    for result in current['results']:
+        before = previous.get((result['endpoint'], result['size']))
+        if before is None:
+            continue
+
+        logger.info("%-20s size %-6d throughput %+6.1f%%  p50 %+6.1f%%  p99 %+6.1f%%", result['endpoint'],
+                    result['size'], (result['throughput'] / before['throughput'] - 1) * 100,
+                    (result['p50_ms'] / before['p50_ms'] - 1) * 100, (result['p99_ms'] / before['p99_ms'] - 1) * 100)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the registry endpoints in-process")
+    parser.add_argument("--db-url", type=str,
+                        help="The database to benchmark against, it is emptied first. Defaults to a temporary SQLite "
+                             "database")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(',')], default=[10, 100, 1000],
+                        help="Comma separated amounts of organizations, modules, providers and versions to "
+                             "benchmark with")
+    parser.add_argument("--requests", type=int, default=500, help="The amount of requests to time per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="The amount of requests to make before timing")
+    parser.add_argument("--no-catalog-cache", action="store_true",
+                        help="Disable the catalog cache so every request goes to the database")
+    parser.add_argument("--output", type=str, help="Write the results as JSON to this file")
+    parser.add_argument("--compare", type=str, help="A JSON results file to compare the results with")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    cherrypy.config.update({'environment': 'production'})
+    # Slow requests are expected with the larger datasets
+    logging.getLogger('registry').setLevel(logging.ERROR)
+    logging.getLogger('alembic').setLevel(logging.WARNING)
+
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark(args.db_url, size, args.requests, args.warmup, not args.no_catalog_cache))
+
+    current = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'database': 'sqlite' if args.db_url is None else args.db_url.split(':', 1)[0],
+        'catalog_cache': not args.no_catalog_cache,
+        'results': results,
+    }
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(json.load(f), current)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
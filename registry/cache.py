@@ -0,0 +1,265 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Hashable
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    """A thread safe, size bounded LRU cache where every entry also expires after a TTL.
+
+    A max_size or ttl of 0 disables the cache, every get is then a miss and set does nothing.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, default=None) -> Any:
+        with self.__lock:
+            entry = self.__entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.__entries[key]
+                self.misses += 1
+                return default
+
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.enabled is False:
+            return
+
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + self.ttl, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def invalidate_matching(self, predicate: Callable[[Hashable], bool]):
+        """Remove every entry whose key matches the predicate"""
+        with self.__lock:
+            for key in [k for k in self.__entries if predicate(k)]:
+                del self.__entries[key]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class CatalogCache(LRUCache):
+    """Cache for the terraform protocol read path keyed by module address.
+
+    Keys are a kind followed by an address, for example ('versions', organization, module, provider)
+    or ('download', organization, module, provider, version). Invalidating an address removes every
+    entry of every kind underneath it.
+    """
+
+    def get_address(self, kind: str, *address: str, default=None) -> Any:
+        return self.get((kind,) + address, default=default)
+
+    def set_address(self, kind: str, *address: str, value: Any):
+        self.set((kind,) + address, value)
+
+    def invalidate_address(self, *address: str):
+        self.invalidate_matching(lambda key: key[1:len(address) + 1] == address)
+
+
+class PresignedURLCache(LRUCache):
+    """Cache for presigned URLs so they are reused while they are still valid.
+
+    URLs are signed to be valid for expires_in seconds and handed out until less than
+    min_lifetime seconds of that remains, after that they are signed again.
+    """
+
+    def __init__(self, max_size=4096, expires_in=300, min_lifetime=60):
+        if min_lifetime >= expires_in:
+            raise ValueError("The presigned URL minimum lifetime must be less than its expiry")
+        super().__init__(max_size=max_size, ttl=expires_in - min_lifetime)
+        self.expires_in = expires_in
+        self.min_lifetime = min_lifetime
+
+    def get_or_sign(self, key: Hashable, sign: Callable[[int], str]) -> str:
+        url = self.get(key)
+        if url is None:
+            url = sign(self.expires_in)
+            self.set(key, url)
+
+        return url
+
+
+class ArchiveCache(object):
+    """A size bounded LRU cache of module archives on local disk keyed by their storage key.
+
+    Archives are fetched from upstream at most once at a time, concurrent requests for an
+    archive that is being fetched wait for that fetch instead of starting their own.
+    """
+
+    def __init__(self, path: str, max_size=1024 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.__entries = OrderedDict()
+        self.__size = 0
+        self.__fetches = {}
+        self.__lock = threading.Lock()
+
+        self.__load()
+
+    @staticmethod
+    def __name(key: str) -> str:
+        # Keys may be paths like sha256/<hash>, cached archives are all kept at the same depth
+        return key.replace('/', '_')
+
+    def __archive_path(self, name: str) -> str:
+        # Fan out over sub directories so a single directory does not end up with every archive
+        return os.path.join(self.path, name[-2:], name)
+
+    def __load(self):
+        # Pick up the archives of a previous run, least recently used first
+        os.makedirs(self.path, exist_ok=True)
+        archives = []
+        for directory, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if filename.endswith('.tmp'):
+                    os.unlink(path)
+                    continue
+
+                stat = os.stat(path)
+                archives.append((stat.st_atime, filename, stat.st_size))
+
+        for _, name, size in sorted(archives):
+            self.__entries[name] = size
+            self.__size += size
+        self.__evict()
+
+    def __evict(self):
+        # The newest archive is always kept even if it is larger than the cache on its own
+        while self.__size > self.max_size and len(self.__entries) > 1:
+            name, size = self.__entries.popitem(last=False)
+            self.__size -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.__archive_path(name))
+            except FileNotFoundError:
+                pass
+
+    def __fetch(self, name: str, fetch: Callable[[BinaryIO], None]) -> BinaryIO:
+        path = self.__archive_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                fetch(f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with self.__lock:
+            archive = open(path, 'rb')
+            self.__entries[name] = size
+            self.__size += size
+            self.__evict()
+
+        return archive
+
+    def open(self, key: str, fetch: Callable[[BinaryIO], None]) -> BinaryIO:
+        """Open the cached archive for key, calling fetch with a file to write it to when it is not cached"""
+        name = self.__name(key)
+        while True:
+            with self.__lock:
+                if name in self.__entries:
+                    self.__entries.move_to_end(name)
+                    self.hits += 1
+                    # Opened while holding the lock so the archive can not be evicted in between,
+                    # once open it stays readable even if it is evicted
+                    return open(self.__archive_path(name), 'rb')
+
+                fetching = self.__fetches.get(name)
+                if fetching is None:
+                    fetching = self.__fetches[name] = threading.Event()
+                    self.misses += 1
+                    break
+
+            # Somebody else is fetching the archive, wait for them and look again.
+            # If their fetch failed the next waiter to get the lock fetches it instead.
+            fetching.wait()
+
+        try:
+            return self.__fetch(name, fetch)
+        finally:
+            with self.__lock:
+                del self.__fetches[name]
+            fetching.set()
+
+    def invalidate(self, key: str):
+        """Remove an archive from the cache so it is fetched again the next time it is opened"""
+        name = self.__name(key)
+        with self.__lock:
+            size = self.__entries.pop(name, None)
+            if size is None:
+                return
+
+            self.__size -= size
+            try:
+                os.unlink(self.__archive_path(name))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self),
+            'bytes': self.__size,
+            'max_bytes': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,181 @@
+import argparse
+import logging
+import os
+from ipaddress import ip_address
+from typing import Optional, Tuple
+
+import boto3
+
+from registry.cache import ArchiveCache, CatalogCache, PresignedURLCache
+from registry.storage.local import LocalStorage
+from registry.storage.s3 import S3Storage
+from registry.storage.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class EnvDefault(argparse.Action):
+    def __init__(self, envvar, required=True, default=None, help=None, **kwargs):
+        if envvar in os.environ:
+            default = os.environ.get(envvar, default)
+        if required and default:
+            required = False
+        if help is not None:
+            help += " [Environment Variable: $" + envvar + "]"
+
+        if default is None:
+            default = argparse.SUPPRESS
+
+        super(EnvDefault, self).__init__(default=default, required=required, help=help, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):  # pragma: no cover
+        setattr(namespace, self.dest, values)
+
+
+def add_http_arguments(parser):
+    parser.add_argument("--bind-address", action=EnvDefault, envvar="HTTP_ADDRESS", required=False,
+                        default="0.0.0.0", help="The IP address to listen on", type=ip_address)
+    parser.add_argument("--port", action=EnvDefault, envvar="HTTP_PORT", required=False, default=8080,
+                        help="The port for the registry to listen on", type=int)
+
+    # SSL
+    parser.add_argument("--cert", action=EnvDefault, envvar="HTTPS_CERT", required=False,
+                        type=argparse.FileType('r'), help="The path to the TLS certificate")
+    parser.add_argument("--key", action=EnvDefault, envvar="HTTPS_KEY", required=False, type=argparse.FileType('r'),
+                        help="The path to the TLS key")
+
+
+def add_database_arguments(parser):
+    parser.add_argument("--db-url", action=EnvDefault, envvar="DB_URL", required=True,
+                        type=str, help="The URL to the database to connect to")
+    parser.add_argument("--db-pool-size", action=EnvDefault, envvar="DB_POOL_SIZE", required=False, type=int,
+                        help="The amount of connections to keep open to the database, defaults to one for every "
+                             "thread that may use the database")
+    parser.add_argument("--db-max-overflow", action=EnvDefault, envvar="DB_MAX_OVERFLOW", required=False, default=10,
+                        type=int, help="The amount of connections to open on top of the pool size when all of them "
+                                       "are in use")
+    parser.add_argument("--db-pool-recycle", action=EnvDefault, envvar="DB_POOL_RECYCLE", required=False, default=1800,
+                        type=int, help="The amount of seconds after which a database connection is replaced")
+    parser.add_argument("--db-ping-idle", action=EnvDefault, envvar="DB_PING_IDLE", required=False, default=30,
+                        type=int, help="The amount of seconds a database connection must have been idle for to be "
+                                       "checked before it is used, 0 checks it every time")
+
+
+def add_replica_arguments(parser):
+    parser.add_argument("--db-replica-urls", action=EnvDefault, envvar="DB_REPLICA_URLS", required=False, default=[],
+                        type=lambda value: [url.strip() for url in value.split(',') if url.strip() != ''],
+                        help="Comma separated URLs to read replicas of the database to send reads to")
+    parser.add_argument("--db-replica-lag", action=EnvDefault, envvar="DB_REPLICA_LAG", required=False, default=5,
+                        type=int, help="The amount of seconds reads of a client go to the primary database after it "
+                                       "wrote so it sees the write before the replicas catch up")
+    parser.add_argument("--db-replica-retry", action=EnvDefault, envvar="DB_REPLICA_RETRY", required=False,
+                        default=30, type=int,
+                        help="The amount of seconds a database replica that failed is not used for")
+
+
+def add_storage_arguments(parser):
+    parser.add_argument("--storage", action=EnvDefault, envvar="STORAGE", required=False, default="s3",
+                        choices=["s3", "local"], type=str, help="Where to store module artifacts")
+    parser.add_argument("--storage-path", action=EnvDefault, envvar="STORAGE_PATH", required=False, type=str,
+                        help="The directory to store module artifacts in when using local storage")
+
+    # S3
+    parser.add_argument("--s3-endpoint", action=EnvDefault, envvar="AWS_S3_ENDPOINT_URL", type=str, required=False,
+                        help="The S3 endpoint")
+    parser.add_argument("--s3-access-key-id", action=EnvDefault, envvar="AWS_ACCESS_KEY_ID", type=str,
+                        required=False, help="The S3 access key id for S3")
+    parser.add_argument("--s3-secret-access-key", action=EnvDefault, envvar="AWS_SECRET_ACCESS_KEY", type=str,
+                        required=False, help="The S3 secret access key for S3")
+    parser.add_argument("--s3-bucket", action=EnvDefault, envvar="AWS_S3_BUCKET", required=False, type=str,
+                        help="The S3 bucket to store and retreive module artifacts")
+
+
+def create_storage(args, download_url_cache: PresignedURLCache = None) -> Storage:
+    """Create the storage selected by the arguments of add_storage_arguments, raises a ValueError if they are invalid"""
+    if args.storage == 'local':
+        if hasattr(args, 'storage_path') is False:
+            raise ValueError("The storage path is required to use local storage")
+
+        logger.info("Using local storage at %s", args.storage_path)
+        return LocalStorage(args.storage_path)
+
+    if hasattr(args, 's3_bucket') is False:
+        raise ValueError("The S3 bucket is required to use S3 storage")
+
+    s3_parameters = {}
+    if hasattr(args, 's3_endpoint'):
+        s3_parameters['endpoint_url'] = args.s3_endpoint
+
+    if hasattr(args, 's3_access_key_id'):
+        s3_parameters['aws_access_key_id'] = args.s3_access_key_id
+
+    if hasattr(args, 's3_secret_access_key'):
+        s3_parameters['aws_secret_access_key'] = args.s3_secret_access_key
+
+    logger.info("Connecting to S3")
+
+    s3_client = boto3.resource('s3', **s3_parameters).meta.client
+    return S3Storage(args.s3_bucket, s3_client, download_url_cache)
+
+
+def add_download_arguments(parser):
+    parser.add_argument("--s3-download-url-expiry", action=EnvDefault, envvar="AWS_S3_DOWNLOAD_URL_EXPIRY",
+                        required=False, default=300, type=int,
+                        help="The amount of seconds a presigned module download URL is valid for")
+    parser.add_argument("--s3-download-url-min-lifetime", action=EnvDefault,
+                        envvar="AWS_S3_DOWNLOAD_URL_MIN_LIFETIME", required=False, default=60, type=int,
+                        help="The minimum amount of seconds a presigned module download URL must still be valid "
+                             "for to be reused")
+
+    parser.add_argument("--download-mode", action=EnvDefault, envvar="DOWNLOAD_MODE", required=False,
+                        default="redirect", choices=["redirect", "proxy"], type=str,
+                        help="Redirect terraform to S3 to download modules or proxy the downloads through the "
+                             "registry")
+    parser.add_argument("--download-cache-path", action=EnvDefault, envvar="DOWNLOAD_CACHE_PATH", required=False,
+                        type=str, help="The directory to cache proxied module archives in")
+    parser.add_argument("--download-cache-size", action=EnvDefault, envvar="DOWNLOAD_CACHE_SIZE", required=False,
+                        default=1024, type=int, help="The maximum size in MiB of the proxied module archive cache")
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--catalog-cache-size", action=EnvDefault, envvar="CATALOG_CACHE_SIZE", required=False,
+                        default=4096, type=int,
+                        help="The maximum amount of module lookups to cache in memory, 0 disables the cache")
+    parser.add_argument("--catalog-cache-ttl", action=EnvDefault, envvar="CATALOG_CACHE_TTL", required=False,
+                        default=60, type=int,
+                        help="The amount of seconds a cached module lookup is valid for, 0 disables the cache")
+
+
+def ssl_files(args) -> Optional[Tuple[str, str]]:
+    """The paths of the TLS certificate and key to serve with, raises a ValueError if only one of them is given"""
+    if hasattr(args, 'cert') is False and hasattr(args, 'key') is False:
+        return None
+
+    if hasattr(args, 'cert') is False or hasattr(args, 'key') is False:
+        raise ValueError("Both the cert and key is required to use SSL")
+
+    return args.cert.name, args.key.name
+
+
+def create_download_url_cache(args) -> PresignedURLCache:
+    if args.s3_download_url_min_lifetime >= args.s3_download_url_expiry:
+        raise ValueError("The S3 download URL minimum lifetime must be less than the download URL expiry")
+
+    return PresignedURLCache(max_size=args.catalog_cache_size, expires_in=args.s3_download_url_expiry,
+                             min_lifetime=args.s3_download_url_min_lifetime)
+
+
+def create_catalog_cache(args) -> CatalogCache:
+    return CatalogCache(max_size=args.catalog_cache_size, ttl=args.catalog_cache_ttl)
+
+
+def create_archive_cache(args, storage: Storage) -> Optional[ArchiveCache]:
+    """The cache of proxied archives, None unless downloads are proxied from storage that is not local"""
+    # Local storage is always served by the registry, straight from storage
+    if args.download_mode != 'proxy' or storage.local is True:
+        return None
+
+    if hasattr(args, 'download_cache_path') is False:
+        raise ValueError("The download cache path is required to proxy downloads")
+
+    return ArchiveCache(args.download_cache_path, max_size=args.download_cache_size * 1024 * 1024)
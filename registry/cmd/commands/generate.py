@@ -0,0 +1,94 @@
+from clify.command import Command
+
+from registry.cmd.arguments import EnvDefault, add_storage_arguments, create_storage
+from registry.sql.database import Database
+from registry.storage.storage import StorageError
+from registry.synthetic import CatalogGenerator
+
+
+class GenerateCatalog(Command):
+
+    def __init__(self, application):
+        super().__init__('generate', 'Fill the database with a synthetic catalog for scale testing')
+        self.application = application
+
+    def setup_arguments(self, parser):
+        # Database
+        parser.add_argument("--db-url", action=EnvDefault, envvar="DB_URL", required=True,
+                            type=str, help="The URL to the database to connect to")
+
+        # Storage
+        add_storage_arguments(parser)
+
+        parser.add_argument("--organizations", type=int, default=10, help="The amount of organizations to create")
+        parser.add_argument("--modules", type=int, default=100,
+                            help="The amount of modules to create, spread over the organizations")
+        parser.add_argument("--providers", type=int, default=200,
+                            help="The amount of providers to create, spread over the modules")
+        parser.add_argument("--versions", type=int, default=1000,
+                            help="The amount of versions to create, spread over the providers")
+        parser.add_argument("--skew", type=float, default=1.0,
+                            help="How much the first organizations, modules and providers get more children than "
+                                 "the rest, 0 spreads them evenly")
+        parser.add_argument("--distinct-timestamps", type=int, default=0,
+                            help="Give rows one of this many created_at values so they collide, 0 gives every row "
+                                 "its own")
+        parser.add_argument("--prerelease-ratio", type=float, default=0.1,
+                            help="The fraction of versions that are prereleases")
+        parser.add_argument("--archives", type=int, default=0,
+                            help="Write this many distinct dummy archives to storage and share them between the "
+                                 "versions, 0 leaves the versions without an archive")
+        parser.add_argument("--prefix", type=str, default="synthetic",
+                            help="The prefix of the organization names, change it to generate into a database again")
+        parser.add_argument("--batch-size", type=int, default=10000, help="The amount of rows inserted per transaction")
+        parser.add_argument("--seed", type=int, help="Seed the generator to create the same catalog again")
+
+    def run(self, args) -> int:
+        counts = [args.organizations, args.modules, args.providers, args.versions, args.archives,
+                  args.distinct_timestamps]
+        if min(counts) < 0 or args.batch_size < 1:
+            self.logger.error("The amounts to generate can not be negative and the batch size must be at least 1")
+            return 1
+
+        parents = [args.organizations, args.modules, args.providers]
+        children = [args.modules, args.providers, args.versions]
+        if any(child > 0 and parent == 0 for parent, child in zip(parents, children)):
+            self.logger.error("Modules, providers and versions need at least one organization, module or provider "
+                              "to belong to")
+            return 1
+
+        if args.skew < 0 or args.prerelease_ratio < 0 or args.prerelease_ratio > 1:
+            self.logger.error("The skew can not be negative and the prerelease ratio must be between 0 and 1")
+            return 1
+
+        storage = None
+        if args.archives > 0:
+            try:
+                storage = create_storage(args)
+                storage.check()
+            except (ValueError, StorageError) as e:
+                self.logger.error(str(e))
+                return 1
+
+        database = Database(db_url=args.db_url, pool_size=1)
+        database.connect()
+
+        self.logger.info("Generating a synthetic catalog")
+
+        try:
+            counts = CatalogGenerator(database, organizations=args.organizations, modules=args.modules,
+                                      providers=args.providers, versions=args.versions, skew=args.skew,
+                                      distinct_timestamps=args.distinct_timestamps,
+                                      prerelease_ratio=args.prerelease_ratio, prefix=args.prefix,
+                                      batch_size=args.batch_size, seed=args.seed, storage=storage,
+                                      archives=args.archives).run()
+        finally:
+            database.engine.dispose()
+
+        self.logger.info("Generated %d organizations, %d modules, %d providers and %d versions with %d archives",
+                         counts['organizations'], counts['modules'], counts['providers'], counts['versions'],
+                         counts['archives'])
+        return 0
+
+    def on_shutdown(self, signum=None, frame=None):
+        pass
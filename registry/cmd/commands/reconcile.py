@@ -0,0 +1,53 @@
+from clify.command import Command
+
+from registry.cmd.arguments import EnvDefault, add_storage_arguments, create_storage
+from registry.reconcile import Reconciler
+from registry.sql.database import Database
+from registry.storage.storage import StorageError
+
+
+class ReconcileStorage(Command):
+
+    def __init__(self, application):
+        super().__init__('reconcile', 'Find archives no version uses and versions without an archive')
+        self.application = application
+
+    def setup_arguments(self, parser):
+        # Database
+        parser.add_argument("--db-url", action=EnvDefault, envvar="DB_URL", required=True,
+                            type=str, help="The URL to the database to connect to")
+
+        # Storage
+        add_storage_arguments(parser)
+
+        parser.add_argument("--min-age", action=EnvDefault, envvar="RECONCILE_MIN_AGE", required=False, default=3600,
+                            type=int, help="The amount of seconds an archive or version must exist for before it is "
+                                           "reconciled, newer ones may belong to an upload in progress")
+        parser.add_argument("--fix", action="store_true",
+                            help="Queue orphaned archives for deletion and delete versions that were never uploaded "
+                                 "instead of only reporting them")
+
+    def run(self, args) -> int:
+        try:
+            storage = create_storage(args)
+            storage.check()
+        except (ValueError, StorageError) as e:
+            self.logger.error(str(e))
+            return 1
+
+        database = Database(db_url=args.db_url, pool_size=1)
+        database.connect()
+
+        self.logger.info("Reconciling storage with the database")
+
+        try:
+            counts = Reconciler(database, storage, min_age=args.min_age, fix=args.fix).run()
+        finally:
+            database.engine.dispose()
+
+        self.logger.info("Checked %d archives, %d are not used by any version and %d versions are missing their "
+                         "archive", counts['archives'], counts['orphaned'], counts['missing'])
+        return 0
+
+    def on_shutdown(self, signum=None, frame=None):
+        pass
@@ -1,35 +1,20 @@
-import argparse
 import os
-from ipaddress import ip_address
 
 import alembic.command
 import alembic.config
-import boto3
-import botocore.exceptions
 import cherrypy
 from clify.command import Command
 
+from registry.cmd.arguments import EnvDefault, add_cache_arguments, add_database_arguments, \
+    add_download_arguments, add_http_arguments, add_replica_arguments, add_storage_arguments, create_archive_cache, \
+    create_catalog_cache, create_download_url_cache, create_storage, ssl_files
+from registry.deletion import DeletionWorker
 from registry.http.app import Application
 from registry.http.mounts.root.mount import RootMount
+from registry.introspection import IntrospectionPool
+from registry.metrics import SlowRequestLog
 from registry.sql.database import Database
-
-
-class EnvDefault(argparse.Action):
-    def __init__(self, envvar, required=True, default=None, help=None, **kwargs):
-        if envvar in os.environ:
-            default = os.environ.get(envvar, default)
-        if required and default:
-            required = False
-        if help is not None:
-            help += " [Environment Variable: $" + envvar + "]"
-
-        if default is None:
-            default = argparse.SUPPRESS
-
-        super(EnvDefault, self).__init__(default=default, required=required, help=help, **kwargs)
-
-    def __call__(self, parser, namespace, values, option_string=None):  # pragma: no cover
-        setattr(namespace, self.dest, values)
+from registry.storage.storage import StorageError
 
 
 class RunRegistry(Command):
@@ -40,68 +25,100 @@ class RunRegistry(Command):
         self.application = application
 
     def setup_arguments(self, parser):
-        parser.add_argument("--bind-address", action=EnvDefault, envvar="HTTP_ADDRESS", required=False,
-                            default="0.0.0.0", help="The IP address to listen on", type=ip_address)
-        parser.add_argument("--port", action=EnvDefault, envvar="HTTP_PORT", required=False, default=8080,
-                            help="The port for the registry to listen on", type=int)
+        add_http_arguments(parser)
+        parser.add_argument("--server-threads", action=EnvDefault, envvar="SERVER_THREADS", required=False, default=10,
+                            type=int, help="The amount of threads handling requests")
 
-        # SSL
-        parser.add_argument("--cert", action=EnvDefault, envvar="HTTPS_CERT", required=False,
-                            type=argparse.FileType('r'), help="The path to the TLS certificate")
-        parser.add_argument("--key", action=EnvDefault, envvar="HTTPS_KEY", required=False, type=argparse.FileType('r'),
-                            help="The path to the TLS key")
+        # Docs
+        parser.add_argument("--swagger-ui-path", action=EnvDefault, envvar="SWAGGER_UI_PATH", required=False,
+                            type=str, help="Path to a local swagger-ui-dist directory to serve the Swagger UI assets "
+                                           "from instead of a CDN")
 
         # Database
-        parser.add_argument("--db-url", action=EnvDefault, envvar="DB_URL", required=True,
-                            type=str, help="The URL to the database to connect to")
-        parser.add_argument("--db-pool-size", action=EnvDefault, envvar="DB_POOL_SIZE", default=5, type=int,
-                            help="The amount of connections to make to the database")
-
-        # S3
-        parser.add_argument("--s3-endpoint", action=EnvDefault, envvar="AWS_S3_ENDPOINT_URL", type=str, required=False,
-                            help="The S3 endpoint")
-        parser.add_argument("--s3-access-key-id", action=EnvDefault, envvar="AWS_ACCESS_KEY_ID", type=str,
-                            required=False, help="The S3 access key id for S3")
-        parser.add_argument("--s3-secret-access-key", action=EnvDefault, envvar="AWS_SECRET_ACCESS_KEY", type=str,
-                            required=False, help="The S3 secret access key for S3")
-        parser.add_argument("--s3-bucket", action=EnvDefault, envvar="AWS_S3_BUCKET", required=True, type=str,
-                            help="The S3 bucket to store and retreive module artifacts")
+        add_database_arguments(parser)
+        add_replica_arguments(parser)
+
+        # Storage
+        add_storage_arguments(parser)
+        parser.add_argument("--storage-deletion-interval", action=EnvDefault, envvar="STORAGE_DELETION_INTERVAL",
+                            required=False, default=10, type=int,
+                            help="The amount of seconds between checks for archives to remove from storage")
+
+        # Uploads
+        parser.add_argument("--max-upload-size", action=EnvDefault, envvar="MAX_UPLOAD_SIZE", required=False,
+                            default=1024, type=int,
+                            help="The maximum size in MiB of a module archive or part uploaded through the registry")
+
+        # Downloads
+        add_download_arguments(parser)
+
+        # Introspection
+        parser.add_argument("--introspection-workers", action=EnvDefault, envvar="INTROSPECTION_WORKERS",
+                            required=False, default=2, type=int,
+                            help="The amount of threads inspecting uploaded module archives, 0 disables inspection")
+
+        # Cache
+        add_cache_arguments(parser)
+
+        # Slow requests
+        parser.add_argument("--slow-request-seconds", action=EnvDefault, envvar="SLOW_REQUEST_SECONDS", required=False,
+                            default=1.0, type=float,
+                            help="Log requests taking longer than this many seconds with their database queries, "
+                                 "0 disables it")
+        parser.add_argument("--slow-request-queries", action=EnvDefault, envvar="SLOW_REQUEST_QUERIES", required=False,
+                            default=25, type=int,
+                            help="Log requests making more than this many database queries, 0 disables it")
 
     def run(self, args) -> int:
-        if (hasattr(args, 'cert') is True and hasattr(args, 'key') is False) or \
-                (hasattr(args, 'cert') is False and hasattr(args, 'key') is True):
-            self.logger.error("Both the cert and key is required to use SSL")
+        try:
+            ssl = ssl_files(args)
+        except ValueError as e:
+            self.logger.error(str(e))
             return 1
-        elif hasattr(args, 'cert') is True and hasattr(args, 'key') is True:
-            cherrypy.server.ssl_certificate = args.cert.name
-            cherrypy.server.ssl_private_key = args.key.name
 
-        s3_parameters = {}
-        if hasattr(args, 's3_endpoint'):
-            s3_parameters['endpoint_url'] = args.s3_endpoint
+        if ssl is not None:
+            cherrypy.server.ssl_certificate, cherrypy.server.ssl_private_key = ssl
 
-        if hasattr(args, 's3_access_key_id'):
-            s3_parameters['aws_access_key_id'] = args.s3_access_key_id
+        if hasattr(args, 'swagger_ui_path') and os.path.isdir(args.swagger_ui_path) is False:
+            self.logger.error("The Swagger UI path %s is not a directory", args.swagger_ui_path)
+            return 1
 
-        if hasattr(args, 's3_secret_access_key'):
-            s3_parameters['aws_secret_access_key'] = args.s3_secret_access_key
+        try:
+            storage = create_storage(args, create_download_url_cache(args))
+            storage.check()
+            archive_cache = create_archive_cache(args, storage)
+        except (ValueError, StorageError) as e:
+            self.logger.error(str(e))
+            return 1
 
-        self.logger.info("Connecting to S3")
+        if args.slow_request_seconds < 0 or args.slow_request_queries < 0:
+            self.logger.error("The slow request thresholds can not be negative")
+            return 1
 
-        s3_client = boto3.resource('s3', **s3_parameters).meta.client
+        if args.server_threads < 1:
+            self.logger.error("The server needs at least one thread")
+            return 1
 
-        try:
-            s3_client.head_bucket(Bucket=args.s3_bucket)
-        except botocore.exceptions.ClientError as e:
-            self.logger.error("Error checking if bucket exists: %s", e)
+        # Every request thread and background worker holds at most one connection at a time,
+        # when they can need more than the pool can open they end up waiting on each other
+        database_threads = args.server_threads + max(args.introspection_workers, 0) + 1
+        pool_size = getattr(args, 'db_pool_size', database_threads)
+        if pool_size < 1 or args.db_max_overflow < 0:
+            self.logger.error("The database pool size must be at least 1 and the overflow can not be negative")
             return 1
-        except botocore.exceptions.NoCredentialsError as e:
-            self.logger.error("Error loading S3 credentials: %s", e)
+
+        if pool_size + args.db_max_overflow < database_threads:
+            self.logger.error("The database pool size and overflow allow %d connections but %d server threads and "
+                              "background workers can use the database at the same time",
+                              pool_size + args.db_max_overflow, database_threads)
             return 1
 
         self.logger.info("Connecting to database")
 
-        database = Database(db_url=args.db_url, pool_size=args.db_pool_size)
+        database = Database(db_url=args.db_url, pool_size=pool_size, max_overflow=args.db_max_overflow,
+                            pool_recycle=args.db_pool_recycle, ping_idle=args.db_ping_idle,
+                            replica_urls=args.db_replica_urls, replica_lag=args.db_replica_lag,
+                            replica_retry=args.db_replica_retry)
         database.connect()
 
         self.logger.info("Running SQL migrations")
@@ -112,8 +129,25 @@ class RunRegistry(Command):
 
         alembic.command.upgrade(config, 'head')
 
+        catalog_cache = create_catalog_cache(args)
+
+        # Archives no longer used are removed from storage in the background
+        deletion_worker = DeletionWorker(database, storage, interval=args.storage_deletion_interval)
+        cherrypy.engine.subscribe('start', deletion_worker.start)
+        cherrypy.engine.subscribe('stop', deletion_worker.stop)
+
+        introspection = None
+        if args.introspection_workers > 0:
+            introspection = IntrospectionPool(database, storage, catalog_cache, workers=args.introspection_workers)
+            cherrypy.engine.subscribe('start', introspection.start)
+            cherrypy.engine.subscribe('stop', introspection.stop)
+
         http_app = Application(logging_config=None, debug=True)
-        http_app.register_mount(RootMount(http_app, database, args.s3_bucket, s3_client))
+        slow_request_log = SlowRequestLog(max_seconds=args.slow_request_seconds,
+                                          max_queries=args.slow_request_queries)
+        http_app.register_mount(RootMount(http_app, database, storage, catalog_cache,
+                                          getattr(args, 'swagger_ui_path', None), archive_cache, introspection,
+                                          slow_request_log=slow_request_log))
         http_app.setup()
 
         self.logger.info("Running CherryPy Webserver")
@@ -123,6 +157,8 @@ class RunRegistry(Command):
                 'environment': 'production',
                 'server.socket_host': str(args.bind_address),
                 'server.socket_port': args.port,
+                'server.thread_pool': args.server_threads,
+                'server.max_request_body_size': args.max_upload_size * 1024 * 1024,
             }
         })
         cherrypy.engine.start()
@@ -0,0 +1,79 @@
+import ssl
+
+from clify.command import Command
+
+from registry.cmd.arguments import add_cache_arguments, add_database_arguments, add_download_arguments, \
+    add_http_arguments, add_storage_arguments, create_archive_cache, create_catalog_cache, create_download_url_cache, \
+    create_storage, ssl_files
+from registry.storage.storage import StorageError
+
+
+class RunProtocol(Command):
+
+    def __init__(self, application):
+        super().__init__('run-protocol', 'Run the read only terraform protocol endpoints of the TF Registry on asyncio')
+        self.application = application
+
+    def setup_arguments(self, parser):
+        add_http_arguments(parser)
+
+        # Database
+        add_database_arguments(parser)
+
+        # Storage
+        add_storage_arguments(parser)
+
+        # Downloads
+        add_download_arguments(parser)
+
+        # Cache
+        add_cache_arguments(parser)
+
+    def run(self, args) -> int:
+        # Only this command needs the asyncio dependencies, the other commands work without them
+        try:
+            import databases
+            from aiohttp import web
+
+            from registry.http.aio import AsyncProtocolApplication, async_db_url
+        except ImportError as e:
+            self.logger.error("The protocol server needs aiohttp and databases to be installed: %s", e)
+            return 1
+
+        try:
+            ssl_paths = ssl_files(args)
+        except ValueError as e:
+            self.logger.error(str(e))
+            return 1
+
+        ssl_context = None
+        if ssl_paths is not None:
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(*ssl_paths)
+
+        try:
+            storage = create_storage(args, create_download_url_cache(args))
+            storage.check()
+            archive_cache = create_archive_cache(args, storage)
+        except (ValueError, StorageError) as e:
+            self.logger.error(str(e))
+            return 1
+
+        # The database is migrated by the run command, this only reads from it
+        db_url = async_db_url(args.db_url)
+        options = {}
+        if db_url.startswith('sqlite') is False:
+            options['max_size'] = getattr(args, 'db_pool_size', 10)
+        database = databases.Database(db_url, **options)
+
+        application = AsyncProtocolApplication(database, storage, create_catalog_cache(args), archive_cache)
+
+        self.logger.info("Running asyncio Webserver")
+
+        web.run_app(application.application(), host=str(args.bind_address), port=args.port, ssl_context=ssl_context,
+                    print=None)
+
+        return 0
+
+    def on_shutdown(self, signum=None, frame=None):
+        pass
@@ -1,10 +1,16 @@
 from registry.cmd.app import TFRegistryApplication
+from registry.cmd.commands.generate import GenerateCatalog
+from registry.cmd.commands.reconcile import ReconcileStorage
 from registry.cmd.commands.run import RunRegistry
+from registry.cmd.commands.run_protocol import RunProtocol
 
 
 def main():
     app = TFRegistryApplication()
     RunRegistry(app).register(app)
+    RunProtocol(app).register(app)
+    ReconcileStorage(app).register(app)
+    GenerateCatalog(app).register(app)
     app.run()
 
 
@@ -0,0 +1,88 @@
+import re
+from typing import List, Tuple
+
+from semver import VersionInfo
+
+_VERSION_RE = re.compile(r'^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-([0-9A-Za-z.-]+))?(?:\+([0-9A-Za-z.-]+))?$')
+_CONSTRAINT_RE = re.compile(r'^\s*(~>|>=|<=|!=|=|>|<)?\s*(\S+)\s*$')
+
+
+class ConstraintError(ValueError):
+    pass
+
+
+class VersionConstraint(object):
+    """A single terraform style version constraint like `>= 1.0` or `~> 1.2`"""
+
+    def __init__(self, operator: str, version: VersionInfo, segments: int):
+        self.operator = operator
+        self.version = version
+        self.segments = segments
+
+        self.upper = None
+        if operator == '~>':
+            # ~> allows only the right most specified segment to increase
+            if segments <= 2:
+                self.upper = VersionInfo(version.major + 1, 0, 0)
+            else:
+                self.upper = VersionInfo(version.major, version.minor + 1, 0)
+
+    @property
+    def exact(self) -> bool:
+        return self.operator == '='
+
+    def matches(self, version: VersionInfo) -> bool:
+        if self.operator == '=':
+            return version == self.version
+        if self.operator == '!=':
+            return version != self.version
+        if self.operator == '>':
+            return version > self.version
+        if self.operator == '>=':
+            return version >= self.version
+        if self.operator == '<':
+            return version < self.version
+        if self.operator == '<=':
+            return version <= self.version
+        return self.version <= version < self.upper
+
+    def __str__(self):
+        return "%s %s" % (self.operator, self.version)
+
+
+def parse_version(version: str) -> Tuple[VersionInfo, int]:
+    """Parse a possibly partial version like `1.2` and return it and the amount of segments given"""
+    match = _VERSION_RE.match(version)
+    if match is None:
+        raise ConstraintError("Invalid version %s" % version)
+
+    major, minor, patch, prerelease, build = match.groups()
+    segments = 3 - [minor, patch].count(None)
+    return VersionInfo(int(major), int(minor or 0), int(patch or 0), prerelease, build), segments
+
+
+def parse_constraints(constraints: str) -> List[VersionConstraint]:
+    """Parse a comma separated terraform version constraint string"""
+    parsed = []
+    for constraint in constraints.split(','):
+        if constraint.strip() == '':
+            continue
+
+        match = _CONSTRAINT_RE.match(constraint)
+        if match is None:
+            raise ConstraintError("Invalid version constraint %s" % constraint.strip())
+
+        operator, version = match.groups()
+        version, segments = parse_version(version)
+        parsed.append(VersionConstraint(operator or '=', version, segments))
+
+    return parsed
+
+
+def matches_constraints(version: VersionInfo, constraints: List[VersionConstraint]) -> bool:
+    # Like terraform prereleases are only selected when a constraint asks for them exactly
+    if version.prerelease and not any(c.exact and c.version == version for c in constraints):
+        return False
+
+    return all(c.matches(version) for c in constraints)
+
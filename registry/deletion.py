@@ -0,0 +1,96 @@
+import logging
+import threading
+
+import arrow
+
+from registry.sql.database import Database
+from registry.sql.models.archive import Archive
+from registry.sql.models.deletion import StorageDeletion
+from registry.sql.models.module import ModuleVersionAddress
+from registry.storage.storage import DELETE_BATCH_SIZE, Storage
+
+logger = logging.getLogger(__name__)
+
+# Failed deletions are retried after 2^attempts seconds, up to this amount of seconds
+MAX_RETRY_DELAY = 60 * 60
+
+
+class DeletionWorker(object):
+    """Removes archives queued as StorageDeletion from storage in a background thread.
+
+    Archives are queued in the same transaction that stops using them so nothing is left behind
+    when the registry stops, and removed in batches so API requests never wait on storage for it.
+    """
+
+    def __init__(self, database: Database, storage: Storage, interval=10):
+        self.database = database
+        self.storage = storage
+        self.interval = interval
+
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__work, name="storage-deletion", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __work(self):
+        while True:
+            try:
+                # Keep going while full batches come back, there is likely more waiting
+                while self.__stopped.is_set() is False and self.drain() == DELETE_BATCH_SIZE:
+                    pass
+            except Exception:
+                logger.exception("Error deleting archives from storage")
+
+            if self.__stopped.wait(self.interval):
+                return
+
+    def drain(self) -> int:
+        """Delete one batch of queued archives that are due and return the amount of archives handled"""
+        with self.database.session() as session:
+            now = arrow.utcnow()
+            # Rows being deleted by another registry are skipped instead of waited on
+            deletions = session.query(StorageDeletion).filter(StorageDeletion.next_attempt_at <= now).order_by(
+                StorageDeletion.next_attempt_at).limit(DELETE_BATCH_SIZE).with_for_update(skip_locked=True).all()
+            if len(deletions) == 0:
+                return 0
+
+            # Archives can be used again after they were queued, like when the same content is uploaded again
+            keys = [deletion.key for deletion in deletions]
+            in_use = {key for key, in session.query(ModuleVersionAddress.storage_key).filter(
+                ModuleVersionAddress.storage_key.in_(keys))}
+            in_use.update(Archive.build_storage_key(sha256) for sha256, in session.query(Archive.sha256).filter(
+                Archive.sha256.in_([key[len('sha256/'):] for key in keys if key.startswith('sha256/')])))
+
+            delete_keys = [key for key in keys if key not in in_use]
+            failed = set()
+            if len(delete_keys) > 0:
+                try:
+                    failed.update(self.storage.delete_many(delete_keys))
+                except Exception:
+                    logger.exception("Error deleting %d archives from storage", len(delete_keys))
+                    failed.update(delete_keys)
+
+            for deletion in deletions:
+                if deletion.key not in failed:
+                    session.delete(deletion)
+                    continue
+
+                deletion.attempts += 1
+                deletion.next_attempt_at = now.shift(seconds=min(2 ** deletion.attempts, MAX_RETRY_DELAY))
+
+            session.commit()
+
+        if len(failed) > 0:
+            logger.warning("Could not delete %d archives from storage, retrying them later", len(failed))
+        logger.debug("Deleted %d archives from storage", len(delete_keys) - len(failed))
+
+        return len(deletions)
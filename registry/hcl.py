@@ -0,0 +1,206 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r'''
+    (?P<space>[ \t\r]+)
+  | (?P<comment>\#[^\n]*|//[^\n]*|/\*.*?\*/)
+  | (?P<heredoc><<-?(?P<marker>[A-Za-z_][A-Za-z0-9_]*)\n)
+  | (?P<string>")
+  | (?P<newline>\n)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_.\-]*)
+  | (?P<number>[0-9][0-9.eE+\-]*)
+  | (?P<symbol>=>|==|!=|<=|>=|&&|\|\||[{}\[\]()=,:?!<>+\-*/%&|.])
+''', re.VERBOSE | re.DOTALL)
+
+_OPEN = {'{': '}', '[': ']', '(': ')'}
+
+
+class HCLError(ValueError):
+    pass
+
+
+class Block(object):
+    """A block like `variable "name" { ... }` with its labels, attributes and nested blocks"""
+
+    def __init__(self, type: str, labels: List[str]):
+        self.type = type
+        self.labels = labels
+        self.attributes: Dict[str, Any] = {}
+        self.blocks: List[Block] = []
+
+    def blocks_of(self, type: str) -> List['Block']:
+        return [b for b in self.blocks if b.type == type]
+
+
+def _read_string(text: str, pos: int) -> Tuple[str, int]:
+    # pos is just after the opening quote, interpolations may contain quotes of their own
+    value = []
+    depth = 0
+    while pos < len(text):
+        c = text[pos]
+        if c == '\\':
+            value.append(text[pos:pos + 2])
+            pos += 2
+            continue
+        if c == '$' and text.startswith('${', pos):
+            depth += 1
+            value.append('${')
+            pos += 2
+            continue
+        if depth > 0 and c == '}':
+            depth -= 1
+        elif depth > 0 and c == '"':
+            end = _read_string(text, pos + 1)[1]
+            value.append(text[pos:end])
+            pos = end
+            continue
+        elif depth == 0 and c == '"':
+            return ''.join(value).replace('\\"', '"').replace('\\\\', '\\'), pos + 1
+        elif c == '\n' and depth == 0:
+            break
+        value.append(c)
+        pos += 1
+
+    raise HCLError("Unterminated string")
+
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    """Split HCL into (kind, value) tokens, comments and insignificant whitespace are dropped"""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise HCLError("Unexpected character %r" % text[pos])
+
+        kind = match.lastgroup if match.lastgroup != 'marker' else 'heredoc'
+        pos = match.end()
+        if kind in ('space', 'comment'):
+            if '\n' in match.group():
+                tokens.append(('newline', '\n'))
+        elif kind == 'string':
+            value, pos = _read_string(text, pos)
+            tokens.append(('string', value))
+        elif kind == 'heredoc':
+            marker = re.compile(r'^[ \t]*' + re.escape(match.group('marker')) + r'[ \t]*$', re.MULTILINE)
+            end = marker.search(text, pos)
+            if end is None:
+                raise HCLError("Unterminated heredoc")
+            tokens.append(('string', text[pos:end.start()].rstrip('\n')))
+            pos = end.end()
+        else:
+            tokens.append((kind, match.group()))
+
+    return tokens
+
+
+class _Parser(object):
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise HCLError("Unexpected end of file")
+        self.pos += 1
+        return token
+
+    def skip_newlines(self):
+        while self.peek() is not None and self.peek()[0] == 'newline':
+            self.pos += 1
+
+    def body(self, block: Block, closing: Optional[str]):
+        while True:
+            self.skip_newlines()
+            token = self.peek()
+            if token is None:
+                if closing is not None:
+                    raise HCLError("Unexpected end of file")
+                return
+            if token == ('symbol', closing):
+                self.pos += 1
+                return
+            if token == ('symbol', ','):
+                self.pos += 1
+                continue
+
+            kind, name = self.next()
+            if kind not in ('ident', 'string'):
+                raise HCLError("Unexpected %s" % name)
+
+            token = self.next()
+            if token[1] in ('=', ':'):
+                block.attributes[name] = self.expression(('newline', ',', closing))
+                continue
+
+            labels = []
+            while token[0] in ('string', 'ident'):
+                labels.append(token[1])
+                token = self.next()
+            if token != ('symbol', '{'):
+                raise HCLError("Expected a block after %s" % name)
+
+            child = Block(name, labels)
+            self.body(child, '}')
+            block.blocks.append(child)
+
+    def expression(self, terminators) -> Any:
+        """Parse an attribute value. Strings and objects are returned as python values,
+        anything else is returned as its source text since only literals can be evaluated"""
+        start = self.pos
+        token = self.peek()
+        if token is not None and token[0] == 'string':
+            following = self.tokens[self.pos + 1] if self.pos + 1 < len(self.tokens) else None
+            if following is None or following[0] == 'newline' or following[1] in terminators:
+                self.pos += 1
+                return token[1]
+
+        if token == ('symbol', '{'):
+            self.pos += 1
+            obj = Block('object', [])
+            try:
+                self.body(obj, '}')
+            except HCLError:
+                # Not an object literal but an expression like a for expression
+                self.pos = start
+            else:
+                following = self.peek()
+                if following is None or following[0] == 'newline' or following[1] in terminators:
+                    return obj.attributes
+                self.pos = start
+
+        depth = []
+        parts = []
+        while True:
+            token = self.peek()
+            if token is None:
+                break
+            kind, value = token
+            if not depth and (kind == 'newline' or value in terminators) and kind != 'string':
+                break
+            self.pos += 1
+            if kind == 'newline':
+                continue
+            if kind == 'symbol' and value in _OPEN:
+                depth.append(_OPEN[value])
+            elif kind == 'symbol' and depth and value == depth[-1]:
+                depth.pop()
+            parts.append('"%s"' % value if kind == 'string' else value)
+
+        return ' '.join(parts)
+
+
+def parse(text: str) -> Block:
+    """Parse the blocks and attributes of a HCL document.
+
+    This is not a full HCL implementation, it understands the structure of a document
+    well enough to read the literal values of blocks like variables, outputs and modules.
+    """
+    root = Block('root', [])
+    _Parser(tokenize(text)).body(root, None)
+    return root
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import os
+from collections import namedtuple
+
+import databases
+from aiohttp import web
+from sqlalchemy import and_, select
+
+from registry.cache import ArchiveCache, CatalogCache
+from registry.http.protocol import archive_url, module_versions
+from registry.http.tools.etag import etag_matches, make_etag
+from registry.sql.models.module import Module, ModuleProvider, ModuleProviderVersion, ModuleVersionAddress, \
+    ModuleVersionMetadata
+from registry.sql.models.organization import Organization
+from registry.storage.storage import ObjectNotFoundError, Storage
+
+logger = logging.getLogger(__name__)
+
+# Stand ins for the models with only the columns the protocol endpoints read
+_Organization = namedtuple('_Organization', ['name'])
+_Module = namedtuple('_Module', ['name'])
+_ModuleProvider = namedtuple('_ModuleProvider', ['id', 'name', 'updated_at'])
+_ModuleProviderVersion = namedtuple('_ModuleProviderVersion', ['id', 'version', 'updated_at'])
+
+
+def async_db_url(db_url: str) -> str:
+    """Turn a SQLAlchemy database URL into one for the databases package, which picks its own async driver"""
+    scheme, rest = db_url.split('://', 1)
+    return scheme.split('+')[0] + '://' + rest
+
+
+class AsyncProtocolApplication(object):
+    """Serves the read only terraform protocol endpoints on asyncio.
+
+    This is an alternative to the CherryPy application for the hot read path, one process can hold
+    thousands of concurrent terraform requests since nothing waits on the database or storage in a thread.
+    The same models, catalog cache and storage are used so both return identical responses and ETags.
+    Blocking work that can not be avoided, like filling the proxied archive cache, runs in the default executor.
+    """
+
+    def __init__(self, database: databases.Database, storage: Storage, catalog_cache: CatalogCache = None,
+                 archive_cache: ArchiveCache = None):
+        self.database = database
+        self.storage = storage
+        self.catalog_cache = catalog_cache if catalog_cache is not None else CatalogCache()
+        self.archive_cache = archive_cache
+
+    def application(self) -> web.Application:
+        app = web.Application(middlewares=[self.__errors])
+        app.router.add_get('/.well-known/terraform.json', self.terraform)
+        app.router.add_get('/v1/modules/{organization_name}/{name}/{provider}/versions', self.versions)
+        app.router.add_get('/v1/modules/{organization_name}/{name}/{provider}/{version}/download', self.download)
+        app.router.add_get('/v1/modules/{organization_name}/{name}/{provider}/{version}/archive', self.archive)
+        app.on_startup.append(self.__connect)
+        app.on_cleanup.append(self.__disconnect)
+        return app
+
+    async def __connect(self, app: web.Application):
+        await self.database.connect()
+
+    async def __disconnect(self, app: web.Application):
+        await self.database.disconnect()
+
+    @web.middleware
+    async def __errors(self, request: web.Request, handler):
+        # Errors look like the ones of the CherryPy application
+        try:
+            return await handler(request)
+        except web.HTTPException as e:
+            if e.status < 400:
+                raise
+            return web.json_response({'status': '%d %s' % (e.status, e.reason), 'message': e.text,
+                                      'method': request.method}, status=e.status)
+
+    @staticmethod
+    def __base_url(request: web.Request) -> str:
+        return '%s://%s' % (request.scheme, request.host)
+
+    @staticmethod
+    def __json(request: web.Request, body: dict, etag: str) -> web.Response:
+        if request.method in ('GET', 'HEAD'):
+            conditions = [c.strip() for c in request.headers.get('If-None-Match', '').split(',') if c.strip()]
+            if etag_matches(etag, conditions):
+                return web.Response(status=304, headers={'ETag': etag})
+
+        return web.Response(body=json.dumps(body).encode(), content_type='application/json', headers={'ETag': etag})
+
+    async def __resolve_provider(self, organization_name: str, name: str, provider_name: str):
+        """Resolve a provider address in one query like registry.sql.address.resolve_address"""
+        query = select([Organization.name.label('organization_name'), Module.name.label('module_name'),
+                        ModuleProvider.id.label('provider_id'), ModuleProvider.name.label('provider_name'),
+                        ModuleProvider.updated_at.label('provider_updated_at')]).select_from(
+            Organization.__table__.outerjoin(
+                Module.__table__, and_(Module.organization_id == Organization.id, Module.name == name)).outerjoin(
+                ModuleProvider.__table__, and_(ModuleProvider.module_id == Module.id,
+                                               ModuleProvider.name == provider_name))
+        ).where(Organization.name == organization_name).limit(1)
+        row = await self.database.fetch_one(query)
+
+        if row is None:
+            raise web.HTTPNotFound(text="The request organization could not be found")
+
+        if row['module_name'] is None:
+            raise web.HTTPNotFound(text="The requested module could not be found")
+
+        if row['provider_id'] is None:
+            raise web.HTTPNotFound(text="The requested provider could not be found")
+
+        return (_Organization(row['organization_name']), _Module(row['module_name']),
+                _ModuleProvider(row['provider_id'], row['provider_name'], row['provider_updated_at']))
+
+    async def terraform(self, request: web.Request) -> web.Response:
+        base_url = self.__base_url(request)
+        return self.__json(request, {"modules.v1": base_url + "/v1/modules"}, make_etag(base_url))
+
+    async def versions(self, request: web.Request) -> web.Response:
+        cache_address = (request.match_info['organization_name'], request.match_info['name'],
+                         request.match_info['provider'])
+        cached = self.catalog_cache.get_address('versions', *cache_address)
+        if cached is None:
+            organization, module, provider = await self.__resolve_provider(*cache_address)
+
+            query = select([ModuleProviderVersion.id, ModuleProviderVersion.version, ModuleProviderVersion.updated_at,
+                            ModuleVersionMetadata.data]).select_from(
+                ModuleProviderVersion.__table__.outerjoin(
+                    ModuleVersionMetadata.__table__, ModuleVersionMetadata.version_id == ModuleProviderVersion.id)
+            ).where(ModuleProviderVersion.provider_id == provider.id).order_by(*ModuleProviderVersion.semver_order())
+            versions = [(_ModuleProviderVersion(row['id'], row['version'], row['updated_at']), row['data'])
+                        for row in await self.database.fetch_all(query)]
+
+            cached = module_versions(organization, module, provider, versions)
+            self.catalog_cache.set_address('versions', *cache_address, value=cached)
+
+        etag, modules = cached
+        return self.__json(request, modules, etag)
+
+    async def __find_archive(self, organization_name, name, provider, version) -> dict:
+        """Look up the storage key and filename of the archive of a module version like find_archive"""
+        cache_address = (organization_name, name, provider, version)
+        archive = self.catalog_cache.get_address('download', *cache_address)
+        if archive is None:
+            row = await self.database.fetch_one(
+                select([ModuleVersionAddress.storage_key, ModuleVersionAddress.filename]).where(
+                    ModuleVersionAddress.address == ModuleVersionAddress.build_address(*cache_address)))
+            if row is None:
+                # Only resolve the whole address to find out which part of it is missing
+                await self.__resolve_provider(organization_name, name, provider)
+                raise web.HTTPNotFound(text="The requested module version could not be found")
+
+            archive = {
+                'key': row['storage_key'],
+                'filename': row['filename']
+            }
+            self.catalog_cache.set_address('download', *cache_address, value=archive)
+
+        return archive
+
+    async def download(self, request: web.Request) -> web.Response:
+        address = (request.match_info['organization_name'], request.match_info['name'],
+                   request.match_info['provider'], request.match_info['version'])
+        archive = await self.__find_archive(*address)
+
+        url = archive_url(self, archive, *address, base_url=self.__base_url(request))
+        return web.Response(headers={'X-Terraform-Get': url})
+
+    async def archive(self, request: web.Request) -> web.StreamResponse:
+        if self.storage.local is False and self.archive_cache is None:
+            raise web.HTTPNotFound(text="Module archives are not proxied by this registry")
+
+        archive = await self.__find_archive(request.match_info['organization_name'], request.match_info['name'],
+                                            request.match_info['provider'], request.match_info['version'])
+        headers = {'Content-Disposition': 'attachment; filename="%s.tar.gz"' % archive['filename']}
+
+        key = archive['key']
+        loop = asyncio.get_event_loop()
+        if self.storage.local:
+            path = self.storage.archive_path(key)
+            if await loop.run_in_executor(None, os.path.isfile, path) is False:
+                raise web.HTTPNotFound(text="The archive of the requested module version has not been uploaded")
+
+            # Sent with sendfile and takes care of Range requests
+            response = web.FileResponse(path, headers=headers)
+            response.content_type = 'application/gzip'
+            return response
+
+        try:
+            fileobj = await loop.run_in_executor(
+                None, self.archive_cache.open, key, lambda f: self.storage.copy_to(key, f))
+        except ObjectNotFoundError:
+            raise web.HTTPNotFound(text="The archive of the requested module version has not been uploaded")
+
+        # Served from the cached file like a local archive so Range and conditional requests work on every
+        # backend. It was just moved to the end of the cache so it is the last archive to be evicted.
+        fileobj.close()
+        response = web.FileResponse(fileobj.name, headers=headers)
+        response.content_type = 'application/gzip'
+        return response
+
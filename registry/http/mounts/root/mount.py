@@ -1,38 +1,151 @@
+import functools
+import gzip
+import hashlib
+import json
+import logging
+import time
+from typing import List, Optional, Tuple
+
 import cherrypy
 from apispec import APISpec
 from ingredients_http.app import HTTPApplication
 from ingredients_http.app_mount import ApplicationMount
 
+from registry.cache import ArchiveCache, CatalogCache
 from registry.http.spec.plugins.docstring import DocStringPlugin
+from registry.http.tools.etag import make_etag
+from registry.http.tools.metrics import MetricsTool
 from registry.http.tools.model import model_out_pagination
-from registry.sql.database import Database
+from registry.introspection import IntrospectionPool
+from registry.metrics import RequestMetrics, SlowRequestLog
+from registry.sql.database import Database, ReplicaError
+from registry.sql.models.module import ModuleProviderVersion
+from registry.storage.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Set after a client wrote so its reads go to the primary until the replicas caught up
+WRITE_COOKIE = 'registry_last_write'
 
 
 class RootMount(ApplicationMount):
-    def __init__(self, app: HTTPApplication, database: Database, s3_bucket, s3_client):
+    def __init__(self, app: HTTPApplication, database: Database, storage: Storage, catalog_cache: CatalogCache = None,
+                 swagger_ui_path: str = None, archive_cache: ArchiveCache = None,
+                 introspection: IntrospectionPool = None, metrics: RequestMetrics = None,
+                 slow_request_log: SlowRequestLog = None):
         super().__init__(app=app, mount_point='/')
         self.database = database
-        self.s3_bucket = s3_bucket
-        self.s3_client = s3_client
+        self.storage = storage
+        self.catalog_cache = catalog_cache if catalog_cache is not None else CatalogCache()
+        # When set module archives are proxied through the registry instead of redirecting to storage
+        self.archive_cache = archive_cache
+        # When set uploaded archives are inspected in the background
+        self.introspection = introspection
+        self.metrics = metrics if metrics is not None else RequestMetrics()
+        self.slow_request_log = slow_request_log if slow_request_log is not None else SlowRequestLog()
         self.api_spec = APISpec(
             title='TF Registry API',
             version='0.0.1',
             openapi_version='3.0.2',
             plugins=[DocStringPlugin()]
         )
+        self.swagger_ui_path = swagger_ui_path
+
+        self.api_spec_json = None
+        self.api_spec_json_gzip = None
+        self.api_spec_etag = None
+
+    def __wrote_recently(self) -> bool:
+        cookie = cherrypy.request.cookie.get(WRITE_COOKIE)
+        if cookie is None:
+            return False
+
+        try:
+            return time.time() - float(cookie.value) < self.database.replica_lag
+        except ValueError:
+            return False
+
+    def __remember_write(self):
+        if self.database.replica_lag <= 0:
+            return
+
+        # A cookie instead of state in this process so the next read sees the write on any registry instance
+        cookie = cherrypy.response.cookie
+        cookie[WRITE_COOKIE] = '%.3f' % time.time()
+        cookie[WRITE_COOKIE]['path'] = '/'
+        cookie[WRITE_COOKIE]['max-age'] = self.database.replica_lag
+
+    def db_session(self, primary=False):
+        # Reads go to a replica when there are any. Handlers that read what was just written pass primary,
+        # and clients that wrote in the last replica_lag seconds read from the primary as well.
+        if len(self.database.replicas) == 0:
+            cherrypy.request.db_session = self.database.session
+            return
+
+        read_only = cherrypy.request.method in ('GET', 'HEAD') and primary is False and \
+            self.__wrote_recently() is False
+        cherrypy.request.db_session = functools.partial(self.database.session, read_only=read_only,
+                                                        after_commit=self.__remember_write)
 
-    def db_session(self):
-        cherrypy.request.db_session = self.database.session
+        handler = cherrypy.request.handler
+        if read_only is False or handler is None:
+            return
 
-    def s3_client_tool(self):
-        cherrypy.request.s3_client = self.s3_client
+        def handler_with_fallback(*args, **kwargs):
+            try:
+                return handler(*args, **kwargs)
+            except ReplicaError as e:
+                # Reads have nothing to undo so the whole handler runs again on the primary
+                logger.warning("Retrying %s on the primary: %s", cherrypy.request.path_info, e)
+                cherrypy.request.db_session = functools.partial(self.database.session,
+                                                                after_commit=self.__remember_write)
+                return handler(*args, **kwargs)
+
+        cherrypy.request.handler = handler_with_fallback
+
+    def inspect_archive(self, version_id):
+        if self.introspection is not None:
+            self.introspection.submit(version_id)
+
+    def inspect_missing(self, versions: List[Tuple[ModuleProviderVersion, Optional[bytes]]]):
+        """Inspect the versions of a version list that have no metadata, like archives uploaded straight to storage.
+
+        Versions whose inspection failed recently are skipped until their back-off is over.
+        """
+        if self.introspection is None:
+            return
+
+        for version, data in versions:
+            if data is None:
+                self.introspection.submit(version.id, force=False)
+
+    def storage_tool(self):
+        cherrypy.request.storage = self.storage
 
     def __setup_tools(self):
         cherrypy.tools.db_session = cherrypy.Tool('before_request_body', self.db_session, priority=30)
-        cherrypy.tools.s3_client = cherrypy.Tool('before_request_body', self.s3_client_tool, priority=30)
+        cherrypy.tools.storage = cherrypy.Tool('before_request_body', self.storage_tool, priority=30)
 
         cherrypy.tools.model_out_pagination = cherrypy.Tool('before_handler', model_out_pagination)
+        cherrypy.tools.metrics = MetricsTool(self.metrics, self.slow_request_log)
+
+    def __render_api_spec(self):
+        # The spec is only complete once all routers are registered and never changes after that
+        # so render it once instead of on every request
+        api_spec_dict = self.api_spec.to_dict()
+        api_spec_dict['components']['securitySchemes'] = {
+            'Bearer': {'type': 'apiKey', 'name': 'Authorization', 'in': 'header'}}
+
+        self.api_spec_json = json.dumps(api_spec_dict).encode()
+        self.api_spec_json_gzip = gzip.compress(self.api_spec_json)
+        self.api_spec_etag = make_etag(hashlib.sha1(self.api_spec_json).hexdigest())
+
+    def mount_config(self):
+        config = super().mount_config()
+        config['tools.metrics.on'] = True
+        return config
 
     def setup(self):
         self.__setup_tools()
         super().setup()
+        self.__render_api_spec()
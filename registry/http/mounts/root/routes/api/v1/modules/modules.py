@@ -1,17 +1,17 @@
-import base64
-import uuid
 from typing import List
 
+import arrow
 import cherrypy
 from ingredients_http.request_methods import RequestMethods
 from ingredients_http.route import Route
-from sqlalchemy import desc
 
 from registry.http.mounts.root.routes.api.v1.modules.validation_models.modules import ParamsModule, ParamsListModule, \
     ParamsCreateModule, RequestCreateModule, ResponseModule
 from registry.http.router import RegistryRouter
+from registry.http.tools.etag import make_etag, validate_etag
+from registry.sql.address import resolve_address
 from registry.sql.models.module import Module, ModuleProvider
-from registry.sql.models.organization import Organization
+from registry.sql.pagination import paginate
 
 
 class ModuleRouter(RegistryRouter):
@@ -39,22 +39,23 @@ class ModuleRouter(RegistryRouter):
         """
         model: RequestCreateModule = cherrypy.request.model
         with cherrypy.request.db_session() as session:
-            organization = session.query(Organization).filter(Organization.name == organization_name).first()
+            organization, module, _, _ = resolve_address(session, organization_name, model.name)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == model.name).first()
             if module is not None:
                 raise cherrypy.HTTPError(409, 'A module with the requested name already exists')
 
             module = Module()
             module.organization_id = organization.id
             module.name = model.name
+            organization.updated_at = arrow.utcnow()
             session.add(module)
             session.commit()
             session.refresh(module)
 
+        self.mount.catalog_cache.invalidate_address(organization_name, module.name)
+
         response = ResponseModule()
         response.name = module.name
         response.created_at = module.created_at
@@ -78,15 +79,15 @@ class ModuleRouter(RegistryRouter):
               description: The Module
         """
         with cherrypy.request.db_session() as session:
-            organization = session.query(Organization).filter(Organization.name == organization_name).first()
+            organization, module, _, _ = resolve_address(session, organization_name, module_name)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(409, 'A module with the requested name does not exist.')
 
+        validate_etag(make_etag(module.id, module.updated_at))
+
         response = ResponseModule()
         response.name = module.name
         response.created_at = module.created_at
@@ -110,29 +111,17 @@ class ModuleRouter(RegistryRouter):
               description: List of Modules
         """
         with cherrypy.request.db_session() as session:
-            organization = session.query(Organization).filter(Organization.name == organization_name).first()
+            organization, _, _, _ = resolve_address(session, organization_name)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            modules: List[Module] = session.query(Module).filter(Module.organization_id == organization.id).order_by(
-                desc(Module.created_at))
-            if marker is not None:
-                try:
-                    marker_id = uuid.UUID(bytes=base64.urlsafe_b64decode(marker + "=="))
-                except ValueError:
-                    raise cherrypy.HTTPError(400, 'Invalid module list marker')
-                marker: Module = session.query(Module).filter(Module.id == marker_id).first()
-                if marker is None:
-                    raise cherrypy.HTTPError(404, 'Unknown module list marker')
-
-                modules = modules.filter(Module.created_at < marker.created_at)
-            modules = modules.limit(limit + 1).all()
-
-            if len(modules) > limit:
-                marker = base64.urlsafe_b64encode(modules[-1].id.bytes).decode().rstrip("=")
-                del modules[-1]
-            else:
-                marker = None
+            modules: List[Module] = session.query(Module).filter(Module.organization_id == organization.id)
+            try:
+                modules, marker = paginate(modules, Module, limit, marker)
+            except ValueError:
+                raise cherrypy.HTTPError(400, 'Invalid module list marker')
+
+            validate_etag(make_etag(marker, *[(x.id, x.updated_at) for x in modules]))
 
             response = []
             for m in modules:
@@ -160,18 +149,19 @@ class ModuleRouter(RegistryRouter):
         """
         cherrypy.response.status = 204
         with cherrypy.request.db_session() as session:
-            organization = session.query(Organization).filter(Organization.name == organization_name).first()
+            organization, module, _, _ = resolve_address(session, organization_name, module_name)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
 
-            provider = session.query(ModuleProvider).filter(ModuleProvider.module_id == module.id).scalar()
+            provider = session.query(ModuleProvider).filter(ModuleProvider.module_id == module.id).first()
             if provider is not None:
                 raise cherrypy.HTTPError(409, 'Module cannot be deleted while it has providers.')
 
-        module.delete()
-        session.commit()
+            organization.updated_at = arrow.utcnow()
+            session.delete(module)
+            session.commit()
+
+        self.mount.catalog_cache.invalidate_address(organization_name, module_name)
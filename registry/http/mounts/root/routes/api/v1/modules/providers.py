@@ -1,17 +1,17 @@
-import base64
-import uuid
 from typing import List
 
+import arrow
 import cherrypy
 from ingredients_http.request_methods import RequestMethods
 from ingredients_http.route import Route
-from sqlalchemy import desc
 
 from registry.http.mounts.root.routes.api.v1.modules.validation_models.providers import ParamsCreateProvider, \
     RequestCreateProvider, ResponseProvider, ParamsProvider, ParamsListProvider
 from registry.http.router import RegistryRouter
-from registry.sql.models.module import Module, ModuleProvider, ModuleProviderVersion
-from registry.sql.models.organization import Organization
+from registry.http.tools.etag import make_etag, validate_etag
+from registry.sql.address import resolve_address
+from registry.sql.models.module import ModuleProvider, ModuleProviderVersion
+from registry.sql.pagination import paginate
 
 
 class ModuleProviderRouter(RegistryRouter):
@@ -40,28 +40,26 @@ class ModuleProviderRouter(RegistryRouter):
         """
         model: RequestCreateProvider = cherrypy.request.model
         with cherrypy.request.db_session() as session:
-            organization: Organization = session.query(Organization).filter(
-                Organization.name == organization_name).first()
+            organization, module, provider, _ = resolve_address(session, organization_name, module_name, model.name)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module: Module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
 
-            provider: ModuleProvider = session.query(ModuleProvider).filter(
-                ModuleProvider.module_id == module.id).filter(ModuleProvider.name == model.name).first()
             if provider is not None:
                 raise cherrypy.HTTPError(409, 'A provider with the requested name already exists')
 
             provider = ModuleProvider()
             provider.module_id = module.id
             provider.name = model.name
+            module.updated_at = arrow.utcnow()
             session.add(provider)
             session.commit()
             session.refresh(provider)
 
+        self.mount.catalog_cache.invalidate_address(organization_name, module_name, provider.name)
+
         response = ResponseProvider()
         response.name = provider.name
         response.created_at = provider.created_at
@@ -86,21 +84,18 @@ class ModuleProviderRouter(RegistryRouter):
               description: The Provider
         """
         with cherrypy.request.db_session() as session:
-            organization: Organization = session.query(Organization).filter(
-                Organization.name == organization_name).first()
+            organization, module, provider, _ = resolve_address(session, organization_name, module_name, provider_name)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module: Module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
 
-            provider: ModuleProvider = session.query(ModuleProvider).filter(
-                ModuleProvider.module_id == module.id).filter(ModuleProvider.name == provider_name).first()
             if provider is None:
                 raise cherrypy.HTTPError(409, 'A provider with the requested name does not exist.')
 
+        validate_etag(make_etag(provider.id, provider.updated_at))
+
         response = ResponseProvider()
         response.name = provider.name
         response.created_at = provider.created_at
@@ -125,35 +120,21 @@ class ModuleProviderRouter(RegistryRouter):
               description: List of Providers
         """
         with cherrypy.request.db_session() as session:
-            organization: Organization = session.query(Organization).filter(
-                Organization.name == organization_name).first()
+            organization, module, _, _ = resolve_address(session, organization_name, module_name)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module: Module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
 
             providers: List[ModuleProvider] = session.query(ModuleProvider).filter(
-                ModuleProvider.module_id == module.id).order_by(desc(ModuleProvider.created_at))
-            if marker is not None:
-                try:
-                    marker_id = uuid.UUID(bytes=base64.urlsafe_b64decode(marker + "=="))
-                except ValueError:
-                    raise cherrypy.HTTPError(400, 'Invalid provider list marker')
-                marker: ModuleProvider = session.query(ModuleProvider).filter(ModuleProvider.id == marker_id).first()
-                if marker is None:
-                    raise cherrypy.HTTPError(404, 'Unknown provider list marker')
-
-                providers = providers.filter(ModuleProvider.created_at < marker.created_at)
-            providers = providers.limit(limit + 1).all()
-
-        if len(providers) > limit:
-            marker = base64.urlsafe_b64encode(providers[-1].id.bytes).decode().rstrip("=")
-            del providers[-1]
-        else:
-            marker = None
+                ModuleProvider.module_id == module.id)
+            try:
+                providers, marker = paginate(providers, ModuleProvider, limit, marker)
+            except ValueError:
+                raise cherrypy.HTTPError(400, 'Invalid provider list marker')
+
+        validate_etag(make_etag(marker, *[(x.id, x.updated_at) for x in providers]))
 
         response = []
         for p in providers:
@@ -181,25 +162,23 @@ class ModuleProviderRouter(RegistryRouter):
         """
         cherrypy.response.status = 204
         with cherrypy.request.db_session() as session:
-            organization: Organization = session.query(Organization).filter(
-                Organization.name == organization_name).first()
+            organization, module, provider, _ = resolve_address(session, organization_name, module_name, provider_name)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module: Module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
 
-            provider = session.query(ModuleProvider).filter(
-                ModuleProvider.module_id == module.id).filter(ModuleProvider.name == provider_name).first()
             if provider is None:
                 raise cherrypy.HTTPError(404, 'A provider with the requested name does not exist.')
 
             version = session.query(ModuleProviderVersion).filter(
-                ModuleProviderVersion.provider_id == provider.id).scalar()
+                ModuleProviderVersion.provider_id == provider.id).first()
             if version is not None:
                 raise cherrypy.HTTPError(409, 'Provider cannot be deleted while it has versions.')
 
-            provider.delete()
+            module.updated_at = arrow.utcnow()
+            session.delete(provider)
             session.commit()
+
+        self.mount.catalog_cache.invalidate_address(organization_name, module_name, provider_name)
@@ -0,0 +1,215 @@
+import uuid
+
+import arrow
+import cherrypy
+from ingredients_http.request_methods import RequestMethods
+from ingredients_http.route import Route
+
+from registry.http.mounts.root.routes.api.v1.modules.validation_models.versions import ParamsVersionUpload, \
+    ParamsVersionUploadPart, RequestCompleteUpload, ResponseUploadPart, ResponseUploadedPart
+from registry.http.router import RegistryRouter
+from registry.sql.address import resolve_address
+from registry.sql.archive import release_storage_key, store_by_hash
+from registry.sql.deletion import cancel_deletion, enqueue_deletion
+from registry.sql.models.module import ModuleProviderVersion, ModuleVersionAddress
+from registry.storage.storage import CHUNK_SIZE, HashingReader, StorageError, UploadNotFoundError
+
+
+class ModuleProviderVersionUploadRouter(RegistryRouter):
+    def __init__(self):
+        super().__init__(
+            uri_base='{organization_name}/{module_name}/providers/{provider_name}/versions/{version}/uploads')
+
+    def __version_id(self, organization_name, module_name, provider_name, version) -> uuid.UUID:
+        with cherrypy.request.db_session() as session:
+            organization, module, provider, version = resolve_address(session, organization_name, module_name,
+                                                                      provider_name, version)
+            if organization is None:
+                raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
+
+            if module is None:
+                raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
+
+            if provider is None:
+                raise cherrypy.HTTPError(409, 'A provider with the requested name does not exist.')
+
+            if version is None:
+                raise cherrypy.HTTPError(409, 'The requested version does not exist.')
+
+            return version.id
+
+    @Route(route='{upload_id}/parts/{part_number}')
+    # Called right after the version is created so it may not be on the replicas yet
+    @cherrypy.tools.db_session(primary=True)
+    @cherrypy.tools.storage()
+    @cherrypy.tools.model_params(cls=ParamsVersionUploadPart)
+    @cherrypy.tools.model_out(cls=ResponseUploadPart)
+    def part_url(self, organization_name, module_name, provider_name, version, upload_id, part_number):
+        """Get the upload URL of a part
+        ---
+        get:
+          description: Get the URL to upload a part of a multipart Version upload to
+          tags:
+            - module
+            - provider
+            - version
+          responses:
+            200:
+              description: The part upload URL
+        """
+        version_id = self.__version_id(organization_name, module_name, provider_name, version)
+        key = str(version_id)
+
+        upload_url = cherrypy.request.storage.upload_part_url(key, upload_id, part_number)
+        if upload_url is None:
+            # The storage can not be uploaded to directly so the part goes through the registry
+            upload_url = cherrypy.url()
+
+        response = ResponseUploadPart()
+        response.part_number = part_number
+        response.upload_url = upload_url
+
+        return response
+
+    @Route(route='{upload_id}/parts/{part_number}', methods=[RequestMethods.PUT])
+    @cherrypy.tools.db_session()
+    @cherrypy.tools.storage()
+    @cherrypy.tools.model_params(cls=ParamsVersionUploadPart)
+    @cherrypy.tools.model_out(cls=ResponseUploadedPart)
+    def upload_part(self, organization_name, module_name, provider_name, version, upload_id, part_number):
+        """Upload a part
+        ---
+        put:
+          description: Upload a part of a multipart Version upload through the registry
+          tags:
+            - module
+            - provider
+            - version
+          requestBody:
+            description: The content of the part
+            content:
+              application/octet-stream:
+                schema:
+                  type: string
+                  format: binary
+          responses:
+            200:
+              description: The uploaded part
+        """
+        version_id = self.__version_id(organization_name, module_name, provider_name, version)
+        key = str(version_id)
+
+        try:
+            etag = cherrypy.request.storage.write_part(key, upload_id, part_number, cherrypy.request.body)
+        except UploadNotFoundError:
+            raise cherrypy.HTTPError(404, 'The requested upload does not exist.')
+
+        cherrypy.response.headers['ETag'] = etag
+
+        response = ResponseUploadedPart()
+        response.part_number = part_number
+        response.etag = etag
+
+        return response
+
+    @Route(route='{upload_id}/complete', methods=[RequestMethods.POST])
+    @cherrypy.tools.db_session()
+    @cherrypy.tools.storage()
+    @cherrypy.tools.model_params(cls=ParamsVersionUpload)
+    @cherrypy.tools.model_in(cls=RequestCompleteUpload)
+    def complete(self, organization_name, module_name, provider_name, version, upload_id):
+        """Complete an upload
+        ---
+        post:
+          description: Join the uploaded parts of a multipart Version upload into the archive
+          tags:
+            - module
+            - provider
+            - version
+          requestBody:
+            description: The parts to join in order
+          responses:
+            204: Upload completed
+        """
+        model: RequestCompleteUpload = cherrypy.request.model
+        part_numbers = [part.part_number for part in model.parts]
+        if part_numbers != sorted(set(part_numbers)):
+            raise cherrypy.HTTPError(400, 'The parts must be in ascending order of their part number.')
+
+        version_id = self.__version_id(organization_name, module_name, provider_name, version)
+        key = str(version_id)
+
+        try:
+            cherrypy.request.storage.complete_multipart_upload(key, upload_id,
+                                                               [(part.part_number, part.etag) for part in model.parts])
+        except UploadNotFoundError:
+            raise cherrypy.HTTPError(404, 'The requested upload does not exist.')
+        except StorageError as e:
+            raise cherrypy.HTTPError(400, str(e))
+
+        # Parts sent through the registry were joined on this host, hashing the archive only reads a local file
+        storage = cherrypy.request.storage
+        reader = None
+        if storage.local:
+            archive = storage.open(key)
+            try:
+                reader = HashingReader(archive)
+                while reader.read(CHUNK_SIZE):
+                    pass
+            finally:
+                archive.close()
+
+        stale_keys = []
+        with cherrypy.request.db_session() as session:
+            version = session.query(ModuleProviderVersion).get(version_id)
+            version_address = session.query(ModuleVersionAddress).filter(
+                ModuleVersionAddress.version_id == version_id).first()
+            if version is not None and version_address is not None:
+                if reader is not None:
+                    stale_keys = store_by_hash(session, storage, version, version_address, key, reader.sha256,
+                                               reader.size)
+                elif version_address.storage_key != key:
+                    # Uploaded through the registry since and pointing at a content addressed archive
+                    stale_key = release_storage_key(session, version, version_address.storage_key)
+                    if stale_key is not None:
+                        enqueue_deletion(session, stale_key)
+                        stale_keys.append(stale_key)
+                    version_address.storage_key = key
+                    version.archive_size = None
+                    version.archive_sha256 = None
+
+                # The key may have been queued for deletion when the version stopped using it
+                if key not in stale_keys:
+                    cancel_deletion(session, key)
+                version.updated_at = arrow.utcnow()
+                session.commit()
+
+        if self.mount.archive_cache is not None:
+            for stale_key in stale_keys + [key]:
+                self.mount.archive_cache.invalidate(stale_key)
+        self.mount.catalog_cache.invalidate_address(organization_name, module_name, provider_name)
+        self.mount.inspect_archive(version_id)
+
+        cherrypy.response.status = 204
+
+    @Route(route='{upload_id}', methods=[RequestMethods.DELETE])
+    @cherrypy.tools.db_session()
+    @cherrypy.tools.storage()
+    @cherrypy.tools.model_params(cls=ParamsVersionUpload)
+    def abort(self, organization_name, module_name, provider_name, version, upload_id):
+        """Abort an upload
+        ---
+        delete:
+          description: Abort a multipart Version upload and throw away its parts
+          tags:
+            - module
+            - provider
+            - version
+          responses:
+            204: Upload aborted
+        """
+        version_id = self.__version_id(organization_name, module_name, provider_name, version)
+        key = str(version_id)
+        cherrypy.request.storage.abort_multipart_upload(key, upload_id)
+
+        cherrypy.response.status = 204
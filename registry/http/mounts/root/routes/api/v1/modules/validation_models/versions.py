@@ -1,5 +1,5 @@
 from schematics import Model
-from schematics.types import StringType, IntType, URLType
+from schematics.types import StringType, IntType, URLType, BooleanType, ListType, ModelType
 
 from registry.http.schematics.types import NameType, SemVerType, ArrowType
 
@@ -25,15 +25,49 @@ class ParamsListVersion(Model):
     marker = StringType()
 
 
+class ParamsVersionUpload(ParamsVersion):
+    upload_id = StringType(required=True, max_length=1024)
+
+
+class ParamsVersionUploadPart(ParamsVersionUpload):
+    # The same limits as S3
+    part_number = IntType(required=True, min_value=1, max_value=10000)
+
+
 class RequestCreateVersion(Model):
     version = SemVerType(required=True)
+    # Upload the archive in parts instead of all at once
+    multipart = BooleanType(default=False)
+
+
+class RequestUploadPart(Model):
+    part_number = IntType(required=True, min_value=1, max_value=10000)
+    etag = StringType(required=True)
+
+
+class RequestCompleteUpload(Model):
+    parts = ListType(ModelType(RequestUploadPart), required=True, min_size=1, max_size=10000)
 
 
 class ResponseVersion(Model):
     version = SemVerType(required=True)
+    archive_size = IntType()
+    archive_sha256 = StringType()
     created_at = ArrowType(required=True)
     updated_at = ArrowType(required=True)
 
 
 class ResponseCreateVersion(ResponseVersion):
-    upload_url = URLType(required=True)
+    # May point at the registry itself which does not need to be reachable by a fully qualified domain name
+    upload_url = URLType(fqdn=False)
+    upload_id = StringType()
+
+
+class ResponseUploadPart(Model):
+    part_number = IntType(required=True)
+    upload_url = URLType(required=True, fqdn=False)
+
+
+class ResponseUploadedPart(Model):
+    part_number = IntType(required=True)
+    etag = StringType(required=True)
@@ -1,27 +1,41 @@
-import base64
-import datetime
 import uuid
 from typing import List
 
+import arrow
 import cherrypy
 from ingredients_http.request_methods import RequestMethods
 from ingredients_http.route import Route
-from sqlalchemy import desc
 
 from registry.http.mounts.root.routes.api.v1.modules.validation_models.versions import ParamsCreateVersion, \
     ParamsVersion, ParamsListVersion, RequestCreateVersion, ResponseVersion, ResponseCreateVersion
 from registry.http.router import RegistryRouter
-from registry.sql.models.module import Module, ModuleProvider, ModuleProviderVersion
-from registry.sql.models.organization import Organization
+from registry.http.tools.etag import make_etag, validate_etag
+from registry.sql.address import resolve_address
+from registry.sql.archive import release_storage_key, store_by_hash
+from registry.sql.deletion import enqueue_deletion
+from registry.sql.models.module import ModuleProviderVersion, ModuleVersionAddress, ModuleVersionMetadata
+from registry.sql.pagination import paginate
+from registry.storage.storage import HashingReader
 
 
 class ModuleProviderVersionRouter(RegistryRouter):
     def __init__(self):
         super().__init__(uri_base='{organization_name}/{module_name}/providers/{provider_name}/versions')
 
+    @staticmethod
+    def __response(version: ModuleProviderVersion) -> ResponseVersion:
+        response = ResponseVersion()
+        response.version = version.version
+        response.archive_size = version.archive_size
+        response.archive_sha256 = version.archive_sha256
+        response.created_at = version.created_at
+        response.updated_at = version.updated_at
+
+        return response
+
     @Route(methods=[RequestMethods.POST])
     @cherrypy.tools.db_session()
-    @cherrypy.tools.s3_client()
+    @cherrypy.tools.storage()
     @cherrypy.tools.model_params(cls=ParamsCreateVersion)
     @cherrypy.tools.model_in(cls=RequestCreateVersion)
     @cherrypy.tools.model_out(cls=ResponseCreateVersion)
@@ -42,50 +56,136 @@ class ModuleProviderVersionRouter(RegistryRouter):
         """
         model: RequestCreateVersion = cherrypy.request.model
         with cherrypy.request.db_session() as session:
-            organization: Organization = session.query(Organization).filter(
-                Organization.name == organization_name).first()
+            organization, module, provider, version = resolve_address(session, organization_name, module_name,
+                                                                      provider_name, model.version)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module: Module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
 
-            provider: ModuleProvider = session.query(ModuleProvider).filter(
-                ModuleProvider.module_id == module.id).filter(ModuleProvider.name == provider_name).first()
             if provider is None:
                 raise cherrypy.HTTPError(409, 'A provider with the requested name does not exist.')
 
-            version: ModuleProviderVersion = session.query(ModuleProviderVersion).filter(
-                ModuleProviderVersion.provider_id == provider.id).filter(
-                ModuleProviderVersion.version == str(model.version)).first()
             if version is not None:
                 raise cherrypy.HTTPError(409, 'The requested version already exists')
 
             version = ModuleProviderVersion()
             version.provider_id = provider.id
             version.version = str(model.version)
+            provider.updated_at = arrow.utcnow()
             session.add(version)
+            session.flush()
+
+            version_address = ModuleVersionAddress()
+            version_address.address = ModuleVersionAddress.build_address(organization.name, module.name,
+                                                                          provider.name, version.version)
+            version_address.version_id = version.id
+            version_address.storage_key = str(version.id)
+            version_address.filename = "-".join([organization.name, module.name, provider.name, version.version])
+            session.add(version_address)
             session.commit()
             session.refresh(version)
 
-        s3_client = cherrypy.request.s3_client
-
-        put_object_url = s3_client.generate_presigned_url(
-            ClientMethod='put_object',
-            Params={'Bucket': self.mount.s3_bucket, 'Key': str(version.id)},
-            ExpiresIn=datetime.timedelta(minutes=5).seconds
-        )
+        self.mount.catalog_cache.invalidate_address(organization_name, module_name, provider_name)
 
         response = ResponseCreateVersion()
         response.version = version.version
-        response.upload_url = put_object_url
+
+        storage = cherrypy.request.storage
+        if model.multipart:
+            # Part upload URLs are handed out one at a time by the uploads endpoint
+            response.upload_id = storage.create_multipart_upload(str(version.id))
+        else:
+            upload_url = storage.upload_url(str(version.id))
+            if upload_url is None:
+                # The storage can not be uploaded to directly so the archive goes through the registry
+                upload_url = cherrypy.url("/api/v1/modules/%s/%s/providers/%s/versions/%s/upload" % (
+                    organization_name, module_name, provider_name, version.version))
+            response.upload_url = upload_url
         response.created_at = version.created_at
         response.updated_at = version.updated_at
 
         return response
 
+    @Route(route='{version}/upload', methods=[RequestMethods.PUT])
+    @cherrypy.tools.db_session()
+    @cherrypy.tools.storage()
+    @cherrypy.tools.model_params(cls=ParamsVersion)
+    @cherrypy.tools.model_out(cls=ResponseVersion)
+    def upload(self, organization_name, module_name, provider_name, version):
+        """Upload the archive of a Version
+        ---
+        put:
+          description: Upload the tar.gz archive of a Version through the registry, recording its size and SHA-256
+          tags:
+            - module
+            - provider
+            - version
+          requestBody:
+            description: The tar.gz archive
+            content:
+              application/octet-stream:
+                schema:
+                  type: string
+                  format: binary
+          responses:
+            200:
+              description: The Version
+        """
+        with cherrypy.request.db_session() as session:
+            organization, module, provider, version = resolve_address(session, organization_name, module_name,
+                                                                      provider_name, version)
+            if organization is None:
+                raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
+
+            if module is None:
+                raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
+
+            if provider is None:
+                raise cherrypy.HTTPError(409, 'A provider with the requested name does not exist.')
+
+            if version is None:
+                raise cherrypy.HTTPError(409, 'The requested version does not exist.')
+
+            version_id = version.id
+
+            # The body is streamed into storage in chunks and hashed on the way through,
+            # the session is not used meanwhile so it does not hold on to a connection.
+            # Until the hash is known the archive is staged under a key of its own.
+            session.close()
+            storage = cherrypy.request.storage
+            staging_key = 'uploads/' + uuid.uuid4().hex
+            reader = HashingReader(cherrypy.request.body)
+            storage.write(staging_key, reader)
+
+            try:
+                version = session.query(ModuleProviderVersion).get(version_id)
+                if version is None:
+                    raise cherrypy.HTTPError(409, 'The requested version does not exist.')
+                version_address = session.query(ModuleVersionAddress).filter(
+                    ModuleVersionAddress.version_id == version_id).one()
+
+                # Identical archives are stored once under their hash and shared between versions
+                stale_keys = store_by_hash(session, storage, version, version_address, staging_key, reader.sha256,
+                                           reader.size)
+                version.updated_at = arrow.utcnow()
+                session.commit()
+                session.refresh(version)
+            except Exception:
+                # Nothing was recorded, remove the staged archive right away if it was not moved
+                storage.delete(staging_key)
+                raise
+
+        if self.mount.archive_cache is not None:
+            for key in stale_keys:
+                self.mount.archive_cache.invalidate(key)
+
+        self.mount.catalog_cache.invalidate_address(organization_name, module_name, provider_name)
+        self.mount.inspect_archive(version_id)
+
+        return self.__response(version)
+
     @Route(route='{version}')
     @cherrypy.tools.db_session()
     @cherrypy.tools.model_params(cls=ParamsVersion)
@@ -104,33 +204,23 @@ class ModuleProviderVersionRouter(RegistryRouter):
               description: The Version
         """
         with cherrypy.request.db_session() as session:
-            organization: Organization = session.query(Organization).filter(
-                Organization.name == organization_name).first()
+            organization, module, provider, version = resolve_address(session, organization_name, module_name,
+                                                                      provider_name, version)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module: Module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
 
-            provider: ModuleProvider = session.query(ModuleProvider).filter(
-                ModuleProvider.module_id == module.id).filter(ModuleProvider.name == provider_name).first()
             if provider is None:
                 raise cherrypy.HTTPError(409, 'A provider with the requested name does not exist.')
 
-            version: ModuleProviderVersion = session.query(ModuleProviderVersion).filter(
-                ModuleProviderVersion.provider_id == provider.id).filter(
-                ModuleProviderVersion.version == str(version)).first()
             if version is None:
                 raise cherrypy.HTTPError(409, 'The requested version does not exist.')
 
-        response = ResponseVersion()
-        response.version = version.version
-        response.created_at = version.created_at
-        response.updated_at = version.updated_at
+        validate_etag(make_etag(version.id, version.updated_at))
 
-        return response
+        return self.__response(version)
 
     @Route()
     @cherrypy.tools.db_session()
@@ -150,54 +240,34 @@ class ModuleProviderVersionRouter(RegistryRouter):
               description: List of Versions
         """
         with cherrypy.request.db_session() as session:
-            organization: Organization = session.query(Organization).filter(
-                Organization.name == organization_name).first()
+            organization, module, provider, _ = resolve_address(session, organization_name, module_name, provider_name)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module: Module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
 
-            provider: ModuleProvider = session.query(ModuleProvider).filter(
-                ModuleProvider.module_id == module.id).filter(ModuleProvider.name == provider_name).first()
             if provider is None:
                 raise cherrypy.HTTPError(409, 'A provider with the requested name does not exist.')
 
             versions: List[ModuleProviderVersion] = session.query(ModuleProviderVersion).filter(
-                ModuleProviderVersion.provider_id == provider.id).order_by(desc(ModuleProviderVersion.created_at))
-            if marker is not None:
-                try:
-                    marker_id = uuid.UUID(bytes=base64.urlsafe_b64decode(marker + "=="))
-                except ValueError:
-                    raise cherrypy.HTTPError(400, 'Invalid version list marker')
-                marker: ModuleProviderVersion = session.query(ModuleProviderVersion).filter(
-                    ModuleProviderVersion.id == marker_id).first()
-                if marker is None:
-                    raise cherrypy.HTTPError(404, 'Unknown version list marker')
-
-                versions = versions.filter(ModuleProviderVersion.created_at < marker.created_at)
-            versions = versions.limit(limit + 1).all()
-
-            if len(versions) > limit:
-                marker = base64.urlsafe_b64encode(versions[-1].id.bytes).decode().rstrip("=")
-                del versions[-1]
-            else:
-                marker = None
+                ModuleProviderVersion.provider_id == provider.id)
+            try:
+                versions, marker = paginate(versions, ModuleProviderVersion, limit, marker)
+            except ValueError:
+                raise cherrypy.HTTPError(400, 'Invalid version list marker')
+
+            validate_etag(make_etag(marker, *[(x.id, x.updated_at) for x in versions]))
 
             response = []
             for v in versions:
-                version = ResponseVersion()
-                version.version = v.version
-                version.created_at = v.created_at
-                version.updated_at = v.updated_at
-                response.append(version)
+                response.append(self.__response(v))
 
             return response, marker
 
     @Route(route='{version}', methods=[RequestMethods.DELETE])
     @cherrypy.tools.db_session()
+    @cherrypy.tools.storage()
     @cherrypy.tools.model_params(cls=ParamsVersion)
     def delete(self, organization_name, module_name, provider_name, version):
         """Delete a Version
@@ -213,29 +283,37 @@ class ModuleProviderVersionRouter(RegistryRouter):
         """
         cherrypy.response.status = 204
         with cherrypy.request.db_session() as session:
-            organization: Organization = session.query(Organization).filter(
-                Organization.name == organization_name).first()
+            organization, module, provider, version = resolve_address(session, organization_name, module_name,
+                                                                      provider_name, version)
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module: Module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == module_name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, 'A module with the requested name does not exist.')
 
-            provider: ModuleProvider = session.query(ModuleProvider).filter(
-                ModuleProvider.module_id == module.id).filter(ModuleProvider.name == provider_name).first()
             if provider is None:
                 raise cherrypy.HTTPError(409, 'A provider with the requested name does not exist.')
 
-            version = session.query(ModuleProviderVersion).filter(
-                ModuleProviderVersion.provider_id == provider.id).filter(
-                ModuleProviderVersion.version == str(version)).first()
             if version is None:
                 raise cherrypy.HTTPError(409, 'The requested version does not exist.')
 
-            version.delete()
+            stale_key = None
+            version_address = session.query(ModuleVersionAddress).filter(
+                ModuleVersionAddress.version_id == version.id).first()
+            if version_address is not None:
+                stale_key = release_storage_key(session, version, version_address.storage_key)
+                if stale_key is not None:
+                    enqueue_deletion(session, stale_key)
+                session.delete(version_address)
+
+            # SQLite does not enforce the foreign key so the metadata is not deleted along with the version
+            session.query(ModuleVersionMetadata).filter(ModuleVersionMetadata.version_id == version.id).delete(
+                synchronize_session=False)
+            provider.updated_at = arrow.utcnow()
+            session.delete(version)
+            session.commit()
 
-            # TODO: delete object from s3 if it exists
+        if stale_key is not None and self.mount.archive_cache is not None:
+            self.mount.archive_cache.invalidate(stale_key)
 
-            session.commit()
+        self.mount.catalog_cache.invalidate_address(organization_name, module_name, provider_name)
@@ -1,17 +1,16 @@
-import base64
-import uuid
 from typing import List
 
 import cherrypy
 from ingredients_http.request_methods import RequestMethods
 from ingredients_http.route import Route
-from sqlalchemy import desc
 
 from registry.http.mounts.root.routes.api.v1.validation_models.organizations import RequestCreateOrganization, \
     ResponseOrganization, ParamsOrganization, ParamsListOrganization
 from registry.http.router import RegistryRouter
+from registry.http.tools.etag import make_etag, validate_etag
 from registry.sql.models.module import Module
 from registry.sql.models.organization import Organization
+from registry.sql.pagination import paginate
 
 
 class OrganizationRouter(RegistryRouter):
@@ -76,6 +75,8 @@ class OrganizationRouter(RegistryRouter):
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
+        validate_etag(make_etag(organization.id, organization.updated_at))
+
         response = ResponseOrganization()
         response.name = organization.name
         response.created_at = organization.created_at
@@ -100,24 +101,13 @@ class OrganizationRouter(RegistryRouter):
 
         """
         with cherrypy.request.db_session() as session:
-            organizations: List[Organization] = session.query(Organization).order_by(desc(Organization.created_at))
-            if marker is not None:
-                try:
-                    marker_id = uuid.UUID(bytes=base64.urlsafe_b64decode(marker + "=="))
-                except ValueError:
-                    raise cherrypy.HTTPError(400, 'Invalid organization list marker')
-                marker: Organization = session.query(Organization).filter(Organization.id == marker_id).first()
-                if marker is None:
-                    raise cherrypy.HTTPError(404, 'Unknown organization list marker')
-
-                organizations = organizations.filter(Organization.created_at < marker.created_at)
-            organizations = organizations.limit(limit + 1).all()
-
-            if len(organizations) > limit:
-                marker = base64.urlsafe_b64encode(organizations[-1].id.bytes).decode().rstrip("=")
-                del organizations[-1]
-            else:
-                marker = None
+            organizations: List[Organization] = session.query(Organization)
+            try:
+                organizations, marker = paginate(organizations, Organization, limit, marker)
+            except ValueError:
+                raise cherrypy.HTTPError(400, 'Invalid organization list marker')
+
+            validate_etag(make_etag(marker, *[(x.id, x.updated_at) for x in organizations]))
 
             response = []
             for o in organizations:
@@ -155,9 +145,9 @@ class OrganizationRouter(RegistryRouter):
             if organization is None:
                 raise cherrypy.HTTPError(404, 'An organization with the requested name does not exist.')
 
-            module = session.query(Module).filter(Module.organization_id == organization.id).scalar()
+            module = session.query(Module).filter(Module.organization_id == organization.id).first()
             if module is not None:
                 raise cherrypy.HTTPError(404, 'Organization cannot be deleted while it has modules.')
 
-            organization.delete()
+            session.delete(organization)
             session.commit()
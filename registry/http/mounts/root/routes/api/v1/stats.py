@@ -0,0 +1,77 @@
+import cherrypy
+from ingredients_http.request_methods import RequestMethods
+from ingredients_http.route import Route
+
+from registry.http.mounts.root.routes.api.v1.validation_models.stats import RequestSlowRequestLog, \
+    ResponseSlowRequestLog
+from registry.http.router import RegistryRouter
+
+
+class StatsRouter(RegistryRouter):
+
+    def __init__(self):
+        super().__init__(uri_base='stats')
+
+    @Route()
+    @cherrypy.tools.json_out()
+    def get(self):
+        """Get runtime statistics of the registry
+        ---
+        get:
+          description: Get the database connection pool and cache statistics of this registry process
+          tags:
+            - stats
+          responses:
+            200:
+              description: The statistics
+        """
+        return {
+            'database_pool': self.mount.database.pool_stats(),
+            'catalog_cache': self.mount.catalog_cache.stats(),
+            'archive_cache': self.mount.archive_cache.stats() if self.mount.archive_cache is not None else None,
+        }
+
+    def __slow_request_log(self) -> ResponseSlowRequestLog:
+        response = ResponseSlowRequestLog()
+        response.max_seconds = self.mount.slow_request_log.max_seconds
+        response.max_queries = self.mount.slow_request_log.max_queries
+
+        return response
+
+    @Route(route='slow-requests')
+    @cherrypy.tools.model_out(cls=ResponseSlowRequestLog)
+    def slow_requests(self):
+        """Get the thresholds of the slow request log
+        ---
+        get:
+          description: Get the duration and query count over which requests to this registry process are logged
+          tags:
+            - stats
+          responses:
+            200:
+              description: The slow request log thresholds
+        """
+        return self.__slow_request_log()
+
+    @Route(route='slow-requests', methods=[RequestMethods.PUT])
+    @cherrypy.tools.model_in(cls=RequestSlowRequestLog)
+    @cherrypy.tools.model_out(cls=ResponseSlowRequestLog)
+    def update_slow_requests(self):
+        """Change the thresholds of the slow request log
+        ---
+        put:
+          description: Change the duration and query count over which requests to this registry process are logged
+            without restarting it, a threshold of 0 disables it
+          tags:
+            - stats
+          requestBody:
+            description: The new thresholds
+          responses:
+            200:
+              description: The slow request log thresholds
+        """
+        model: RequestSlowRequestLog = cherrypy.request.model
+        self.mount.slow_request_log.max_seconds = model.max_seconds
+        self.mount.slow_request_log.max_queries = model.max_queries
+
+        return self.__slow_request_log()
@@ -0,0 +1,12 @@
+from schematics import Model
+from schematics.types import FloatType, IntType
+
+
+class RequestSlowRequestLog(Model):
+    max_seconds = FloatType(required=True, min_value=0)
+    max_queries = IntType(required=True, min_value=0)
+
+
+class ResponseSlowRequestLog(Model):
+    max_seconds = FloatType(required=True)
+    max_queries = IntType(required=True)
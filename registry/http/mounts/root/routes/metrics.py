@@ -0,0 +1,71 @@
+import cherrypy
+from ingredients_http.route import Route
+
+from registry.http.router import RegistryRouter
+from registry.metrics import render_gauges
+
+# Pool statistics that only ever go up, everything else is the current state of the pool
+POOL_COUNTERS = ['checkouts', 'wait_seconds', 'timeouts', 'pings', 'ping_failures']
+POOL_GAUGES = ['max_wait_seconds', 'size', 'checked_in', 'checked_out', 'overflow']
+
+
+class MetricsRouter(RegistryRouter):
+
+    def __init__(self):
+        super().__init__(uri_base='metrics')
+
+    def __pool_metrics(self):
+        stats = self.mount.database.pool_stats()
+        pools = [({'database': 'primary'}, stats)]
+        for i, replica in enumerate(stats.get('replicas', [])):
+            pools.append(({'database': replica['host'] or 'replica-%d' % i}, replica))
+
+        lines = []
+        for name in POOL_COUNTERS:
+            lines.extend(render_gauges('registry_db_pool_%s_total' % name, 'Database pool %s' % name.replace('_', ' '),
+                                       [(labels, pool[name]) for labels, pool in pools], metric_type='counter'))
+        for name in POOL_GAUGES:
+            samples = [(labels, pool[name]) for labels, pool in pools if name in pool]
+            if len(samples) > 0:
+                lines.extend(render_gauges('registry_db_pool_%s' % name, 'Database pool %s' % name.replace('_', ' '),
+                                           samples))
+        if len(pools) > 1:
+            lines.extend(render_gauges('registry_db_replica_healthy', 'Whether a database replica is used for reads',
+                                       [(labels, int(pool['healthy'])) for labels, pool in pools[1:]]))
+
+        return lines
+
+    def __cache_metrics(self):
+        caches = [({'cache': 'catalog'}, self.mount.catalog_cache.stats())]
+        if self.mount.archive_cache is not None:
+            caches.append(({'cache': 'archive'}, self.mount.archive_cache.stats()))
+
+        lines = render_gauges('registry_cache_entries', 'Entries in a cache',
+                              [(labels, stats['size']) for labels, stats in caches])
+        for name in ['hits', 'misses', 'evictions']:
+            lines.extend(render_gauges('registry_cache_%s_total' % name, 'Cache %s' % name,
+                                       [(labels, stats[name]) for labels, stats in caches], metric_type='counter'))
+        if self.mount.archive_cache is not None:
+            lines.extend(render_gauges('registry_cache_bytes', 'Bytes of archives in the archive cache',
+                                       [({'cache': 'archive'}, caches[1][1]['bytes'])]))
+
+        return lines
+
+    @Route()
+    @cherrypy.config(**{'tools.authentication.on': False})
+    def get(self):
+        """Get the metrics of the registry
+        ---
+        get:
+          description: Get request, database pool and cache metrics of this registry process in the Prometheus text
+            format
+          tags:
+            - stats
+          responses:
+            200:
+              description: The metrics
+        """
+        lines = self.mount.metrics.render() + self.__pool_metrics() + self.__cache_metrics()
+
+        cherrypy.response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        return ('\n'.join(lines) + '\n').encode()
@@ -1,7 +1,14 @@
+import os
+
 import cherrypy
+import cherrypy.lib.static
 from ingredients_http.route import Route
 
 from registry.http.router import RegistryRouter
+from registry.http.tools.etag import validate_etag
+
+SWAGGER_UI_CDN = "https://unpkg.com/swagger-ui-dist@3.17.1"
+SWAGGER_UI_ASSETS = ['swagger-ui.css', 'swagger-ui-bundle.js', 'swagger-ui-standalone-preset.js']
 
 
 class SwaggerRouter(RegistryRouter):
@@ -10,16 +17,41 @@ class SwaggerRouter(RegistryRouter):
 
     @Route('json')
     @cherrypy.config(**{'tools.authentication.on': False})
-    @cherrypy.tools.json_out()
     def get(self):
-        api_spec_dict = self.mount.api_spec.to_dict()
-        api_spec_dict['components']['securitySchemes'] = {
-            'Bearer': {'type': 'apiKey', 'name': 'Authorization', 'in': 'header'}}
+        response = cherrypy.response
+        response.headers['Content-Type'] = 'application/json'
+        response.headers['Cache-Control'] = 'public, max-age=300'
+        response.headers['Vary'] = 'Accept-Encoding'
 
-        return api_spec_dict
+        accept_encoding = cherrypy.request.headers.elements('Accept-Encoding') or []
+        if any(e.value in ('gzip', 'x-gzip', '*') and e.qvalue > 0 for e in accept_encoding):
+            # The ETag has to differ per content coding since it is a strong validator
+            validate_etag(self.mount.api_spec_etag[:-1] + '-gzip"')
+            response.headers['Content-Encoding'] = 'gzip'
+            return self.mount.api_spec_json_gzip
+
+        validate_etag(self.mount.api_spec_etag)
+        return self.mount.api_spec_json
+
+    @Route('assets/{filename}')
+    @cherrypy.config(**{'tools.authentication.on': False})
+    def assets(self, filename):
+        if self.mount.swagger_ui_path is None or filename not in SWAGGER_UI_ASSETS:
+            raise cherrypy.HTTPError(404)
+
+        cherrypy.response.headers['Cache-Control'] = 'public, max-age=86400'
+        return cherrypy.lib.static.serve_file(os.path.join(os.path.abspath(self.mount.swagger_ui_path), filename))
 
     @Route('ui')
     def ui(self):
+        if self.mount.swagger_ui_path is not None:
+            assets = cherrypy.url('/swagger/assets')
+            fonts = ''
+        else:
+            assets = SWAGGER_UI_CDN
+            fonts = '<link href="https://fonts.googleapis.com/css?family=Open+Sans:400,700|Source+Code+Pro:300,600|' \
+                    'Titillium+Web:400,600,700" rel="stylesheet">'
+
         ui_html = """
 <!DOCTYPE html>
 <html lang="en">
@@ -27,8 +59,8 @@ class SwaggerRouter(RegistryRouter):
   <meta charset="UTF-8">
   <meta name="viewport" content="width=device-width, initial-scale=1">
   <title>Swagger UI</title>
-  <link href="https://fonts.googleapis.com/css?family=Open+Sans:400,700|Source+Code+Pro:300,600|Titillium+Web:400,600,700" rel="stylesheet">
-  <link rel="stylesheet" type="text/css" href="https://unpkg.com/swagger-ui-dist@3.17.1/swagger-ui.css" >
+  %(fonts)s
+  <link rel="stylesheet" type="text/css" href="%(assets)s/swagger-ui.css" >
   <style>
     html
     {
@@ -51,12 +83,12 @@ class SwaggerRouter(RegistryRouter):
 </head>
 <body>
   <div id="swagger-ui"></div>
-  <script src="https://unpkg.com/swagger-ui-dist@3.17.1/swagger-ui-bundle.js"></script>
-  <script src="https://unpkg.com/swagger-ui-dist@3.17.1/swagger-ui-standalone-preset.js"></script>
+  <script src="%(assets)s/swagger-ui-bundle.js"></script>
+  <script src="%(assets)s/swagger-ui-standalone-preset.js"></script>
   <script>
     window.onload = function() {
       const ui = SwaggerUIBundle({
-        url: "%s",
+        url: "%(url)s",
         dom_id: '#swagger-ui',
         docExpansion: 'none',
         showExtensions: true,
@@ -72,6 +104,6 @@ class SwaggerRouter(RegistryRouter):
   </script>
 </body>
 </html>
-        """ % cherrypy.url('/swagger/json')
+        """ % {'url': cherrypy.url('/swagger/json'), 'assets': assets, 'fonts': fonts}
 
         return ui_html
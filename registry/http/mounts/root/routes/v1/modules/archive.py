@@ -0,0 +1,35 @@
+import cherrypy
+from cherrypy.lib.static import serve_fileobj
+from ingredients_http.route import Route
+
+from registry.http.mounts.root.routes.v1.modules.download import find_archive
+from registry.http.router import RegistryRouter
+from registry.storage.storage import ObjectNotFoundError
+
+
+class ArchiveRouter(RegistryRouter):
+
+    def __init__(self):
+        super().__init__(uri_base="{organization_name}/{name}/{provider}/{version}/archive")
+
+    @Route()
+    @cherrypy.tools.db_session()
+    def archive(self, organization_name, name, provider, version, archive=None):
+        storage = self.mount.storage
+        if storage.local is False and self.mount.archive_cache is None:
+            raise cherrypy.HTTPError(404, "Module archives are not proxied by this registry")
+
+        module_archive = find_archive(self.mount, organization_name, name, provider, version)
+
+        key = module_archive['key']
+        try:
+            if storage.local:
+                fileobj = storage.open(key)
+            else:
+                fileobj = self.mount.archive_cache.open(key, lambda f: storage.copy_to(key, f))
+        except ObjectNotFoundError:
+            raise cherrypy.HTTPError(404, "The archive of the requested module version has not been uploaded")
+
+        # serve_fileobj takes care of Range requests and streams the archive in chunks
+        return serve_fileobj(fileobj, content_type='application/gzip', disposition='attachment',
+                             name=module_archive['filename'] + '.tar.gz')
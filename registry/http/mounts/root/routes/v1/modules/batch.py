@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+import cherrypy
+from ingredients_http.request_methods import RequestMethods
+from ingredients_http.route import Route
+from sqlalchemy import tuple_
+
+from registry.http.mounts.root.routes.v1.modules.validation_models.batch import RequestBatchVersions
+from registry.http.protocol import module_versions
+from registry.http.router import RegistryRouter
+from registry.sql.database import max_parameters
+from registry.sql.models.module import Module, ModuleProvider, ModuleProviderVersion, ModuleVersionMetadata
+from registry.sql.models.organization import Organization
+
+# Most addresses looked up per query so the IN lists stay a reasonable size
+BATCH_SIZE = 500
+# Every address binds its organization, module and provider name
+ADDRESS_PARAMETERS = 3
+
+
+class BatchVersionsRouter(RegistryRouter):
+
+    def __init__(self):
+        super().__init__(uri_base="versions")
+
+    @Route(methods=[RequestMethods.POST])
+    @cherrypy.tools.json_out()
+    @cherrypy.tools.db_session()
+    @cherrypy.tools.model_in(cls=RequestBatchVersions)
+    def list(self):
+        model: RequestBatchVersions = cherrypy.request.model
+
+        entries = OrderedDict()
+        for source in model.modules:
+            entries[tuple(source.split('/'))] = None
+
+        misses = []
+        for address in entries:
+            cached = self.mount.catalog_cache.get_address('versions', *address)
+            if cached is not None:
+                entries[address] = cached[1]['modules'][0]
+            else:
+                misses.append(address)
+
+        with cherrypy.request.db_session() as session:
+            batch_size = min(BATCH_SIZE, max_parameters(session.get_bind().dialect.name) // ADDRESS_PARAMETERS)
+            for i in range(0, len(misses), batch_size):
+                chunk = misses[i:i + batch_size]
+
+                providers = {}
+                rows = session.query(Organization, Module, ModuleProvider).join(
+                    Module, Module.organization_id == Organization.id).join(
+                    ModuleProvider, ModuleProvider.module_id == Module.id).filter(
+                    tuple_(Organization.name, Module.name, ModuleProvider.name).in_(chunk))
+                for organization, module, provider in rows:
+                    providers[provider.id] = (organization, module, provider, [])
+
+                if len(providers) == 0:
+                    continue
+
+                versions = session.query(ModuleProviderVersion, ModuleVersionMetadata.data).outerjoin(
+                    ModuleVersionMetadata, ModuleVersionMetadata.version_id == ModuleProviderVersion.id).filter(
+                    ModuleProviderVersion.provider_id.in_(list(providers.keys()))).order_by(
+                    ModuleProviderVersion.provider_id, *ModuleProviderVersion.semver_order())
+                for version, data in versions:
+                    providers[version.provider_id][3].append((version, data))
+
+                for organization, module, provider, provider_versions in providers.values():
+                    address = (organization.name, module.name, provider.name)
+                    etag, modules = module_versions(organization, module, provider, provider_versions)
+                    self.mount.inspect_missing(provider_versions)
+                    self.mount.catalog_cache.set_address('versions', *address, value=(etag, modules))
+                    entries[address] = modules['modules'][0]
+
+        return {
+            'modules': [entry for entry in entries.values() if entry is not None],
+            'missing': ["/".join(address) for address, entry in entries.items() if entry is None]
+        }
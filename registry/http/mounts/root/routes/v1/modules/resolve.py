@@ -0,0 +1,94 @@
+from typing import List
+
+import cherrypy
+from ingredients_http.route import Route
+from semver import VersionInfo
+
+from registry.constraints import ConstraintError, VersionConstraint, matches_constraints, parse_constraints
+from registry.http.protocol import archive_url
+from registry.http.router import RegistryRouter
+from registry.sql.address import resolve_address
+from registry.sql.models.module import ModuleProviderVersion, ModuleVersionAddress
+
+# Versions fetched at a time while looking for the newest one matching the constraints
+RESOLVE_BATCH_SIZE = 50
+
+
+class ResolveRouter(RegistryRouter):
+
+    def __init__(self):
+        super().__init__(uri_base="{organization_name}/{name}/{provider}/resolve")
+
+    @staticmethod
+    def __constraint_bounds(constraints: List[VersionConstraint]) -> list:
+        """Filters keeping only the versions within the range of the constraints so the semver index is used
+
+        Prerelease strings compare lexically in the database, that only affects prereleases which can
+        only match a constraint naming them exactly.
+        """
+        bounds = []
+        for c in constraints:
+            if c.operator == '=':
+                bounds.append(ModuleProviderVersion.semver_compare('>=', c.version))
+                bounds.append(ModuleProviderVersion.semver_compare('<=', c.version))
+            elif c.operator == '~>':
+                bounds.append(ModuleProviderVersion.semver_compare('>=', c.version))
+                bounds.append(ModuleProviderVersion.semver_compare('<', c.upper))
+            elif c.operator != '!=':
+                bounds.append(ModuleProviderVersion.semver_compare(c.operator, c.version))
+
+        return bounds
+
+    @Route()
+    @cherrypy.tools.json_out()
+    @cherrypy.tools.db_session()
+    def resolve(self, organization_name, name, provider, constraint=''):
+        try:
+            constraints = parse_constraints(constraint)
+        except ConstraintError as e:
+            raise cherrypy.HTTPError(400, str(e))
+
+        # The raw constraint is part of the key, invalidating the address still removes every constraint under it
+        cache_address = (organization_name, name, provider, constraint.strip())
+        cached = self.mount.catalog_cache.get_address('resolve', *cache_address)
+        if cached is None:
+            with cherrypy.request.db_session() as session:
+                organization, module, provider, _ = resolve_address(session, organization_name, name, provider)
+                if organization is None:
+                    raise cherrypy.HTTPError(404, "The request organization could not be found")
+
+                if module is None:
+                    raise cherrypy.HTTPError(404, "The requested module could not be found")
+
+                if provider is None:
+                    raise cherrypy.HTTPError(404, "The requested provider could not be found")
+
+                source = "%s/%s/%s" % (organization.name, module.name, provider.name)
+                versions = session.query(ModuleProviderVersion.version, ModuleVersionAddress.storage_key,
+                                         ModuleVersionAddress.filename).join(
+                    ModuleVersionAddress, ModuleVersionAddress.version_id == ModuleProviderVersion.id).filter(
+                    ModuleProviderVersion.provider_id == provider.id, *self.__constraint_bounds(constraints)).order_by(
+                    *ModuleProviderVersion.semver_order()).yield_per(RESOLVE_BATCH_SIZE)
+
+                # Only != and prereleases are left to check, the newest version within the bounds usually matches
+                resolved = None
+                for version, storage_key, filename in versions:
+                    version = VersionInfo.parse(version)
+                    if matches_constraints(version, constraints):
+                        resolved = (version, {'key': storage_key, 'filename': filename})
+                        break
+            cached = (source, resolved)
+            self.mount.catalog_cache.set_address('resolve', *cache_address, value=cached)
+
+        source, resolved = cached
+        if resolved is None:
+            raise cherrypy.HTTPError(404, "No version of the requested module matches the constraint")
+
+        version, archive = resolved
+        organization_name, name, provider = source.split('/')
+
+        return {
+            "source": source,
+            "version": str(version),
+            "download_url": archive_url(self.mount, archive, organization_name, name, provider, str(version))
+        }
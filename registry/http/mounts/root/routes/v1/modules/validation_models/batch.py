@@ -0,0 +1,7 @@
+from schematics import Model
+from schematics.types import ListType, StringType
+
+
+class RequestBatchVersions(Model):
+    modules = ListType(StringType(regex='^[a-zA-Z][a-zA-Z0-9]*/[a-zA-Z][a-zA-Z0-9]*/[a-zA-Z][a-zA-Z0-9]*$'),
+                       required=True, min_size=1, max_size=1000)
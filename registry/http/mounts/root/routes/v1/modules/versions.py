@@ -1,12 +1,11 @@
-from typing import List
-
 import cherrypy
 from ingredients_http.route import Route
-from sqlalchemy import desc
 
+from registry.http.protocol import module_versions
 from registry.http.router import RegistryRouter
-from registry.sql.models.module import Module, ModuleProviderVersion, ModuleProvider
-from registry.sql.models.organization import Organization
+from registry.http.tools.etag import validate_etag
+from registry.sql.address import resolve_address
+from registry.sql.models.module import ModuleProviderVersion, ModuleVersionMetadata
 
 
 class VersionsRouter(RegistryRouter):
@@ -18,33 +17,32 @@ class VersionsRouter(RegistryRouter):
     @cherrypy.tools.json_out()
     @cherrypy.tools.db_session()
     def list(self, organization_name, name, provider):
+        cache_address = (organization_name, name, provider)
+        cached = self.mount.catalog_cache.get_address('versions', *cache_address)
+        if cached is not None:
+            etag, modules = cached
+            validate_etag(etag)
+            return modules
+
         with cherrypy.request.db_session() as session:
-            organization: Organization = session.query(Organization).filter(
-                Organization.name == organization_name).first()
+            organization, module, provider, _ = resolve_address(session, organization_name, name, provider)
             if organization is None:
                 raise cherrypy.HTTPError(404, "The request organization could not be found")
 
-            module: Module = session.query(Module).filter(Module.organization_id == organization.id).filter(
-                Module.name == name).first()
             if module is None:
                 raise cherrypy.HTTPError(404, "The requested module could not be found")
 
-            provider: ModuleProvider = session.query(ModuleProvider).filter(
-                ModuleProvider.module_id == module.id).filter(ModuleProvider.name == provider).first()
             if provider is None:
                 raise cherrypy.HTTPError(404, "The requested provider could not be found")
 
-            output_versions = []
-            versions: List[ModuleProviderVersion] = session.query(ModuleProviderVersion).filter(
-                ModuleProviderVersion.provider_id == provider.id).order_by(desc(ModuleProviderVersion.created_at))
-            for version in versions:
-                output_versions.append({
-                    "version": version.version  # TODO: root dependencies and providers list, sub modules, ect...
-                })
-
-        return {
-            'modules': [{
-                "source": "%s/%s/%s" % (organization.name, module.name, provider.name),
-                "versions": output_versions
-            }]
-        }
+            versions = session.query(ModuleProviderVersion, ModuleVersionMetadata.data).outerjoin(
+                ModuleVersionMetadata, ModuleVersionMetadata.version_id == ModuleProviderVersion.id).filter(
+                ModuleProviderVersion.provider_id == provider.id).order_by(
+                *ModuleProviderVersion.semver_order()).all()
+            etag, modules = module_versions(organization, module, provider, versions)
+
+        self.mount.inspect_missing(versions)
+        self.mount.catalog_cache.set_address('versions', *cache_address, value=(etag, modules))
+        validate_etag(etag)
+
+        return modules
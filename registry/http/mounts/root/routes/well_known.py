@@ -1,9 +1,11 @@
 import cherrypy
 from ingredients_http.route import Route
-from ingredients_http.router import Router
 
+from registry.http.router import RegistryRouter
+from registry.http.tools.etag import make_etag, validate_etag
 
-class WellKnownRouter(Router):
+
+class WellKnownRouter(RegistryRouter):
 
     def __init__(self):
         super().__init__(uri_base=".well-known")
@@ -11,6 +13,8 @@ class WellKnownRouter(Router):
     @Route(route="terraform.json")
     @cherrypy.tools.json_out()
     def terraform(self):
+        validate_etag(make_etag(cherrypy.request.base))
+
         return {
             "modules.v1": cherrypy.request.base + "/v1/modules"
         }
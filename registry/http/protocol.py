@@ -0,0 +1,62 @@
+from typing import List, Optional, Tuple
+
+import cherrypy
+
+from registry.http.tools.etag import make_etag
+from registry.introspection import decode_metadata
+from registry.sql.models.module import Module, ModuleProvider, ModuleProviderVersion
+from registry.sql.models.organization import Organization
+
+
+def module_versions(organization: Organization, module: Module, provider: ModuleProvider,
+                    versions: List[Tuple[ModuleProviderVersion, Optional[bytes]]]) -> Tuple[str, dict]:
+    """Build the terraform protocol version list of a provider and its ETag out of versions and their metadata"""
+    etag = make_etag(provider.id, provider.updated_at, *[(v.id, v.updated_at) for v, _ in versions])
+
+    output_versions = []
+    for version, data in versions:
+        output_version = {
+            "version": version.version
+        }
+
+        # Versions that were not inspected yet are listed without their contents
+        if data is not None:
+            metadata = decode_metadata(data)
+            output_version['root'] = {
+                "providers": metadata['root']['providers'],
+                "dependencies": metadata['root']['dependencies']
+            }
+            output_version['submodules'] = [
+                {
+                    "path": submodule['path'],
+                    "providers": submodule['providers'],
+                    "dependencies": submodule['dependencies']
+                } for submodule in metadata['submodules']
+            ]
+
+        output_versions.append(output_version)
+
+    return etag, {
+        'modules': [{
+            "source": "%s/%s/%s" % (organization.name, module.name, provider.name),
+            "versions": output_versions
+        }]
+    }
+
+
+def archive_url(mount, archive: dict, organization_name, name, provider, version, base_url: str = None) -> str:
+    """The URL terraform should fetch the archive of a module version from.
+
+    base_url is the URL the registry is reached at, it defaults to the one of the current CherryPy request.
+    """
+    url = None
+    if mount.archive_cache is None:
+        url = mount.storage.download_url(archive['key'], archive['filename'])
+
+    if url is None:
+        # Terraform downloads the archive from the registry itself
+        path = "/v1/modules/%s/%s/%s/%s/archive" % (organization_name, name, provider, version)
+        url = cherrypy.url(path) if base_url is None else base_url + path
+        return url + '?archive=tar.gz'
+
+    return url + '&archive=tar.gz'
@@ -1,5 +1,6 @@
 from typing import Callable, List
 
+import cherrypy
 from ingredients_http.request_methods import RequestMethods
 from ingredients_http.router import Router
 
@@ -7,3 +8,5 @@ from ingredients_http.router import Router
 class RegistryRouter(Router):
     def on_register(self, uri: str, action: Callable, methods: List[RequestMethods]):
         self.mount.api_spec.path(path=uri, router=self, func=action)
+        # Requests are recorded in the metrics by the route they matched
+        cherrypy.config(**{'tools.metrics.route': uri})(action.__func__)
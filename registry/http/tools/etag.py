@@ -0,0 +1,51 @@
+import hashlib
+from typing import List
+
+import cherrypy
+
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag out of the values that make up a response"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+
+    return '"%s"' % digest.hexdigest()
+
+
+def _opaque_tag(etag: str) -> str:
+    if etag.startswith('W/'):
+        return etag[2:]
+
+    return etag
+
+
+def etag_matches(etag: str, conditions: List[str]) -> bool:
+    """Whether one of the If-None-Match conditions matches the ETag.
+
+    If-None-Match uses the weak comparison of RFC 7232, proxies that re-encode
+    a response mark its ETag weak with a W/ prefix and it should still match.
+    """
+    if '*' in conditions:
+        return True
+
+    opaque_tag = _opaque_tag(etag)
+    return any(_opaque_tag(condition) == opaque_tag for condition in conditions)
+
+
+def validate_etag(etag: str):
+    """Set the ETag of the response and stop the request with a 304 if the client already has it.
+
+    This is called from within handlers as soon as the ETag is known so the
+    response body never has to be built when the client is up to date.
+    """
+    request = cherrypy.serving.request
+    cherrypy.serving.response.headers['ETag'] = etag
+
+    if request.method not in ('GET', 'HEAD'):
+        return
+
+    conditions = [str(x) for x in request.headers.elements('If-None-Match') or []]
+    if etag_matches(etag, conditions):
+        raise cherrypy.HTTPRedirect([], 304)
@@ -0,0 +1,68 @@
+import time
+
+import cherrypy
+
+from registry.metrics import RequestMetrics, SlowRequestLog, current_request, end_request, start_request
+
+# The route of requests that did not match any route, like most 404s
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class MetricsTool(cherrypy.Tool):
+    """Records every request in RequestMetrics under the template of the route it matched.
+
+    The route template is set as tools.metrics.route by RegistryRouter, raw paths would give
+    every module address its own time series. Responses get a Server-Timing header and
+    requests over the thresholds of the SlowRequestLog are logged.
+    """
+
+    def __init__(self, metrics: RequestMetrics, slow_request_log: SlowRequestLog):
+        super().__init__('on_start_resource', self.start, priority=10)
+        self.metrics = metrics
+        self.slow_request_log = slow_request_log
+
+    def _setup(self):
+        super()._setup()
+        hooks = cherrypy.serving.request.hooks
+        conf = self._merged_args()
+        # Before the output tools wrap the handler so their serialization is timed separately
+        hooks.attach('before_handler', self.wrap_handler, priority=10, **conf)
+        hooks.attach('before_finalize', self.server_timing, **conf)
+        # Runs after the response body was written so streamed responses are timed in full
+        hooks.attach('on_end_request', self.end, **conf)
+
+    @staticmethod
+    def start(route=None):
+        start_request()
+
+    @staticmethod
+    def wrap_handler(route=None):
+        request = cherrypy.serving.request
+        handler = request.handler
+        timings = current_request()
+        if handler is None or timings is None:
+            return
+
+        def timed_handler(*args, **kwargs):
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                timings.handler_finished = time.perf_counter()
+
+        request.handler = timed_handler
+
+    @staticmethod
+    def server_timing(route=None):
+        timings = current_request()
+        if timings is not None:
+            cherrypy.serving.response.headers['Server-Timing'] = timings.server_timing()
+
+    def end(self, route=None):
+        timings = end_request()
+        if timings is None:
+            return
+
+        request = cherrypy.serving.request
+        status = int(str(cherrypy.serving.response.status).split(' ', 1)[0])
+        self.metrics.observe(route or UNMATCHED_ROUTE, request.method, status, timings)
+        self.slow_request_log.check(request.method, request.path_info, timings)
@@ -0,0 +1,270 @@
+import json
+import logging
+import posixpath
+import queue
+import re
+import tarfile
+import threading
+import zlib
+from typing import BinaryIO, List, Optional
+
+import arrow
+
+from registry.cache import CatalogCache
+from registry.hcl import Block, HCLError, parse
+from registry.sql.database import Database
+from registry.sql.models.module import ModuleProviderVersion, ModuleVersionAddress, ModuleVersionMetadata
+from registry.storage.storage import ObjectNotFoundError, Storage
+
+logger = logging.getLogger(__name__)
+
+# .tf files larger than this are skipped, they are most likely generated
+MAX_FILE_SIZE = 1024 * 1024
+
+_SUBMODULE_RE = re.compile(r'^modules/[^/]+$')
+
+# Seconds before a failed inspection is retried, doubling with every failure up to MAX_RETRY_DELAY
+RETRY_DELAY = 60
+MAX_RETRY_DELAY = 24 * 60 * 60
+
+
+def _string(value) -> str:
+    return value if isinstance(value, str) else ''
+
+
+def _new_module() -> dict:
+    return {'inputs': [], 'outputs': [], 'providers': {}, 'dependencies': []}
+
+
+def _inspect_document(module: dict, document: Block):
+    for block in document.blocks_of('variable'):
+        if len(block.labels) != 1:
+            continue
+        module['inputs'].append({
+            'name': block.labels[0],
+            'type': _string(block.attributes.get('type')),
+            'description': _string(block.attributes.get('description')),
+            'required': 'default' not in block.attributes,
+        })
+
+    for block in document.blocks_of('output'):
+        if len(block.labels) != 1:
+            continue
+        module['outputs'].append({
+            'name': block.labels[0],
+            'description': _string(block.attributes.get('description')),
+        })
+
+    for terraform in document.blocks_of('terraform'):
+        for required_providers in terraform.blocks_of('required_providers'):
+            for name, requirement in required_providers.attributes.items():
+                if isinstance(requirement, dict):
+                    requirement = requirement.get('version')
+                module['providers'][name] = _string(requirement)
+
+    for block in document.blocks_of('provider'):
+        if len(block.labels) == 1 and module['providers'].get(block.labels[0], '') == '':
+            module['providers'][block.labels[0]] = _string(block.attributes.get('version'))
+
+    for block in document.blocks_of('module'):
+        if len(block.labels) != 1:
+            continue
+        module['dependencies'].append({
+            'name': block.labels[0],
+            'source': _string(block.attributes.get('source')),
+            'version': _string(block.attributes.get('version')),
+        })
+
+
+def inspect_archive(fileobj: BinaryIO) -> dict:
+    """Read the inputs, outputs, providers and module calls of a module and its submodules out of a tar.gz.
+
+    The archive is read as a stream so it never has to be in memory or on disk as a whole.
+    """
+    modules = {}
+    with tarfile.open(fileobj=fileobj, mode='r|gz') as archive:
+        for member in archive:
+            if member.isfile() is False or member.name.endswith('.tf') is False or member.size > MAX_FILE_SIZE:
+                continue
+
+            path = posixpath.normpath(member.name)
+            directory = posixpath.dirname(path)
+            if directory != '' and _SUBMODULE_RE.match(directory) is None:
+                continue
+
+            text = archive.extractfile(member).read().decode('utf-8', errors='replace')
+            try:
+                document = parse(text)
+            except HCLError as e:
+                logger.debug("Skipping %s, could not parse it: %s", path, e)
+                continue
+
+            _inspect_document(modules.setdefault(directory, _new_module()), document)
+
+    def output(path: str, module: Optional[dict]) -> dict:
+        module = module or _new_module()
+        return {
+            'path': path,
+            'inputs': module['inputs'],
+            'outputs': module['outputs'],
+            'providers': [{'name': name, 'version': version}
+                          for name, version in sorted(module['providers'].items())],
+            'dependencies': module['dependencies'],
+        }
+
+    return {
+        'root': output('', modules.pop('', None)),
+        'submodules': [output(path, module) for path, module in sorted(modules.items())]
+    }
+
+
+def encode_metadata(metadata: dict) -> bytes:
+    return zlib.compress(json.dumps(metadata, separators=(',', ':')).encode())
+
+
+def decode_metadata(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data).decode())
+
+
+def retry_at(version_metadata: ModuleVersionMetadata) -> arrow.Arrow:
+    """When a failed inspection is retried, unless the archive is uploaded again before that"""
+    delay = min(RETRY_DELAY * 2 ** min(version_metadata.failures - 1, 32), MAX_RETRY_DELAY)
+    return version_metadata.failed_at.shift(seconds=delay)
+
+
+class IntrospectionPool(object):
+    """Inspects the archives of versions in background threads after they are uploaded.
+
+    The result is stored as ModuleVersionMetadata so the terraform protocol endpoints can
+    return it without looking at the archive. Versions that were not inspected yet, for example
+    because the registry stopped or the archive was uploaded straight to storage, are picked up
+    on start and whenever their version list is read from the database.
+
+    Failed inspections, including of archives that were not uploaded yet, are recorded as metadata
+    without data. Those are only picked up again after a back-off or when the archive is uploaded.
+    """
+
+    def __init__(self, database: Database, storage: Storage, catalog_cache: CatalogCache, workers=2):
+        self.database = database
+        self.storage = storage
+        self.catalog_cache = catalog_cache
+        self.workers = workers
+
+        self.__queue = queue.Queue()
+        self.__threads: List[threading.Thread] = []
+        # Versions waiting in the queue and whether they are inspected even if they failed recently,
+        # submitting them again does nothing
+        self.__queued = {}
+        self.__queued_lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.__work, name="introspection-%d" % i, daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+        threading.Thread(target=self.__submit_pending, name="introspection-pending", daemon=True).start()
+
+    def stop(self):
+        for _ in self.__threads:
+            self.__queue.put(None)
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def submit(self, version_id, force=True):
+        """Queue a version to be inspected, unless force is set it is skipped while a failed inspection backs off"""
+        with self.__queued_lock:
+            if version_id in self.__queued:
+                self.__queued[version_id] = self.__queued[version_id] or force
+                return
+            self.__queued[version_id] = force
+
+        self.__queue.put(version_id)
+
+    def __submit_pending(self):
+        # Failed inspections that are still backing off are skipped by inspect
+        with self.database.session() as session:
+            pending = session.query(ModuleVersionAddress.version_id).outerjoin(
+                ModuleVersionMetadata, ModuleVersionMetadata.version_id == ModuleVersionAddress.version_id).filter(
+                ModuleVersionMetadata.data.is_(None))
+            for version_id, in pending.yield_per(1000):
+                self.submit(version_id, force=False)
+
+    def __work(self):
+        while True:
+            version_id = self.__queue.get()
+            if version_id is None:
+                return
+
+            with self.__queued_lock:
+                force = self.__queued.pop(version_id)
+
+            try:
+                self.inspect(version_id, force=force)
+            except Exception:
+                logger.exception("Error inspecting the archive of version %s", version_id)
+
+    def inspect(self, version_id, force=True):
+        """Inspect the archive of a version, unless force is set it is skipped while a failed inspection backs off"""
+        with self.database.session() as session:
+            version_address = session.query(ModuleVersionAddress).filter(
+                ModuleVersionAddress.version_id == version_id).first()
+            if version_address is None:
+                return
+            storage_key = version_address.storage_key
+            address = version_address.address
+
+            if force is False:
+                version_metadata = session.query(ModuleVersionMetadata).get(version_id)
+                if version_metadata is not None and (version_metadata.data is not None or
+                                                     retry_at(version_metadata) > arrow.utcnow()):
+                    return
+
+        try:
+            archive = self.storage.open(storage_key)
+        except ObjectNotFoundError:
+            logger.debug("Could not inspect %s, its archive has not been uploaded", address)
+            self.__store(version_id, address, None)
+            return
+
+        try:
+            metadata = inspect_archive(archive)
+        except (tarfile.TarError, EOFError, OSError, zlib.error) as e:
+            logger.warning("Could not read the archive of %s: %s", address, e)
+            metadata = None
+        finally:
+            archive.close()
+
+        self.__store(version_id, address, metadata)
+
+    def __store(self, version_id, address: str, metadata: Optional[dict]):
+        # No metadata records a failed inspection
+        with self.database.session() as session:
+            version = session.query(ModuleProviderVersion).get(version_id)
+            if version is None:
+                return
+
+            version_metadata = session.query(ModuleVersionMetadata).get(version_id)
+            if version_metadata is None:
+                version_metadata = ModuleVersionMetadata()
+                version_metadata.version_id = version_id
+                version_metadata.failures = 0
+                session.add(version_metadata)
+
+            # The version list, and with it its ETag, only changes when there was metadata before or is now
+            changed = version_metadata.data is not None or metadata is not None
+            if metadata is None:
+                version_metadata.data = None
+                version_metadata.failures += 1
+                version_metadata.failed_at = arrow.utcnow()
+            else:
+                version_metadata.data = encode_metadata(metadata)
+                version_metadata.failures = 0
+                version_metadata.failed_at = None
+            if changed:
+                version.updated_at = arrow.utcnow()
+            session.commit()
+
+        if changed:
+            self.catalog_cache.invalidate_address(*address.split('/')[:3])
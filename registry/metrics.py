@@ -0,0 +1,261 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The amount of statements kept per request for the slow request log, requests making more are still counted
+MAX_STATEMENTS = 100
+
+_request = threading.local()
+
+
+class RequestTimings(object):
+    """The amount and time of the database queries and S3 presigns made while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.statements: List[Tuple[str, float]] = []
+        self.presigns = 0
+        self.presign_seconds = 0.0
+        # When the handler returned, everything after that until the response is finalized is serialization
+        self.handler_finished = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """The value of a Server-Timing header with the time spent on the database, S3 and serializing the response"""
+        metrics = ['db;dur=%.3f;desc="%d queries"' % (self.db_seconds * 1000, self.db_queries),
+                   's3;dur=%.3f' % (self.presign_seconds * 1000)]
+        if self.handler_finished is not None:
+            metrics.append('serialize;dur=%.3f' % ((time.perf_counter() - self.handler_finished) * 1000))
+
+        return ', '.join(metrics)
+
+
+def start_request() -> RequestTimings:
+    """Start collecting timings for the request handled by the current thread"""
+    _request.timings = RequestTimings()
+    return _request.timings
+
+
+def end_request() -> Optional[RequestTimings]:
+    timings = getattr(_request, 'timings', None)
+    _request.timings = None
+    return timings
+
+
+def current_request() -> Optional[RequestTimings]:
+    """The timings of the request handled by the current thread, None outside of a request like in background workers"""
+    return getattr(_request, 'timings', None)
+
+
+def observe_db_query(statement: str, seconds: float):
+    timings = current_request()
+    if timings is not None:
+        timings.db_queries += 1
+        timings.db_seconds += seconds
+        if len(timings.statements) < MAX_STATEMENTS:
+            timings.statements.append((statement, seconds))
+
+
+@contextmanager
+def timed_presign():
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_request()
+        if timings is not None:
+            timings.presigns += 1
+            timings.presign_seconds += time.perf_counter() - start
+
+
+class _ThreadShards(object):
+    """Every thread updates its own shard of a metric so observing never waits on a lock.
+
+    Shards are only summed when the metric is read, a lock is only taken the first time a thread observes.
+    """
+
+    def __init__(self):
+        self.__local = threading.local()
+        self.__shards: List[dict] = []
+        self.__lock = threading.Lock()
+
+    def shard(self) -> dict:
+        shard = getattr(self.__local, 'shard', None)
+        if shard is None:
+            shard = {}
+            with self.__lock:
+                self.__shards.append(shard)
+            self.__local.shard = shard
+
+        return shard
+
+    def shards(self) -> List[dict]:
+        with self.__lock:
+            return [dict(shard) for shard in self.__shards]
+
+
+class Counter(object):
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+        self.__shards = _ThreadShards()
+
+    def inc(self, labels: Tuple[str, ...], amount=1.0):
+        shard = self.__shards.shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        values = {}
+        for shard in self.__shards.shards():
+            for labels, value in shard.items():
+                values[labels] = values.get(labels, 0.0) + value
+
+        return values
+
+    def render(self) -> List[str]:
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s counter' % self.name]
+        for labels, value in sorted(self.values().items()):
+            lines.append(_sample(self.name, zip(self.labels, labels), value))
+
+        return lines
+
+
+class Histogram(object):
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...], buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+
+        self.__shards = _ThreadShards()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        shard = self.__shards.shard()
+        counts = shard.get(labels)
+        if counts is None:
+            # A count per bucket and one for above the last bucket, followed by the sum
+            counts = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def render(self) -> List[str]:
+        totals = {}
+        for shard in self.__shards.shards():
+            for labels, counts in shard.items():
+                total = totals.setdefault(labels, [0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s histogram' % self.name]
+        for labels, total in sorted(totals.items()):
+            label_pairs = list(zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), total[:-1]):
+                cumulative += count
+                lines.append(_sample(self.name + '_bucket', label_pairs + [('le', str(bound))], cumulative))
+            lines.append(_sample(self.name + '_sum', label_pairs, total[-1]))
+            lines.append(_sample(self.name + '_count', label_pairs, cumulative))
+
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _sample(name: str, labels: Iterable[Tuple[str, str]], value: float) -> str:
+    label_text = ','.join('%s="%s"' % (label, _escape(str(label_value))) for label, label_value in labels)
+    if label_text != '':
+        name += '{' + label_text + '}'
+
+    return '%s %s' % (name, repr(float(value)))
+
+
+def render_gauges(name: str, documentation: str, samples: List[Tuple[Dict[str, str], float]],
+                  metric_type='gauge') -> List[str]:
+    """Render values that are read when metrics are collected, like the size of a cache"""
+    lines = ['# HELP %s %s' % (name, documentation), '# TYPE %s %s' % (name, metric_type)]
+    for labels, value in samples:
+        lines.append(_sample(name, sorted(labels.items()), value))
+
+    return lines
+
+
+class RequestMetrics(object):
+    """Request counts, latency histograms and database and S3 presign usage by route template"""
+
+    def __init__(self):
+        labels = ('route', 'method')
+        self.requests = Counter('registry_http_requests_total', 'Requests handled', labels + ('status',))
+        self.duration = Histogram('registry_http_request_duration_seconds', 'Time taken to handle requests', labels)
+        self.db_queries = Counter('registry_http_request_db_queries_total', 'Database queries made by requests',
+                                  labels)
+        self.db_seconds = Counter('registry_http_request_db_seconds_total',
+                                  'Time requests spent waiting on database queries', labels)
+        self.presigns = Counter('registry_http_request_s3_presigns_total', 'S3 URLs signed by requests', labels)
+        self.presign_seconds = Counter('registry_http_request_s3_presign_seconds_total',
+                                       'Time requests spent signing S3 URLs', labels)
+
+    def observe(self, route: str, method: str, status: int, timings: RequestTimings):
+        labels = (route, method)
+        self.requests.inc(labels + ('%dxx' % (status // 100),))
+        self.duration.observe(labels, timings.elapsed())
+        if timings.db_queries > 0:
+            self.db_queries.inc(labels, timings.db_queries)
+            self.db_seconds.inc(labels, timings.db_seconds)
+        if timings.presigns > 0:
+            self.presigns.inc(labels, timings.presigns)
+            self.presign_seconds.inc(labels, timings.presign_seconds)
+
+    def render(self) -> List[str]:
+        lines = []
+        for metric in [self.requests, self.duration, self.db_queries, self.db_seconds, self.presigns,
+                       self.presign_seconds]:
+            lines.extend(metric.render())
+
+        return lines
+
+
+class SlowRequestLog(object):
+    """Logs requests that took longer than max_seconds or made more than max_queries database queries.
+
+    The statements the request ran are logged with it to make patterns like a query per item easy to spot.
+    A threshold of 0 disables it, both can be changed while the registry is running.
+    """
+
+    def __init__(self, max_seconds=1.0, max_queries=25):
+        self.max_seconds = max_seconds
+        self.max_queries = max_queries
+
+    def check(self, method: str, path: str, timings: RequestTimings):
+        elapsed = timings.elapsed()
+        slow = self.max_seconds > 0 and elapsed > self.max_seconds
+        chatty = self.max_queries > 0 and timings.db_queries > self.max_queries
+        if slow is False and chatty is False:
+            return
+
+        lines = ["Slow request %s %s took %.3fs with %d database queries taking %.3fs" % (
+            method, path, elapsed, timings.db_queries, timings.db_seconds)]
+        for statement, seconds in timings.statements:
+            lines.append("  %.3fs %s" % (seconds, ' '.join(statement.split())))
+        if timings.db_queries > len(timings.statements):
+            lines.append("  and %d more" % (timings.db_queries - len(timings.statements)))
+
+        logger.warning('\n'.join(lines))
@@ -0,0 +1,152 @@
+import logging
+from typing import Dict, Iterator, List
+
+import arrow
+
+from registry.sql.database import Database
+from registry.sql.deletion import enqueue_deletion
+from registry.sql.models.archive import Archive
+from registry.sql.models.deletion import StorageDeletion
+from registry.sql.models.module import ModuleProvider, ModuleProviderVersion, ModuleVersionAddress, \
+    ModuleVersionMetadata
+from registry.storage.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# The amount of keys read from the database and checked at once
+PAGE_SIZE = 1000
+
+# Collations that compare keys by their bytes like storage lists them, SQLite already does by default
+BYTE_ORDER_COLLATIONS = {'postgresql': 'C'}
+
+
+class Reconciler(object):
+    """Finds archives in storage that no version uses and versions whose archive is not in storage.
+
+    Storage and the database are both read in key order and merged like a sorted merge join, only
+    a page of keys from each side is held in memory at a time. Anything changed in the last
+    min_age seconds is left alone since it may belong to an upload that is still in progress,
+    as are versions with a multipart upload that was neither completed nor aborted.
+
+    When fixing, orphaned archives are queued for the deletion worker and versions that were
+    never uploaded are deleted. Versions missing a content addressed archive are only reported,
+    their content is lost and has to be uploaded again.
+    """
+
+    def __init__(self, database: Database, storage: Storage, min_age=3600, fix=False):
+        self.database = database
+        self.storage = storage
+        self.min_age = min_age
+        self.fix = fix
+
+        self.__uploading = set()
+
+    def __database_keys(self) -> Iterator[str]:
+        storage_key = ModuleVersionAddress.storage_key
+        collation = BYTE_ORDER_COLLATIONS.get(self.database.engine.dialect.name)
+        if collation is not None:
+            storage_key = storage_key.collate(collation)
+
+        last_key = None
+        while True:
+            with self.database.session() as session:
+                query = session.query(ModuleVersionAddress.storage_key).distinct()
+                if last_key is not None:
+                    query = query.filter(storage_key > last_key)
+                keys = [key for key, in query.order_by(storage_key).limit(PAGE_SIZE)]
+
+            yield from keys
+            if len(keys) < PAGE_SIZE:
+                return
+            last_key = keys[-1]
+
+    def __orphaned(self, keys: List[str]) -> int:
+        with self.database.session() as session:
+            # Used again or already queued since the keys were read
+            skip = {key for key, in session.query(ModuleVersionAddress.storage_key).filter(
+                ModuleVersionAddress.storage_key.in_(keys))}
+            skip.update(key for key, in session.query(StorageDeletion.key).filter(StorageDeletion.key.in_(keys)))
+
+            orphaned = [key for key in keys if key not in skip]
+            for key in orphaned:
+                logger.info("Archive %s is not used by any version", key)
+                if self.fix:
+                    enqueue_deletion(session, key)
+            session.commit()
+
+        return len(orphaned)
+
+    def __missing(self, keys: List[str], cutoff: arrow.Arrow) -> int:
+        missing = 0
+        with self.database.session() as session:
+            rows = session.query(ModuleVersionAddress, ModuleProviderVersion).join(
+                ModuleProviderVersion, ModuleProviderVersion.id == ModuleVersionAddress.version_id).filter(
+                ModuleVersionAddress.storage_key.in_(keys), ModuleVersionAddress.created_at < cutoff)
+            for version_address, version in rows.all():
+                # Storage was listed past the key before it was uploaded
+                if self.storage.exists(version_address.storage_key):
+                    continue
+
+                # Slow or resumed multipart uploads only create the object when they are completed
+                if version_address.storage_key in self.__uploading:
+                    logger.info("The archive of %s is still being uploaded", version_address.address)
+                    continue
+
+                missing += 1
+                if version_address.storage_key.startswith(Archive.build_storage_key('')):
+                    logger.error("The archive of %s is missing from storage, it has to be uploaded again",
+                                 version_address.address)
+                    continue
+
+                logger.info("The archive of %s was never uploaded", version_address.address)
+                if self.fix:
+                    provider = session.query(ModuleProvider).get(version.provider_id)
+                    provider.updated_at = arrow.utcnow()
+                    session.delete(version_address)
+                    session.query(ModuleVersionMetadata).filter(
+                        ModuleVersionMetadata.version_id == version.id).delete(synchronize_session=False)
+                    session.delete(version)
+            session.commit()
+
+        return missing
+
+    def run(self) -> Dict[str, int]:
+        """Compare storage with the database and return the amount of archives checked, orphaned and missing"""
+        cutoff = arrow.utcnow().shift(seconds=-self.min_age)
+        # Uploads are started when their version is created, so none of the versions checked can start one later
+        self.__uploading = set(self.storage.list_upload_keys())
+        counts = {'archives': 0, 'orphaned': 0, 'missing': 0}
+        orphaned = []
+        missing = []
+
+        archives = self.storage.list_archives()
+        database_keys = self.__database_keys()
+        archive = next(archives, None)
+        database_key = next(database_keys, None)
+        while archive is not None or database_key is not None:
+            if database_key is None or (archive is not None and archive[0] < database_key):
+                counts['archives'] += 1
+                if archive[1] < cutoff:
+                    orphaned.append(archive[0])
+                archive = next(archives, None)
+            elif archive is None or database_key < archive[0]:
+                missing.append(database_key)
+                database_key = next(database_keys, None)
+            else:
+                counts['archives'] += 1
+                archive = next(archives, None)
+                database_key = next(database_keys, None)
+
+            if len(orphaned) >= PAGE_SIZE:
+                counts['orphaned'] += self.__orphaned(orphaned)
+                orphaned = []
+            if len(missing) >= PAGE_SIZE:
+                counts['missing'] += self.__missing(missing, cutoff)
+                missing = []
+
+        if len(orphaned) > 0:
+            counts['orphaned'] += self.__orphaned(orphaned)
+        if len(missing) > 0:
+            counts['missing'] += self.__missing(missing, cutoff)
+
+        return counts
@@ -0,0 +1,47 @@
+from collections import namedtuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from registry.sql.models.module import Module, ModuleProvider, ModuleProviderVersion
+from registry.sql.models.organization import Organization
+
+ModuleAddress = namedtuple('ModuleAddress', ['organization', 'module', 'provider', 'version'])
+
+
+def resolve_address(session: Session, organization_name: str, module_name: str = None, provider_name: str = None,
+                    version: str = None) -> ModuleAddress:
+    """Resolve a module address down to the deepest requested level with a single query.
+
+    Every level is outer joined onto its parent so a missing level comes back as None
+    instead of dropping the whole row, this lets callers tell which part of the address
+    does not exist. Levels that were not requested are always None.
+    """
+    entities = [Organization]
+    if module_name is not None:
+        entities.append(Module)
+        if provider_name is not None:
+            entities.append(ModuleProvider)
+            if version is not None:
+                entities.append(ModuleProviderVersion)
+
+    query = session.query(*entities).filter(Organization.name == organization_name)
+    if module_name is not None:
+        query = query.outerjoin(Module, and_(Module.organization_id == Organization.id,
+                                             Module.name == module_name))
+        if provider_name is not None:
+            query = query.outerjoin(ModuleProvider, and_(ModuleProvider.module_id == Module.id,
+                                                         ModuleProvider.name == provider_name))
+            if version is not None:
+                query = query.outerjoin(ModuleProviderVersion,
+                                        and_(ModuleProviderVersion.provider_id == ModuleProvider.id,
+                                             ModuleProviderVersion.version == str(version)))
+
+    row = query.first()
+    if row is None:
+        return ModuleAddress(None, None, None, None)
+
+    if len(entities) == 1:
+        row = (row,)
+
+    return ModuleAddress(*(list(row) + [None] * (4 - len(row))))
@@ -0,0 +1,31 @@
+"""keyset pagination indexes
+
+Revision ID: 3c5f1d2a8b47
+Revises: 9e943ff7bc26
+Create Date: 2026-10-18 19:20:11.402817
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+
+revision = '3c5f1d2a8b47'
+down_revision = '9e943ff7bc26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('organizations_created_at_id_idx', 'organizations', ['created_at', 'id'])
+    op.create_index('modules_organization_id_created_at_id_idx', 'modules', ['organization_id', 'created_at', 'id'])
+    op.create_index('module_providers_module_id_created_at_id_idx', 'module_providers',
+                    ['module_id', 'created_at', 'id'])
+    op.create_index('module_provider_versions_provider_id_created_at_id_idx', 'module_provider_versions',
+                    ['provider_id', 'created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('module_provider_versions_provider_id_created_at_id_idx', 'module_provider_versions')
+    op.drop_index('module_providers_module_id_created_at_id_idx', 'module_providers')
+    op.drop_index('modules_organization_id_created_at_id_idx', 'modules')
+    op.drop_index('organizations_created_at_id_idx', 'organizations')
@@ -0,0 +1,32 @@
+"""content addressed archives
+
+Revision ID: 5e0b9c3f7a16
+Revises: d4a7e1b05c38
+Create Date: 2026-10-18 21:48:09.731552
+
+"""
+import sqlalchemy as sa
+import sqlalchemy_utils as sa_utils
+from alembic import op
+
+# revision identifiers, used by Alembic.
+
+revision = '5e0b9c3f7a16'
+down_revision = 'd4a7e1b05c38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Archives uploaded before this keep their per version storage key and are not counted here
+    op.create_table(
+        'archives',
+        sa.Column('sha256', sa.String(64), primary_key=True),
+        sa.Column('size', sa.BigInteger, nullable=False),
+        sa.Column('reference_count', sa.Integer, nullable=False),
+        sa.Column('created_at', sa_utils.ArrowType, nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table('archives')
@@ -0,0 +1,33 @@
+"""storage key index
+
+Revision ID: 6b1d8f2a9e40
+Revises: c27a9e4f1b58
+Create Date: 2026-10-19 09:04:52.671930
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+
+revision = '6b1d8f2a9e40'
+down_revision = 'c27a9e4f1b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # Order keys by their bytes like storage lists them instead of by the locale of the database
+        op.alter_column('module_version_addresses', 'storage_key', type_=sa.String(collation='C'),
+                        existing_type=sa.String, existing_nullable=False)
+
+    op.create_index('module_version_addresses_storage_key_idx', 'module_version_addresses', ['storage_key'])
+
+
+def downgrade():
+    op.drop_index('module_version_addresses_storage_key_idx', table_name='module_version_addresses')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('module_version_addresses', 'storage_key', type_=sa.String,
+                        existing_type=sa.String(collation='C'), existing_nullable=False)
@@ -0,0 +1,78 @@
+"""version semver columns
+
+Revision ID: 7a2e4c9d1f03
+Revises: 3c5f1d2a8b47
+Create Date: 2026-10-18 19:41:52.118230
+
+"""
+import sqlalchemy as sa
+import sqlalchemy_utils as sa_utils
+from alembic import op
+from semver import VersionInfo
+
+# revision identifiers, used by Alembic.
+
+revision = '7a2e4c9d1f03'
+down_revision = '3c5f1d2a8b47'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    op.add_column('module_provider_versions', sa.Column('version_major', sa.Integer, nullable=True))
+    op.add_column('module_provider_versions', sa.Column('version_minor', sa.Integer, nullable=True))
+    op.add_column('module_provider_versions', sa.Column('version_patch', sa.Integer, nullable=True))
+    op.add_column('module_provider_versions', sa.Column('version_prerelease_rank', sa.Integer, nullable=True))
+    op.add_column('module_provider_versions', sa.Column('version_prerelease', sa.String, nullable=True))
+
+    versions = sa.table(
+        'module_provider_versions',
+        sa.column('id', sa_utils.UUIDType),
+        sa.column('version', sa.String),
+        sa.column('version_major', sa.Integer),
+        sa.column('version_minor', sa.Integer),
+        sa.column('version_patch', sa.Integer),
+        sa.column('version_prerelease_rank', sa.Integer),
+        sa.column('version_prerelease', sa.String),
+    )
+
+    connection = op.get_bind()
+    while True:
+        rows = connection.execute(
+            sa.select([versions.c.id, versions.c.version]).where(versions.c.version_major.is_(None)).limit(
+                BATCH_SIZE)).fetchall()
+        if len(rows) == 0:
+            break
+
+        for row in rows:
+            version_info = VersionInfo.parse(row.version)
+            connection.execute(versions.update().where(versions.c.id == row.id).values(
+                version_major=version_info.major,
+                version_minor=version_info.minor,
+                version_patch=version_info.patch,
+                version_prerelease_rank=0 if version_info.prerelease else 1,
+                version_prerelease=version_info.prerelease or ''
+            ))
+
+    with op.batch_alter_table('module_provider_versions') as batch_op:
+        batch_op.alter_column('version_major', existing_type=sa.Integer, nullable=False)
+        batch_op.alter_column('version_minor', existing_type=sa.Integer, nullable=False)
+        batch_op.alter_column('version_patch', existing_type=sa.Integer, nullable=False)
+        batch_op.alter_column('version_prerelease_rank', existing_type=sa.Integer, nullable=False)
+        batch_op.alter_column('version_prerelease', existing_type=sa.String, nullable=False)
+
+    op.create_index('module_provider_versions_provider_id_semver_idx', 'module_provider_versions',
+                    ['provider_id', 'version_major', 'version_minor', 'version_patch', 'version_prerelease_rank',
+                     'version_prerelease'])
+
+
+def downgrade():
+    op.drop_index('module_provider_versions_provider_id_semver_idx', 'module_provider_versions')
+    with op.batch_alter_table('module_provider_versions') as batch_op:
+        batch_op.drop_column('version_prerelease')
+        batch_op.drop_column('version_prerelease_rank')
+        batch_op.drop_column('version_patch')
+        batch_op.drop_column('version_minor')
+        batch_op.drop_column('version_major')
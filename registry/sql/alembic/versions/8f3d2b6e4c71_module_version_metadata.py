@@ -0,0 +1,31 @@
+"""module version metadata
+
+Revision ID: 8f3d2b6e4c71
+Revises: 5e0b9c3f7a16
+Create Date: 2026-10-18 22:31:40.118274
+
+"""
+import sqlalchemy as sa
+import sqlalchemy_utils as sa_utils
+from alembic import op
+
+# revision identifiers, used by Alembic.
+
+revision = '8f3d2b6e4c71'
+down_revision = '5e0b9c3f7a16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'module_version_metadata',
+        sa.Column('version_id', sa_utils.UUIDType,
+                  sa.ForeignKey('module_provider_versions.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('data', sa.LargeBinary, nullable=False),
+        sa.Column('created_at', sa_utils.ArrowType, nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table('module_version_metadata')
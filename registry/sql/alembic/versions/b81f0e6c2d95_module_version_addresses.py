@@ -0,0 +1,78 @@
+"""module version addresses
+
+Revision ID: b81f0e6c2d95
+Revises: 7a2e4c9d1f03
+Create Date: 2026-10-18 20:02:37.561904
+
+"""
+import sqlalchemy as sa
+import sqlalchemy_utils as sa_utils
+from alembic import op
+
+# revision identifiers, used by Alembic.
+
+revision = 'b81f0e6c2d95'
+down_revision = '7a2e4c9d1f03'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    # The init migration declared these foreign keys as strings while the models and
+    # the columns they reference use UUIDs, joins then need a cast on every row
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('module_providers', 'module_id', type_=sa_utils.UUIDType,
+                        postgresql_using='module_id::uuid')
+        op.alter_column('module_provider_versions', 'provider_id', type_=sa_utils.UUIDType,
+                        postgresql_using='provider_id::uuid')
+
+    op.create_table(
+        'module_version_addresses',
+        sa.Column('address', sa.String, primary_key=True),
+        sa.Column('version_id', sa_utils.UUIDType, sa.ForeignKey('module_provider_versions.id', ondelete='CASCADE'),
+                  nullable=False, unique=True),
+        sa.Column('storage_key', sa.String, nullable=False),
+        sa.Column('filename', sa.String, nullable=False),
+        sa.Column('created_at', sa_utils.ArrowType, nullable=False, server_default=sa.func.now()),
+    )
+
+    organizations = sa.table('organizations', sa.column('id', sa_utils.UUIDType), sa.column('name', sa.String))
+    modules = sa.table('modules', sa.column('id', sa_utils.UUIDType), sa.column('organization_id', sa_utils.UUIDType),
+                       sa.column('name', sa.String))
+    providers = sa.table('module_providers', sa.column('id', sa_utils.UUIDType),
+                         sa.column('module_id', sa_utils.UUIDType), sa.column('name', sa.String))
+    versions = sa.table('module_provider_versions', sa.column('id', sa_utils.UUIDType),
+                        sa.column('provider_id', sa_utils.UUIDType), sa.column('version', sa.String))
+    addresses = sa.table('module_version_addresses', sa.column('address', sa.String),
+                         sa.column('version_id', sa_utils.UUIDType), sa.column('storage_key', sa.String),
+                         sa.column('filename', sa.String))
+
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select([organizations.c.name, modules.c.name, providers.c.name, versions.c.version, versions.c.id])
+        .select_from(organizations.join(modules, modules.c.organization_id == organizations.c.id)
+                     .join(providers, providers.c.module_id == modules.c.id)
+                     .join(versions, versions.c.provider_id == providers.c.id))
+    )
+    while True:
+        batch = rows.fetchmany(BATCH_SIZE)
+        if len(batch) == 0:
+            break
+
+        connection.execute(addresses.insert(), [
+            {
+                'address': "/".join([organization_name, module_name, provider_name, version]),
+                'version_id': version_id,
+                'storage_key': str(version_id),
+                'filename': "-".join([organization_name, module_name, provider_name, version]),
+            } for organization_name, module_name, provider_name, version, version_id in batch
+        ])
+
+
+def downgrade():
+    op.drop_table('module_version_addresses')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('module_provider_versions', 'provider_id', type_=sa.String)
+        op.alter_column('module_providers', 'module_id', type_=sa.String)
@@ -0,0 +1,33 @@
+"""storage deletions
+
+Revision ID: c27a9e4f1b58
+Revises: 8f3d2b6e4c71
+Create Date: 2026-10-18 23:12:07.530218
+
+"""
+import sqlalchemy as sa
+import sqlalchemy_utils as sa_utils
+from alembic import op
+
+# revision identifiers, used by Alembic.
+
+revision = 'c27a9e4f1b58'
+down_revision = '8f3d2b6e4c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'storage_deletions',
+        sa.Column('key', sa.String(1024), primary_key=True),
+        sa.Column('attempts', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa_utils.ArrowType, nullable=False, server_default=sa.func.now()),
+        sa.Column('created_at', sa_utils.ArrowType, nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('storage_deletions_next_attempt_at_idx', 'storage_deletions', ['next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('storage_deletions_next_attempt_at_idx', table_name='storage_deletions')
+    op.drop_table('storage_deletions')
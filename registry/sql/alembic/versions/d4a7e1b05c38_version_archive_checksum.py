@@ -0,0 +1,27 @@
+"""version archive checksum
+
+Revision ID: d4a7e1b05c38
+Revises: b81f0e6c2d95
+Create Date: 2026-10-18 21:14:52.208113
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+
+revision = 'd4a7e1b05c38'
+down_revision = 'b81f0e6c2d95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('module_provider_versions', sa.Column('archive_size', sa.BigInteger, nullable=True))
+    op.add_column('module_provider_versions', sa.Column('archive_sha256', sa.String(64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('module_provider_versions') as batch_op:
+        batch_op.drop_column('archive_sha256')
+        batch_op.drop_column('archive_size')
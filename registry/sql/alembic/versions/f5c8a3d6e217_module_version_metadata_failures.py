@@ -0,0 +1,33 @@
+"""module version metadata failures
+
+Revision ID: f5c8a3d6e217
+Revises: 6b1d8f2a9e40
+Create Date: 2026-10-19 11:26:37.504819
+
+"""
+import sqlalchemy as sa
+import sqlalchemy_utils as sa_utils
+from alembic import op
+
+# revision identifiers, used by Alembic.
+
+revision = 'f5c8a3d6e217'
+down_revision = '6b1d8f2a9e40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('module_version_metadata') as batch_op:
+        batch_op.alter_column('data', existing_type=sa.LargeBinary, nullable=True)
+        batch_op.add_column(sa.Column('failures', sa.Integer, nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('failed_at', sa_utils.ArrowType, nullable=True))
+
+
+def downgrade():
+    op.execute("DELETE FROM module_version_metadata WHERE data IS NULL")
+
+    with op.batch_alter_table('module_version_metadata') as batch_op:
+        batch_op.drop_column('failed_at')
+        batch_op.drop_column('failures')
+        batch_op.alter_column('data', existing_type=sa.LargeBinary, nullable=False)
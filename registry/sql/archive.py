@@ -0,0 +1,93 @@
+from typing import List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from registry.sql.deletion import cancel_deletion, enqueue_deletion
+from registry.sql.models.archive import Archive
+from registry.sql.models.module import ModuleProviderVersion, ModuleVersionAddress
+from registry.storage.storage import Storage
+
+
+def add_archive_reference(session: Session, sha256: str, size: int) -> bool:
+    """Reference the archive with the given hash from a version.
+
+    Returns True when the archive is new and still has to be put into storage under its key.
+    """
+    # Counting up in the database instead of in python keeps concurrent uploads of the same content correct
+    updated = session.query(Archive).filter(Archive.sha256 == sha256).update(
+        {Archive.reference_count: Archive.reference_count + 1}, synchronize_session=False)
+    if updated > 0:
+        return False
+
+    try:
+        with session.begin_nested():
+            session.add(Archive(sha256=sha256, size=size, reference_count=1))
+    except IntegrityError:
+        # Somebody else uploaded the same content at the same time
+        session.query(Archive).filter(Archive.sha256 == sha256).update(
+            {Archive.reference_count: Archive.reference_count + 1}, synchronize_session=False)
+        return False
+
+    # The archive may still be queued for deletion from when its content was last removed
+    cancel_deletion(session, Archive.build_storage_key(sha256))
+    return True
+
+
+def remove_archive_reference(session: Session, sha256: str) -> bool:
+    """Drop a reference of a version to the archive with the given hash.
+
+    Returns True when that was the last reference and the archive should be removed from storage.
+    """
+    session.query(Archive).filter(Archive.sha256 == sha256).update(
+        {Archive.reference_count: Archive.reference_count - 1}, synchronize_session=False)
+    deleted = session.query(Archive).filter(Archive.sha256 == sha256, Archive.reference_count <= 0).delete(
+        synchronize_session=False)
+
+    return deleted > 0
+
+
+def release_storage_key(session: Session, version: ModuleProviderVersion, storage_key: str) -> Optional[str]:
+    """Stop using storage_key for the archive of version and return it if nothing else uses it anymore"""
+    if version.archive_sha256 is not None and storage_key == Archive.build_storage_key(version.archive_sha256):
+        if remove_archive_reference(session, version.archive_sha256):
+            return storage_key
+        return None
+
+    # Uploaded straight to storage under the key of the version
+    return storage_key
+
+
+def store_by_hash(session: Session, storage: Storage, version: ModuleProviderVersion,
+                  version_address: ModuleVersionAddress, key: str, sha256: str, size: int) -> List[str]:
+    """Point version at the content addressed archive with the given hash, key holds a copy of its content.
+
+    The copy is moved under the hash when the archive is new, otherwise it is queued for deletion with every
+    key the version no longer uses. Returns the queued keys.
+    """
+    stale_keys = []
+    moved = False
+    storage_key = Archive.build_storage_key(sha256)
+    if version_address.storage_key != storage_key:
+        if add_archive_reference(session, sha256, size):
+            storage.move(key, storage_key)
+            moved = True
+
+        stale_key = release_storage_key(session, version, version_address.storage_key)
+        if stale_key is not None:
+            stale_keys.append(stale_key)
+
+        version_address.storage_key = storage_key
+
+    if moved:
+        # The version may have pointed at key before, it is gone now and may be written to again
+        stale_keys = [k for k in stale_keys if k != key]
+    elif key not in stale_keys:
+        stale_keys.append(key)
+
+    for stale_key in stale_keys:
+        enqueue_deletion(session, stale_key)
+
+    version.archive_size = size
+    version.archive_sha256 = sha256
+    return stale_keys
@@ -1,35 +1,270 @@
+import functools
+import logging
+import threading
+import time
 from contextlib import contextmanager
+from typing import Callable, List
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
+
+from registry.metrics import observe_db_query
 
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
+# The most bind parameters a single statement may have, SQLite before 3.32 allows the fewest
+MAX_PARAMETERS = {'sqlite': 999}
+DEFAULT_MAX_PARAMETERS = 32767
+
+
+def max_parameters(dialect_name: str) -> int:
+    return MAX_PARAMETERS.get(dialect_name, DEFAULT_MAX_PARAMETERS)
+
+
+class ReplicaError(Exception):
+    """Reading from a replica failed, the read can be done again on the primary"""
+    pass
+
+
+class PoolMetrics(object):
+    """Counters of how long connections are waited for and how often idle connections are pinged"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.pings = 0
+        self.ping_failures = 0
+
+        self.__lock = threading.Lock()
+
+    def observe_checkout(self, wait_seconds: float, timed_out=False):
+        with self.__lock:
+            self.checkouts += 1
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def observe_ping(self, failed=False):
+        with self.__lock:
+            self.pings += 1
+            if failed:
+                self.ping_failures += 1
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                'checkouts': self.checkouts,
+                'wait_seconds': self.wait_seconds,
+                'max_wait_seconds': self.max_wait_seconds,
+                'timeouts': self.timeouts,
+                'pings': self.pings,
+                'ping_failures': self.ping_failures,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that records how long every checkout waited for a connection"""
+
+    metrics = None
+
+    def recreate(self):
+        # The pool is recreated when the engine is disposed or connections are invalidated
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.observe_checkout(time.monotonic() - start, timed_out=True)
+            raise
+
+        if self.metrics is not None:
+            self.metrics.observe_checkout(time.monotonic() - start)
+        return connection
+
+
+class Replica(object):
+    """A read replica of the database and until when it is skipped after it failed"""
+
+    def __init__(self, db_url: str):
+        self.db_url = db_url
+        self.engine = None
+        self.pool_metrics = PoolMetrics()
+        self.down_until = 0.0
+
 
 class Database(object):
 
-    def __init__(self, db_url, pool_size=5):
+    def __init__(self, db_url, pool_size=5, max_overflow=10, pool_recycle=1800, ping_idle=30,
+                 replica_urls: List[str] = None, replica_lag=5, replica_retry=30):
         self.db_url = db_url
         self.engine = None
         self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        # Connections are replaced after this many seconds so they never hit server side timeouts
+        self.pool_recycle = pool_recycle
+        # Connections idle for longer than this many seconds are pinged before they are used
+        self.ping_idle = ping_idle
+        self.pool_metrics = PoolMetrics()
 
-    def connect(self):
-        # https://docs.sqlalchemy.org/en/latest/core/pooling.html#disconnect-handling-pessimistic
-        driver = make_url(self.db_url).get_driver_name()
+        self.replicas = [Replica(url) for url in replica_urls or []]
+        # Reads of a client go to the primary for this many seconds after it wrote so it sees its write even when
+        # the replicas lag behind, see RootMount.db_session
+        self.replica_lag = replica_lag
+        # A replica that failed is not used again for this many seconds
+        self.replica_retry = replica_retry
+
+        self.__next_replica = 0
+        self.__lock = threading.Lock()
+
+    def __create_engine(self, db_url: str, pool_metrics: PoolMetrics):
+        driver = make_url(db_url).get_driver_name()
         kwargs = {}
         if driver != 'pysqlite':  # All drivers but sqlite have pool_size
+            kwargs['poolclass'] = InstrumentedQueuePool
             kwargs['pool_size'] = self.pool_size
-        self.engine = create_engine(self.db_url, pool_pre_ping=True, **kwargs)
+            kwargs['max_overflow'] = self.max_overflow
+        engine = create_engine(db_url, pool_recycle=self.pool_recycle, **kwargs)
+
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            engine.pool.metrics = pool_metrics
+
+        if driver != 'pysqlite':
+            event.listen(engine, 'checkin', self.__checkin)
+            event.listen(engine, 'checkout', functools.partial(self.__checkout, pool_metrics))
+
+        event.listen(engine, 'before_cursor_execute', self.__before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.__after_cursor_execute)
+
+        return engine
+
+    @staticmethod
+    def __before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context so a failed query leaves nothing behind on the connection
+        if context is not None:
+            context._query_started_at = time.perf_counter()
+
+    @staticmethod
+    def __after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started_at = getattr(context, '_query_started_at', None)
+        if started_at is None:
+            return
+
+        # Counted towards the request the current thread is handling, if any
+        observe_db_query(statement, time.perf_counter() - started_at)
+
+    def connect(self):
+        self.engine = self.__create_engine(self.db_url, self.pool_metrics)
+        for replica in self.replicas:
+            replica.engine = self.__create_engine(replica.db_url, replica.pool_metrics)
+            event.listen(replica.engine, 'handle_error', functools.partial(self.__replica_error, replica))
+
+    def __replica_error(self, replica: Replica, context):
+        # Connection errors take the replica out of the rotation, errors of a query do not
+        if context.is_disconnect or context.connection is None:
+            logger.warning("Not using database replica %s for %d seconds: %s", make_url(replica.db_url).host,
+                           self.replica_retry, context.original_exception)
+            replica.down_until = time.monotonic() + self.replica_retry
+
+    def __read_engine(self):
+        now = time.monotonic()
+        with self.__lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self.__next_replica % len(self.replicas)]
+                self.__next_replica += 1
+                if replica.down_until <= now:
+                    return replica.engine
+
+        # No replicas or all of them are down
+        return self.engine
+
+    @staticmethod
+    def __checkin(dbapi_connection, connection_record):
+        connection_record.info['checked_in_at'] = time.monotonic()
+
+    def __checkout(self, pool_metrics: PoolMetrics, dbapi_connection, connection_record, connection_proxy):
+        # Only connections that sat idle for a while can have been dropped without us noticing,
+        # busy connections skip the round trip a ping on every checkout would add.
+        # https://docs.sqlalchemy.org/en/latest/core/pooling.html#disconnect-handling-pessimistic
+        checked_in_at = connection_record.info.get('checked_in_at')
+        if checked_in_at is None or time.monotonic() - checked_in_at < self.ping_idle:
+            return
+
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception as e:
+            pool_metrics.observe_ping(failed=True)
+            # The pool throws the connection away and retries the checkout with a new one
+            raise exc.DisconnectionError() from e
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+        pool_metrics.observe_ping()
+
+    def __engine_stats(self, engine, pool_metrics: PoolMetrics) -> dict:
+        stats = pool_metrics.stats()
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'size': pool.size(),
+                'max_overflow': self.max_overflow,
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                # Negative while the pool has not opened all of its connections yet
+                'overflow': max(pool.overflow(), 0),
+            })
+
+        return stats
+
+    def pool_stats(self) -> dict:
+        stats = self.__engine_stats(self.engine, self.pool_metrics)
+        if len(self.replicas) > 0:
+            now = time.monotonic()
+            stats['replicas'] = []
+            for replica in self.replicas:
+                replica_stats = self.__engine_stats(replica.engine, replica.pool_metrics)
+                replica_stats['host'] = make_url(replica.db_url).host
+                replica_stats['healthy'] = replica.down_until <= now
+                stats['replicas'].append(replica_stats)
+
+        return stats
 
     @contextmanager
-    def session(self):
+    def session(self, read_only=False, after_commit: Callable[[], None] = None):
+        """A session on the primary, or on a healthy replica when it is read only.
+
+        Database errors of a session on a replica are raised as a ReplicaError so the read can be retried on the
+        primary. after_commit is called whenever the session commits, requests use it to remember that their
+        client wrote.
+        """
+        engine = self.__read_engine() if read_only else self.engine
         scoped = scoped_session(sessionmaker())
-        scoped.configure(bind=self.engine)
+        scoped.configure(bind=engine)
         session = scoped()
+        if after_commit is not None:
+            event.listen(session, 'after_commit', lambda s: after_commit())
 
         try:
             yield session
+        except exc.DBAPIError as e:
+            if engine is self.engine:
+                raise
+            raise ReplicaError("Error reading from database replica %s: %s" % (engine.url.host, e)) from e
         finally:
             scoped.remove()
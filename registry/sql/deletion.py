@@ -0,0 +1,22 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from registry.sql.models.deletion import StorageDeletion
+
+
+def enqueue_deletion(session: Session, key: str):
+    """Queue an archive to be removed from storage once the session is committed"""
+    if session.query(StorageDeletion.key).filter(StorageDeletion.key == key).first() is not None:
+        return
+
+    try:
+        with session.begin_nested():
+            session.add(StorageDeletion(key=key))
+    except IntegrityError:
+        # Queued by somebody else at the same time
+        pass
+
+
+def cancel_deletion(session: Session, key: str):
+    """Keep an archive that is about to be written again from being removed from storage"""
+    session.query(StorageDeletion).filter(StorageDeletion.key == key).delete(synchronize_session=False)
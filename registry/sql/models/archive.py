@@ -0,0 +1,21 @@
+import arrow
+from sqlalchemy import Column, String, func, Integer, BigInteger
+from sqlalchemy_utils import ArrowType
+
+from registry.sql.database import Base
+
+
+class Archive(Base):
+    """A module archive stored once under its content hash and shared by every version uploaded with it"""
+    __tablename__ = 'archives'
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    # The amount of versions using the archive, it is removed from storage once this drops to 0
+    reference_count = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(ArrowType, nullable=False, default=arrow.utcnow, server_default=func.now())
+
+    @staticmethod
+    def build_storage_key(sha256: str) -> str:
+        return 'sha256/' + sha256
@@ -0,0 +1,21 @@
+import arrow
+from sqlalchemy import Column, String, func, Integer, Index
+from sqlalchemy_utils import ArrowType
+
+from registry.sql.database import Base
+
+
+class StorageDeletion(Base):
+    """An archive waiting to be removed from storage by the deletion worker"""
+    __tablename__ = 'storage_deletions'
+
+    key = Column(String(1024), primary_key=True)
+    # The amount of times deleting the archive failed, used to back off retrying it
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(ArrowType, nullable=False, default=arrow.utcnow, server_default=func.now())
+
+    created_at = Column(ArrowType, nullable=False, default=arrow.utcnow, server_default=func.now())
+
+    __table_args__ = (
+        Index("storage_deletions_next_attempt_at_idx", next_attempt_at),
+    )
@@ -1,6 +1,9 @@
 import uuid
 
-from sqlalchemy import Column, String, func, Index, ForeignKey
+import arrow
+from semver import VersionInfo
+from sqlalchemy import Column, String, func, Index, ForeignKey, Integer, BigInteger, LargeBinary, desc, and_, or_
+from sqlalchemy.orm import validates
 from sqlalchemy_utils import ArrowType, UUIDType
 
 from registry.sql.database import Base
@@ -13,11 +16,12 @@ class Module(Base):
     organization_id = Column(UUIDType, ForeignKey('organizations.id'), nullable=False, index=True)
     name = Column(String, nullable=False)
 
-    created_at = Column(ArrowType, index=True, nullable=False, server_default=func.now())
+    created_at = Column(ArrowType, index=True, nullable=False, default=arrow.utcnow, server_default=func.now())
     updated_at = Column(ArrowType, nullable=False, server_default=func.now(), onupdate=func.now())
 
     __table_args__ = (
         Index("organization_id_name_idx", organization_id, name, unique=True),
+        Index("modules_organization_id_created_at_id_idx", organization_id, created_at, id),
     )
 
 
@@ -28,11 +32,12 @@ class ModuleProvider(Base):
     module_id = Column(UUIDType, ForeignKey('modules.id'), nullable=False, index=True)
     name = Column(String, nullable=False)
 
-    created_at = Column(ArrowType, index=True, nullable=False, server_default=func.now())
+    created_at = Column(ArrowType, index=True, nullable=False, default=arrow.utcnow, server_default=func.now())
     updated_at = Column(ArrowType, nullable=False, server_default=func.now(), onupdate=func.now())
 
     __table_args__ = (
         Index("module_id_name_idx", module_id, name, unique=True),
+        Index("module_providers_module_id_created_at_id_idx", module_id, created_at, id),
     )
 
 
@@ -43,9 +48,110 @@ class ModuleProviderVersion(Base):
     provider_id = Column(UUIDType, ForeignKey('module_providers.id'), nullable=False, index=True)
     version = Column(String, nullable=False)
 
-    created_at = Column(ArrowType, index=True, nullable=False, server_default=func.now())
+    # Parsed out of version so versions can be ordered and filtered by semver precedence in the database
+    # prerelease_rank is 0 for prereleases and 1 for releases so releases order after their prereleases
+    version_major = Column(Integer, nullable=False)
+    version_minor = Column(Integer, nullable=False)
+    version_patch = Column(Integer, nullable=False)
+    version_prerelease_rank = Column(Integer, nullable=False)
+    version_prerelease = Column(String, nullable=False, default='')
+
+    # Only known when the archive was uploaded through the registry
+    archive_size = Column(BigInteger, nullable=True)
+    archive_sha256 = Column(String(64), nullable=True)
+
+    created_at = Column(ArrowType, index=True, nullable=False, default=arrow.utcnow, server_default=func.now())
     updated_at = Column(ArrowType, nullable=False, server_default=func.now(), onupdate=func.now())
 
     __table_args__ = (
         Index("provider_id_version_idx", provider_id, version, unique=True),
+        Index("module_provider_versions_provider_id_created_at_id_idx", provider_id, created_at, id),
+        Index("module_provider_versions_provider_id_semver_idx", provider_id, version_major, version_minor,
+              version_patch, version_prerelease_rank, version_prerelease),
+    )
+
+    @validates('version')
+    def validate_version(self, key, version):
+        version_info = VersionInfo.parse(str(version))
+        self.version_major = version_info.major
+        self.version_minor = version_info.minor
+        self.version_patch = version_info.patch
+        self.version_prerelease_rank = 0 if version_info.prerelease else 1
+        self.version_prerelease = version_info.prerelease or ''
+
+        return str(version)
+
+    @classmethod
+    def semver_order(cls, descending=True) -> list:
+        """Order by clauses sorting versions by semver precedence
+
+        Prereleases of the same major.minor.patch are ordered by their prerelease string
+        which matches semver precedence except for numeric identifiers of different lengths.
+        """
+        columns = [cls.version_major, cls.version_minor, cls.version_patch, cls.version_prerelease_rank,
+                   cls.version_prerelease]
+        if descending:
+            return [desc(c) for c in columns]
+        return columns
+
+    @classmethod
+    def semver_compare(cls, operator: str, version: VersionInfo):
+        """SQL expression comparing versions against the given version by semver precedence
+
+        The operator is one of <, <=, > or >=
+        """
+        columns = [cls.version_major, cls.version_minor, cls.version_patch, cls.version_prerelease_rank,
+                   cls.version_prerelease]
+        values = [version.major, version.minor, version.patch, 0 if version.prerelease else 1,
+                  version.prerelease or '']
+
+        clauses = []
+        for i, column in enumerate(columns):
+            equal = [c == v for c, v in zip(columns[:i], values[:i])]
+            if operator[0] == '<':
+                clauses.append(and_(*equal, column < values[i]))
+            else:
+                clauses.append(and_(*equal, column > values[i]))
+
+        if operator.endswith('='):
+            clauses.append(and_(*[c == v for c, v in zip(columns, values)]))
+
+        return or_(*clauses)
+
+
+class ModuleVersionAddress(Base):
+    """Denormalized lookup of a full module version address to its archive
+
+    Kept in sync by the version create and delete handlers so a download only needs a primary key read.
+    """
+    __tablename__ = 'module_version_addresses'
+
+    address = Column(String, primary_key=True)
+    version_id = Column(UUIDType, ForeignKey('module_provider_versions.id', ondelete='CASCADE'), nullable=False,
+                        unique=True)
+    storage_key = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+
+    created_at = Column(ArrowType, nullable=False, default=arrow.utcnow, server_default=func.now())
+
+    __table_args__ = (
+        Index("module_version_addresses_storage_key_idx", storage_key),
     )
+
+    @staticmethod
+    def build_address(organization_name: str, module_name: str, provider_name: str, version: str) -> str:
+        return "/".join([organization_name, module_name, provider_name, version])
+
+
+class ModuleVersionMetadata(Base):
+    """What was found inside the archive of a version, see registry.introspection"""
+    __tablename__ = 'module_version_metadata'
+
+    version_id = Column(UUIDType, ForeignKey('module_provider_versions.id', ondelete='CASCADE'), primary_key=True)
+    # zlib compressed JSON, None when the archive could not be inspected
+    data = Column(LargeBinary, nullable=True)
+    # Inspections that failed in a row and when the last one did, they are retried with a back-off
+    failures = Column(Integer, nullable=False, default=0, server_default='0')
+    failed_at = Column(ArrowType, nullable=True)
+
+    created_at = Column(ArrowType, nullable=False, default=arrow.utcnow, server_default=func.now())
@@ -1,6 +1,7 @@
 import uuid
 
-from sqlalchemy import Column, String, func
+import arrow
+from sqlalchemy import Column, String, func, Index
 from sqlalchemy_utils import ArrowType, UUIDType
 
 from registry.sql.database import Base
@@ -12,5 +13,9 @@ class Organization(Base):
     id = Column(UUIDType, primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False, unique=True, index=True)
     
-    created_at = Column(ArrowType, index=True, nullable=False, server_default=func.now())
+    created_at = Column(ArrowType, index=True, nullable=False, default=arrow.utcnow, server_default=func.now())
     updated_at = Column(ArrowType, nullable=False, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("organizations_created_at_id_idx", created_at, id),
+    )
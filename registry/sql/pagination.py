@@ -0,0 +1,53 @@
+import base64
+import datetime
+import struct
+import uuid
+from typing import List, Optional, Tuple
+
+import arrow
+from sqlalchemy import and_, desc, or_
+from sqlalchemy.orm import Query
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_CURSOR = struct.Struct('>q16s')
+
+
+def encode_cursor(created_at: arrow.Arrow, id: uuid.UUID) -> str:
+    """Encode the position of a row into an opaque list marker"""
+    delta = created_at.to('UTC').naive - _EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return base64.urlsafe_b64encode(_CURSOR.pack(microseconds, id.bytes)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[arrow.Arrow, uuid.UUID]:
+    """Decode a list marker created by encode_cursor, raises a ValueError if it is invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        microseconds, id_bytes = _CURSOR.unpack(raw)
+        # A marker that decodes fine can still hold a time datetime can not represent
+        created_at = arrow.get(_EPOCH + datetime.timedelta(microseconds=microseconds))
+    except (TypeError, ValueError, OverflowError, struct.error) as e:
+        raise ValueError("Invalid cursor") from e
+
+    return created_at, uuid.UUID(bytes=id_bytes)
+
+
+def paginate(query: Query, model, limit: int, marker: Optional[str]) -> Tuple[List, Optional[str]]:
+    """Return a page of rows newest first and the marker for the next page if there is one.
+
+    Rows are ordered by (created_at, id) so rows sharing a created_at are never skipped and
+    the marker carries both values so the next page is a single range scan over the
+    (created_at, id) index without looking up the marker row.
+    """
+    query = query.order_by(desc(model.created_at), desc(model.id))
+    if marker is not None:
+        created_at, id = decode_cursor(marker)
+        query = query.filter(or_(model.created_at < created_at,
+                                 and_(model.created_at == created_at, model.id < id)))
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        del rows[limit:]
+        return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return rows, None
@@ -0,0 +1,201 @@
+import hashlib
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from typing import BinaryIO, Iterable, Iterator, List, Tuple
+
+import arrow
+
+from registry.storage.storage import CHUNK_SIZE, ObjectNotFoundError, Storage, StorageError, UploadNotFoundError
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _chunks(fileobj: BinaryIO) -> Iterator[bytes]:
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _file_chunks(path: str) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        yield from _chunks(f)
+
+
+class LocalStorage(Storage):
+    """Stores archives in a directory on the local filesystem.
+
+    Archives are fanned out over two levels of sub directories by the start of the last
+    segment of their key and are written to a temporary file first so readers never see a partial archive.
+    Parts of multipart uploads are kept in a directory per upload until it is completed.
+    """
+
+    local = True
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def archive_path(self, key: str) -> str:
+        """The path of the file the archive with the given key is stored in"""
+        segments = key.split('/')
+        name = segments[-1]
+        return os.path.join(self.path, *segments[:-1], name[:2], name[2:4], name)
+
+    def __upload_path(self, upload_id: str) -> str:
+        return os.path.join(self.path, '.uploads', upload_id)
+
+    def __existing_upload_path(self, key: str, upload_id: str) -> str:
+        if _UPLOAD_ID_RE.match(upload_id) is None:
+            raise UploadNotFoundError("The upload %s does not exist" % upload_id)
+
+        path = self.__upload_path(upload_id)
+        try:
+            with open(os.path.join(path, 'key')) as f:
+                upload_key = f.read()
+        except FileNotFoundError as e:
+            raise UploadNotFoundError("The upload %s does not exist" % upload_id) from e
+
+        if upload_key != key:
+            raise UploadNotFoundError("The upload %s does not exist" % upload_id)
+
+        return path
+
+    @staticmethod
+    def __write_file(path: str, chunks: Iterable[bytes]):
+        # Write to a temporary file next to path and move it in place once it is complete
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def check(self):
+        if os.path.isdir(self.path) is False:
+            raise StorageError("The storage path %s is not a directory" % self.path)
+
+        if os.access(self.path, os.W_OK) is False:
+            raise StorageError("The storage path %s is not writable" % self.path)
+
+    def open(self, key: str) -> BinaryIO:
+        try:
+            return open(self.archive_path(key), 'rb')
+        except FileNotFoundError as e:
+            raise ObjectNotFoundError("The archive %s does not exist" % key) from e
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.archive_path(key))
+
+    def write(self, key: str, fileobj: BinaryIO):
+        self.__write_file(self.archive_path(key), _chunks(fileobj))
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self.archive_path(key))
+        except FileNotFoundError:
+            pass
+
+    def move(self, key: str, new_key: str):
+        path = self.archive_path(new_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.replace(self.archive_path(key), path)
+        except FileNotFoundError as e:
+            raise ObjectNotFoundError("The archive %s does not exist" % key) from e
+
+    def create_multipart_upload(self, key: str) -> str:
+        upload_id = uuid.uuid4().hex
+        path = self.__upload_path(upload_id)
+        os.makedirs(path)
+        with open(os.path.join(path, 'key'), 'w') as f:
+            f.write(key)
+
+        return upload_id
+
+    def write_part(self, key: str, upload_id: str, part_number: int, fileobj: BinaryIO) -> str:
+        path = self.__existing_upload_path(key, upload_id)
+
+        # Like S3 the ETag of a part is the MD5 of its content
+        digest = hashlib.md5()
+
+        def hashed_chunks():
+            for chunk in _chunks(fileobj):
+                digest.update(chunk)
+                yield chunk
+
+        self.__write_file(os.path.join(path, str(part_number)), hashed_chunks())
+        etag = '"%s"' % digest.hexdigest()
+        with open(os.path.join(path, str(part_number) + '.etag'), 'w') as f:
+            f.write(etag)
+
+        return etag
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        path = self.__existing_upload_path(key, upload_id)
+
+        for part_number, etag in parts:
+            try:
+                with open(os.path.join(path, str(part_number) + '.etag')) as f:
+                    part_etag = f.read()
+            except FileNotFoundError:
+                part_etag = None
+
+            if part_etag is None or part_etag.strip('"') != etag.strip('"'):
+                raise StorageError("Part %d has not been uploaded or its ETag does not match" % part_number)
+
+        part_paths = [os.path.join(path, str(part_number)) for part_number, _ in parts]
+        self.__write_file(self.archive_path(key), itertools.chain.from_iterable(map(_file_chunks, part_paths)))
+        shutil.rmtree(path, ignore_errors=True)
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        try:
+            path = self.__existing_upload_path(key, upload_id)
+        except UploadNotFoundError:
+            return
+
+        shutil.rmtree(path, ignore_errors=True)
+
+    def list_archives(self) -> Iterator[Tuple[str, arrow.Arrow]]:
+        # The fan out directories do not sort like the keys they hold so the keys are sorted in memory,
+        # local storage is meant for installations small enough for that
+        archives = []
+        for root, directories, files in os.walk(self.path):
+            if root == self.path and '.uploads' in directories:
+                directories.remove('.uploads')
+
+            segments = os.path.relpath(root, self.path).split(os.sep)
+            for name in files:
+                if segments[-2:] != [name[:2], name[2:4]]:
+                    # Temporary files of writes in progress
+                    continue
+                key = '/'.join(segments[:-2] + [name])
+                archives.append((key, arrow.get(os.path.getmtime(os.path.join(root, name)))))
+
+        archives.sort(key=lambda archive: archive[0])
+        return iter(archives)
+
+    def list_upload_keys(self) -> Iterator[str]:
+        try:
+            upload_ids = os.listdir(os.path.join(self.path, '.uploads'))
+        except FileNotFoundError:
+            return
+
+        for upload_id in upload_ids:
+            try:
+                with open(os.path.join(self.__upload_path(upload_id), 'key')) as f:
+                    yield f.read()
+            except FileNotFoundError:
+                # Completed or aborted meanwhile
+                continue
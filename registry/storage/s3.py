@@ -0,0 +1,156 @@
+import tempfile
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+import arrow
+import botocore.exceptions
+
+from registry.cache import PresignedURLCache
+from registry.metrics import timed_presign
+from registry.storage.storage import CHUNK_SIZE, DELETE_BATCH_SIZE, ObjectNotFoundError, Storage, StorageError, \
+    UploadNotFoundError
+
+# The amount of seconds a presigned upload URL is valid for
+UPLOAD_URL_EXPIRY = 300
+
+# The amount of keys listed per request, S3 does not return more than this
+LIST_PAGE_SIZE = 1000
+
+
+class S3Storage(Storage):
+    """Stores archives in an S3 bucket, terraform and clients talk to S3 directly through presigned URLs"""
+
+    def __init__(self, bucket: str, client, download_url_cache: PresignedURLCache = None):
+        self.bucket = bucket
+        self.client = client
+        self.download_url_cache = download_url_cache if download_url_cache is not None else PresignedURLCache()
+
+    def check(self):
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except botocore.exceptions.ClientError as e:
+            raise StorageError("Error checking if bucket exists: %s" % e) from e
+        except botocore.exceptions.NoCredentialsError as e:
+            raise StorageError("Error loading S3 credentials: %s" % e) from e
+
+    def __presign(self, client_method: str, params: dict, expires_in: int) -> str:
+        with timed_presign():
+            return self.client.generate_presigned_url(ClientMethod=client_method, Params=params, ExpiresIn=expires_in)
+
+    def download_url(self, key: str, filename: str) -> Optional[str]:
+        # Reuse a previously signed URL while it is still valid for long enough, archives can be
+        # shared by versions so the filename is part of the cache key
+        return self.download_url_cache.get_or_sign(
+            (key, filename),
+            lambda expires_in: self.__presign(
+                'get_object',
+                {'Bucket': self.bucket, 'Key': key,
+                 'ResponseContentDisposition': 'attachment;filename=' + filename + '.tar.gz'},
+                expires_in
+            )
+        )
+
+    def upload_url(self, key: str) -> Optional[str]:
+        return self.__presign('put_object', {'Bucket': self.bucket, 'Key': key}, UPLOAD_URL_EXPIRY)
+
+    def open(self, key: str) -> BinaryIO:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        except self.client.exceptions.NoSuchKey as e:
+            raise ObjectNotFoundError("The archive %s does not exist" % key) from e
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except botocore.exceptions.ClientError as e:
+            # HEAD responses have no body so the error code is the bare status
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+        return True
+
+    def write(self, key: str, fileobj: BinaryIO):
+        # upload_fileobj reads the file in chunks and switches to a multipart upload for large archives
+        self.client.upload_fileobj(fileobj, self.bucket, key)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_many(self, keys: List[str]) -> List[str]:
+        failed = []
+        for i in range(0, len(keys), DELETE_BATCH_SIZE):
+            response = self.client.delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [{'Key': key} for key in keys[i:i + DELETE_BATCH_SIZE]],
+                'Quiet': True,
+            })
+            # Keys that do not exist are reported as deleted, only real failures are in the errors
+            failed.extend(error['Key'] for error in response.get('Errors', []))
+
+        return failed
+
+    def move(self, key: str, new_key: str):
+        # S3 has no rename, the managed copy switches to a multipart copy for large archives
+        try:
+            self.client.copy({'Bucket': self.bucket, 'Key': key}, self.bucket, new_key)
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                raise ObjectNotFoundError("The archive %s does not exist" % key) from e
+            raise
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def create_multipart_upload(self, key: str) -> str:
+        return self.client.create_multipart_upload(Bucket=self.bucket, Key=key)['UploadId']
+
+    def upload_part_url(self, key: str, upload_id: str, part_number: int) -> Optional[str]:
+        return self.__presign('upload_part',
+                              {'Bucket': self.bucket, 'Key': key, 'UploadId': upload_id, 'PartNumber': part_number},
+                              UPLOAD_URL_EXPIRY)
+
+    def write_part(self, key: str, upload_id: str, part_number: int, fileobj: BinaryIO) -> str:
+        # S3 needs the length of a part up front so spool it to disk first
+        with tempfile.TemporaryFile() as part:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                part.write(chunk)
+            part.seek(0)
+
+            try:
+                response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                   PartNumber=part_number, Body=part)
+            except self.client.exceptions.NoSuchUpload as e:
+                raise UploadNotFoundError("The upload %s does not exist" % upload_id) from e
+
+        return response['ETag']
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        try:
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={'Parts': [{'PartNumber': part_number, 'ETag': etag} for part_number, etag in parts]}
+            )
+        except self.client.exceptions.NoSuchUpload as e:
+            raise UploadNotFoundError("The upload %s does not exist" % upload_id) from e
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] in ('InvalidPart', 'InvalidPartOrder', 'EntityTooSmall'):
+                raise StorageError(e.response['Error']['Message']) from e
+            raise
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except self.client.exceptions.NoSuchUpload:
+            pass
+
+    def list_archives(self) -> Iterator[Tuple[str, arrow.Arrow]]:
+        # S3 lists keys in UTF-8 binary order which is the same order python sorts strings in
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, PaginationConfig={'PageSize': LIST_PAGE_SIZE}):
+            for obj in page.get('Contents', []):
+                yield obj['Key'], arrow.get(obj['LastModified'])
+
+    def list_upload_keys(self) -> Iterator[str]:
+        paginator = self.client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=self.bucket, PaginationConfig={'PageSize': LIST_PAGE_SIZE}):
+            for upload in page.get('Uploads', []):
+                yield upload['Key']
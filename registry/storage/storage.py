@@ -0,0 +1,148 @@
+import hashlib
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+import arrow
+
+# Size of the chunks archives are streamed in when copying them between files and storage
+CHUNK_SIZE = 1024 * 1024
+
+# The most archives deleted in one call, S3 does not accept more keys per request
+DELETE_BATCH_SIZE = 1000
+
+
+class StorageError(Exception):
+    pass
+
+
+class ObjectNotFoundError(StorageError):
+    pass
+
+
+class UploadNotFoundError(StorageError):
+    pass
+
+
+class HashingReader(object):
+    """Wraps a file to count and SHA-256 hash everything read from it as it streams through"""
+
+    def __init__(self, fileobj: BinaryIO):
+        self.fileobj = fileobj
+        self.size = 0
+        self.__digest = hashlib.sha256()
+
+    def read(self, size=-1) -> bytes:
+        chunk = self.fileobj.read(size)
+        self.size += len(chunk)
+        self.__digest.update(chunk)
+        return chunk
+
+    @property
+    def sha256(self) -> str:
+        return self.__digest.hexdigest()
+
+
+class Storage(ABC):
+    """Where module archives are stored.
+
+    Backends that can hand out their own URLs return them from download_url and upload_url,
+    otherwise those return None and archives are sent through the registry instead.
+    """
+
+    # Whether archives are stored on this host and can be served straight from storage
+    local = False
+
+    @abstractmethod
+    def check(self):
+        """Make sure the storage can be used, raises a StorageError if not"""
+        raise NotImplementedError
+
+    def download_url(self, key: str, filename: str) -> Optional[str]:
+        return None
+
+    def upload_url(self, key: str) -> Optional[str]:
+        return None
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Open an archive for reading, raises an ObjectNotFoundError if it does not exist"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether an archive exists, without reading it"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self, key: str, fileobj: BinaryIO):
+        """Store an archive by reading fileobj until it is exhausted"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Delete an archive, deleting an archive that does not exist is not an error"""
+        raise NotImplementedError
+
+    def delete_many(self, keys: List[str]) -> List[str]:
+        """Delete several archives at once and return the keys that could not be deleted"""
+        failed = []
+        for key in keys:
+            try:
+                self.delete(key)
+            except OSError:
+                failed.append(key)
+
+        return failed
+
+    @abstractmethod
+    def move(self, key: str, new_key: str):
+        """Move an archive to a new key, replacing whatever is stored there"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_multipart_upload(self, key: str) -> str:
+        """Start uploading an archive in parts and return the id of the upload"""
+        raise NotImplementedError
+
+    def upload_part_url(self, key: str, upload_id: str, part_number: int) -> Optional[str]:
+        return None
+
+    @abstractmethod
+    def write_part(self, key: str, upload_id: str, part_number: int, fileobj: BinaryIO) -> str:
+        """Store a part of a multipart upload and return its ETag, writing a part again replaces it"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        """Join the given (part number, ETag) parts in order into the archive.
+
+        Raises an UploadNotFoundError if the upload does not exist and a StorageError if the parts do not match.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        """Throw away an upload and all of its parts"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_archives(self) -> Iterator[Tuple[str, arrow.Arrow]]:
+        """Iterate over the key and last modification time of every archive, ordered by key"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_upload_keys(self) -> Iterator[str]:
+        """Iterate over the keys of the multipart uploads that were neither completed nor aborted"""
+        raise NotImplementedError
+
+    def copy_to(self, key: str, fileobj: BinaryIO):
+        """Stream an archive into fileobj"""
+        archive = self.open(key)
+        try:
+            while True:
+                chunk = archive.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                fileobj.write(chunk)
+        finally:
+            archive.close()
@@ -0,0 +1,206 @@
+import datetime
+import hashlib
+import io
+import logging
+import random
+import tarfile
+import uuid
+from typing import Callable, Dict, List, Tuple
+
+import arrow
+from sqlalchemy import Table
+
+from registry.introspection import encode_metadata, inspect_archive
+from registry.sql.database import Database, max_parameters
+from registry.sql.models.archive import Archive
+from registry.sql.models.module import Module, ModuleProvider, ModuleProviderVersion, ModuleVersionAddress, \
+    ModuleVersionMetadata
+from registry.sql.models.organization import Organization
+from registry.storage.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+def _archive(index: int) -> bytes:
+    """A small module archive that differs for every index"""
+    main_tf = ('variable "name" {\n  description = "The name of synthetic module %d"\n}\n\n'
+               'output "id" {\n  value = var.name\n}\n' % index).encode()
+
+    fileobj = io.BytesIO()
+    with tarfile.open(fileobj=fileobj, mode='w:gz') as archive:
+        member = tarfile.TarInfo('main.tf')
+        member.size = len(main_tf)
+        archive.addfile(member, io.BytesIO(main_tf))
+
+    return fileobj.getvalue()
+
+
+class CatalogGenerator(object):
+    """Fills the database with a synthetic catalog to test pagination, indexes and caches at scale.
+
+    Modules are spread over organizations, providers over modules and versions over providers with
+    a Zipf like skew, a few parents get most of the children like in a real registry. With
+    distinct_timestamps rows share created_at values so keyset pagination has to break ties.
+
+    Rows are written with multi-row inserts in batches, nothing goes through the ORM. With archives
+    that many distinct archives are written to storage and shared by all versions.
+    """
+
+    def __init__(self, database: Database, organizations=10, modules=100, providers=200, versions=1000, skew=1.0,
+                 distinct_timestamps=0, prerelease_ratio=0.1, prefix='synthetic', batch_size=10000, seed=None,
+                 storage: Storage = None, archives=0):
+        self.database = database
+        self.organizations = organizations
+        self.modules = modules
+        self.providers = providers
+        self.versions = versions
+        self.skew = skew
+        self.distinct_timestamps = distinct_timestamps
+        self.prerelease_ratio = prerelease_ratio
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.storage = storage
+        self.archives = archives
+
+        self.__random = random.Random(seed)
+        self.__started = arrow.utcnow().shift(days=-365).datetime
+        self.__timestamps = [arrow.Arrow.fromdatetime(self.__started + datetime.timedelta(minutes=i))
+                             for i in range(distinct_timestamps)]
+        self.__row = 0
+
+    def __uuid(self) -> uuid.UUID:
+        return uuid.UUID(int=self.__random.getrandbits(128), version=4)
+
+    def __created_at(self) -> arrow.Arrow:
+        if len(self.__timestamps) > 0:
+            return self.__random.choice(self.__timestamps)
+
+        self.__row += 1
+        return arrow.Arrow.fromdatetime(self.__started + datetime.timedelta(milliseconds=self.__row))
+
+    def __parents(self, parents: int, children: int) -> List[int]:
+        """Pick a parent for every child, the first parents get the most of them"""
+        cum_weights = []
+        total = 0.0
+        for i in range(parents):
+            total += 1 / (i + 1) ** self.skew
+            cum_weights.append(total)
+
+        return self.__random.choices(range(parents), cum_weights=cum_weights, k=children)
+
+    def __insert(self, table: Table, rows: List[dict]):
+        if len(rows) == 0:
+            return
+
+        rows_per_statement = max(max_parameters(self.database.engine.dialect.name) // len(rows[0]), 1)
+        with self.database.engine.begin() as connection:
+            for i in range(0, len(rows), rows_per_statement):
+                connection.execute(table.insert().values(rows[i:i + rows_per_statement]))
+
+    def __insert_batched(self, name: str, count: int, row: Callable[[int], List[Tuple[Table, dict]]]):
+        """Insert count rows made by row in batches, row returns the rows of every table for one index"""
+        batch: Dict[Table, List[dict]] = {}
+        for i in range(count):
+            for table, values in row(i):
+                batch.setdefault(table, []).append(values)
+
+            if (i + 1) % self.batch_size == 0 or i + 1 == count:
+                for table, rows in batch.items():
+                    self.__insert(table, rows)
+                batch = {}
+                logger.info("Inserted %d of %d %s", i + 1, count, name)
+
+    def __write_archives(self) -> List[dict]:
+        archives = []
+        for i in range(self.archives):
+            data = _archive(i)
+            sha256 = hashlib.sha256(data).hexdigest()
+            self.storage.write(Archive.build_storage_key(sha256), io.BytesIO(data))
+            archives.append({
+                'sha256': sha256,
+                'size': len(data),
+                'metadata': encode_metadata(inspect_archive(io.BytesIO(data))),
+                'reference_count': 0,
+            })
+
+        logger.info("Wrote %d archives to storage", len(archives))
+        return archives
+
+    def run(self) -> Dict[str, int]:
+        """Generate the catalog and return the amount of rows created of every kind"""
+        organization_names = ['%s%d' % (self.prefix, i) for i in range(self.organizations)]
+        organization_ids = [self.__uuid() for _ in range(self.organizations)]
+        self.__insert_batched('organizations', self.organizations, lambda i: [
+            (Organization.__table__, {'id': organization_ids[i], 'name': organization_names[i],
+                                      'created_at': self.__created_at()})])
+
+        module_organizations = self.__parents(self.organizations, self.modules)
+        module_ids = [self.__uuid() for _ in range(self.modules)]
+        self.__insert_batched('modules', self.modules, lambda i: [
+            (Module.__table__, {'id': module_ids[i], 'organization_id': organization_ids[module_organizations[i]],
+                                'name': 'module%d' % i, 'created_at': self.__created_at()})])
+
+        provider_modules = self.__parents(self.modules, self.providers)
+        provider_ids = [self.__uuid() for _ in range(self.providers)]
+        provider_addresses = []
+        module_provider_counts = [0] * self.modules
+        for module in provider_modules:
+            provider_addresses.append(
+                (organization_names[module_organizations[module]], 'module%d' % module,
+                 'provider%d' % module_provider_counts[module]))
+            module_provider_counts[module] += 1
+        self.__insert_batched('providers', self.providers, lambda i: [
+            (ModuleProvider.__table__, {'id': provider_ids[i], 'module_id': module_ids[provider_modules[i]],
+                                        'name': provider_addresses[i][2], 'created_at': self.__created_at()})])
+
+        archives = self.__write_archives() if self.archives > 0 else []
+        version_providers = self.__parents(self.providers, self.versions)
+        provider_version_counts = [0] * self.providers
+
+        def version_rows(i: int) -> list:
+            provider = version_providers[i]
+            number = provider_version_counts[provider]
+            provider_version_counts[provider] += 1
+
+            prerelease = 'rc.1' if self.__random.random() < self.prerelease_ratio else ''
+            version = '%d.%d.%d' % (number // 100, number // 10 % 10, number % 10)
+            if prerelease != '':
+                version += '-' + prerelease
+
+            version_id = self.__uuid()
+            archive = self.__random.choice(archives) if len(archives) > 0 else None
+            rows = [
+                (ModuleProviderVersion.__table__, {
+                    'id': version_id, 'provider_id': provider_ids[provider], 'version': version,
+                    'version_major': number // 100, 'version_minor': number // 10 % 10, 'version_patch': number % 10,
+                    'version_prerelease_rank': 0 if prerelease else 1, 'version_prerelease': prerelease,
+                    'archive_size': archive['size'] if archive else None,
+                    'archive_sha256': archive['sha256'] if archive else None,
+                    'created_at': self.__created_at(),
+                }),
+                (ModuleVersionAddress.__table__, {
+                    'address': ModuleVersionAddress.build_address(*provider_addresses[provider], version),
+                    'version_id': version_id,
+                    'storage_key': Archive.build_storage_key(archive['sha256']) if archive else str(version_id),
+                    'filename': '-'.join(provider_addresses[provider] + (version,)),
+                }),
+            ]
+            if archive is not None:
+                archive['reference_count'] += 1
+                rows.append((ModuleVersionMetadata.__table__, {'version_id': version_id,
+                                                               'data': archive['metadata']}))
+
+            return rows
+
+        self.__insert_batched('versions', self.versions, version_rows)
+        self.__insert(Archive.__table__, [
+            {'sha256': archive['sha256'], 'size': archive['size'], 'reference_count': archive['reference_count']}
+            for archive in archives if archive['reference_count'] > 0])
+
+        return {
+            'organizations': self.organizations,
+            'modules': self.modules,
+            'providers': self.providers,
+            'versions': self.versions,
+            'archives': len(archives),
+        }
@@ -0,0 +1,25 @@
+import os
+
+import alembic.command
+import alembic.config
+import pytest
+
+from registry.sql.database import Database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def database(tmp_path) -> Database:
+    """A SQLite database migrated to the latest revision"""
+    database = Database('sqlite:///' + str(tmp_path / 'registry.db'))
+    database.connect()
+
+    config = alembic.config.Config(os.path.join(ROOT, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(ROOT, 'registry', 'sql', 'alembic'))
+    config.set_main_option('sqlalchemy.url', database.db_url)
+    alembic.command.upgrade(config, 'head')
+
+    yield database
+
+    database.engine.dispose()
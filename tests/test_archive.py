@@ -0,0 +1,51 @@
+from registry.sql.archive import add_archive_reference, remove_archive_reference
+from registry.sql.deletion import enqueue_deletion
+from registry.sql.models.archive import Archive
+from registry.sql.models.deletion import StorageDeletion
+
+SHA256 = 'ab' * 32
+
+
+def _reference_count(session):
+    archive = session.query(Archive).get(SHA256)
+    return None if archive is None else archive.reference_count
+
+
+def test_add_and_remove_references(database):
+    with database.session() as session:
+        assert add_archive_reference(session, SHA256, 10) is True
+        assert add_archive_reference(session, SHA256, 10) is False
+        assert add_archive_reference(session, SHA256, 10) is False
+        session.commit()
+        assert _reference_count(session) == 3
+
+        assert remove_archive_reference(session, SHA256) is False
+        assert remove_archive_reference(session, SHA256) is False
+        session.commit()
+        assert _reference_count(session) == 1
+
+        assert remove_archive_reference(session, SHA256) is True
+        session.commit()
+        assert _reference_count(session) is None
+
+
+def test_remove_unknown_archive(database):
+    with database.session() as session:
+        assert remove_archive_reference(session, SHA256) is False
+        session.commit()
+        assert session.query(Archive).count() == 0
+
+
+def test_add_cancels_queued_deletion(database):
+    key = Archive.build_storage_key(SHA256)
+    with database.session() as session:
+        assert add_archive_reference(session, SHA256, 10) is True
+        assert remove_archive_reference(session, SHA256) is True
+        enqueue_deletion(session, key)
+        session.commit()
+
+        # Uploaded again before the deletion worker got to it
+        assert add_archive_reference(session, SHA256, 10) is True
+        session.commit()
+        assert session.query(StorageDeletion).filter(StorageDeletion.key == key).count() == 0
+        assert _reference_count(session) == 1
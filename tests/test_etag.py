@@ -0,0 +1,33 @@
+import pytest
+
+from registry.http.tools.etag import etag_matches, make_etag
+
+
+def test_make_etag():
+    assert make_etag('a', 1) == make_etag('a', 1)
+    assert make_etag('a', 1) != make_etag('a', 2)
+    # Parts are separated so moving characters between them changes the ETag
+    assert make_etag('ab', 'c') != make_etag('a', 'bc')
+    assert make_etag('a').startswith('"') and make_etag('a').endswith('"')
+
+
+@pytest.mark.parametrize('etag,conditions', [
+    ('"abc"', ['"abc"']),
+    ('"abc"', ['W/"abc"']),
+    ('W/"abc"', ['"abc"']),
+    ('W/"abc"', ['W/"abc"']),
+    ('"abc"', ['"def"', 'W/"abc"']),
+    ('"abc"', ['*']),
+])
+def test_etag_matches(etag, conditions):
+    assert etag_matches(etag, conditions) is True
+
+
+@pytest.mark.parametrize('etag,conditions', [
+    ('"abc"', []),
+    ('"abc"', ['"def"']),
+    ('"abc"', ['W/"def"', '"abcd"']),
+    ('"abc"', ['abc']),
+])
+def test_etag_does_not_match(etag, conditions):
+    assert etag_matches(etag, conditions) is False
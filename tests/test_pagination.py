@@ -0,0 +1,50 @@
+import base64
+import struct
+import uuid
+
+import arrow
+import pytest
+
+from registry.sql.pagination import decode_cursor, encode_cursor
+
+
+def _marker(microseconds: int, id_bytes: bytes) -> str:
+    return base64.urlsafe_b64encode(struct.pack('>q16s', microseconds, id_bytes)).decode().rstrip("=")
+
+
+@pytest.mark.parametrize('created_at', [
+    arrow.get('2019-03-01T12:30:45.123456+00:00'),
+    arrow.get('1970-01-01T00:00:00+00:00'),
+    arrow.get('1969-12-31T23:59:59.999999+00:00'),
+    arrow.get('2019-03-01T14:30:45.123456+02:00'),
+])
+def test_cursor_round_trip(created_at):
+    id = uuid.uuid4()
+
+    decoded_created_at, decoded_id = decode_cursor(encode_cursor(created_at, id))
+
+    assert decoded_created_at == created_at
+    assert decoded_id == id
+
+
+def test_cursor_is_url_safe():
+    marker = encode_cursor(arrow.utcnow(), uuid.UUID(bytes=b'\xff' * 16))
+
+    assert '=' not in marker
+    assert '+' not in marker
+    assert '/' not in marker
+
+
+@pytest.mark.parametrize('marker', [
+    '',
+    'not a marker',
+    '!!!!',
+    _marker(0, b'\x00' * 16)[:-4],
+    _marker(0, b'\x00' * 16) + 'AAAA',
+    # Well formed but far outside of what datetime can represent
+    _marker(2 ** 63 - 1, uuid.uuid4().bytes),
+    _marker(-2 ** 63, uuid.uuid4().bytes),
+])
+def test_invalid_cursor(marker):
+    with pytest.raises(ValueError):
+        decode_cursor(marker)
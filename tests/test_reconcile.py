@@ -0,0 +1,142 @@
+import io
+import os
+
+import arrow
+import pytest
+
+from registry import reconcile
+from registry.reconcile import Reconciler
+from registry.sql.models.archive import Archive
+from registry.sql.models.deletion import StorageDeletion
+from registry.sql.models.module import Module, ModuleProvider, ModuleProviderVersion, ModuleVersionAddress, \
+    ModuleVersionMetadata
+from registry.sql.models.organization import Organization
+from registry.storage.local import LocalStorage
+
+OLD = arrow.utcnow().shift(days=-1)
+
+
+@pytest.fixture
+def storage(tmp_path) -> LocalStorage:
+    return LocalStorage(str(tmp_path / 'storage'))
+
+
+@pytest.fixture(autouse=True)
+def page_size(monkeypatch):
+    # Small pages so the merge runs over several of them
+    monkeypatch.setattr(reconcile, 'PAGE_SIZE', 2)
+
+
+def _write(storage: LocalStorage, key: str, modified_at: arrow.Arrow = OLD):
+    storage.write(key, io.BytesIO(b'archive'))
+    os.utime(storage.archive_path(key), (modified_at.float_timestamp, modified_at.float_timestamp))
+
+
+def _create_versions(database, keys: dict):
+    """Create a version of a single provider for every version: storage key pair"""
+    with database.session() as session:
+        organization = Organization(name='acme')
+        session.add(organization)
+        session.flush()
+        module = Module(organization_id=organization.id, name='network')
+        session.add(module)
+        session.flush()
+        provider = ModuleProvider(module_id=module.id, name='aws')
+        session.add(provider)
+        session.flush()
+
+        for version_name, key in keys.items():
+            version = ModuleProviderVersion(provider_id=provider.id, version=version_name)
+            session.add(version)
+            session.flush()
+            session.add(ModuleVersionAddress(address='acme/network/aws/' + version_name, version_id=version.id,
+                                             storage_key=key, filename='acme-network-aws-' + version_name,
+                                             created_at=OLD))
+            session.add(ModuleVersionMetadata(version_id=version.id, data=None, failures=1, failed_at=OLD))
+        session.commit()
+
+
+def _versions(database) -> list:
+    with database.session() as session:
+        return sorted(version for version, in session.query(ModuleProviderVersion.version))
+
+
+def _queued(database) -> list:
+    with database.session() as session:
+        return sorted(key for key, in session.query(StorageDeletion.key))
+
+
+def test_nothing_to_reconcile(database, storage):
+    assert Reconciler(database, storage).run() == {'archives': 0, 'orphaned': 0, 'missing': 0}
+
+
+def test_merge(database, storage):
+    # Mixed case and punctuation so the database has to order keys by their bytes like storage does
+    used = ['Bkey1', '_key2', 'akey3', 'zkey4', Archive.build_storage_key('ab' * 32)]
+    for key in used:
+        _write(storage, key)
+    _write(storage, 'Akey5')
+    _write(storage, 'ykey6')
+    _write(storage, 'ckey7', modified_at=arrow.utcnow())
+    _create_versions(database, {
+        '1.0.0': 'Bkey1',
+        '1.1.0': '_key2',
+        '1.2.0': 'akey3',
+        '1.3.0': 'zkey4',
+        '1.4.0': used[-1],
+        '2.0.0': 'Ckey8',
+        '2.1.0': 'bkey9',
+        '2.2.0': Archive.build_storage_key('cd' * 32),
+    })
+
+    counts = Reconciler(database, storage).run()
+
+    assert counts == {'archives': 8, 'orphaned': 2, 'missing': 3}
+    # Only reported without fix
+    assert len(_versions(database)) == 8
+    assert _queued(database) == []
+
+
+def test_fix(database, storage):
+    _write(storage, 'akey1')
+    _write(storage, 'bkey2')
+    _write(storage, 'ckey3', modified_at=arrow.utcnow())
+    _create_versions(database, {
+        '1.0.0': 'akey1',
+        '1.1.0': 'dkey4',
+        '1.2.0': Archive.build_storage_key('cd' * 32),
+    })
+
+    counts = Reconciler(database, storage, fix=True).run()
+
+    assert counts == {'archives': 3, 'orphaned': 1, 'missing': 2}
+    # Content addressed archives can not be recreated, their versions are kept
+    assert _versions(database) == ['1.0.0', '1.2.0']
+    assert _queued(database) == ['bkey2']
+    with database.session() as session:
+        assert session.query(ModuleVersionMetadata).count() == 2
+
+    # Queued archives are not reported again
+    assert Reconciler(database, storage, fix=True).run() == {'archives': 3, 'orphaned': 0, 'missing': 1}
+
+
+def test_upload_in_progress(database, storage):
+    _create_versions(database, {'1.0.0': 'akey1'})
+    upload_id = storage.create_multipart_upload('akey1')
+
+    assert Reconciler(database, storage, fix=True).run() == {'archives': 0, 'orphaned': 0, 'missing': 0}
+    assert _versions(database) == ['1.0.0']
+
+    storage.abort_multipart_upload('akey1', upload_id)
+    assert Reconciler(database, storage, fix=True).run() == {'archives': 0, 'orphaned': 0, 'missing': 1}
+    assert _versions(database) == []
+
+
+def test_new_versions_are_skipped(database, storage):
+    _create_versions(database, {'1.0.0': 'akey1'})
+    with database.session() as session:
+        session.query(ModuleVersionAddress).update({ModuleVersionAddress.created_at: arrow.utcnow()})
+        session.commit()
+
+    assert Reconciler(database, storage, fix=True).run() == {'archives': 0, 'orphaned': 0, 'missing': 0}
+    assert _versions(database) == ['1.0.0']